@@ -0,0 +1,124 @@
+# Per-call latency of the single-transaction registration engine compared with the
+# previous add_registration procedure, which ran every check on its own connection,
+# and the time to enroll all pairs at once with add_registrations.
+#
+#   python benchmarks/bench_add_registration.py [rounds]
+
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_FILE = os.path.join(ROOT_DIR, 'data', 'mygym.db')
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts', 'python'))
+
+import create_functions as crfunc  # noqa: E402
+import create_procedures as crprod  # noqa: E402
+import database  # noqa: E402
+from generate_data import build_database  # noqa: E402
+
+
+# the procedure as it was before the registration engine
+def legacy_add_registration(member_id, class_id):
+    try:
+        if not crfunc.check_member_exists(member_id):
+            raise ValueError(f"Member with ID {member_id} not found.")
+
+        if not crfunc.check_class_exists(class_id):
+            raise ValueError(f"Class with ID {class_id} not found.")
+
+        membership_terminated, forename, surname = crfunc.is_membership_terminated(member_id)
+        if membership_terminated:
+            return f"{forename} {surname} (ID: {member_id}) has already terminated his/her membership!"
+
+        forename, surname, class_, weekday, member_registered = crfunc.is_member_registered(member_id, class_id)
+        if member_registered:
+            return f"{forename} {surname} (ID: {member_id}) is already registered for {class_} on {weekday}s!"
+
+        forename, surname, class_, weekday, member_instructor = crfunc.is_member_instructor(member_id, class_id)
+        if member_instructor:
+            return f"{forename} {surname} (ID: {member_id}) is the instructor of {class_} on {weekday}s!"
+
+        class_, weekday, free_spots = crfunc.count_free_spots_by_class(class_id)
+        if free_spots == 0:
+            return f"There are no more free spots in {class_} on {weekday}s!"
+
+        with database.get_engine().begin() as connection:
+            connection.execute(
+                text("""
+                INSERT INTO registrations (class_id, member_id, startdate)
+                VALUES (:class_id, :member_id, :startdate)
+                """),
+                {'class_id': class_id, 'member_id': member_id, 'startdate': datetime.now().date()}
+            )
+        return "New participant has registered!"
+
+    except ValueError as e:
+        return str(e)
+
+
+# every run starts from an untouched copy of the example database (migrated once into source.db)
+def use_database_copy(work_dir, name):
+    database_file = os.path.join(work_dir, f'{name}.db')
+    shutil.copy(os.path.join(work_dir, 'source.db'), database_file)
+    database.configure_engine(f'sqlite:///{database_file}')
+    return database.get_engine()
+
+
+def run(procedure, pairs, work_dir):
+    engine = use_database_copy(work_dir, procedure.__name__)
+
+    timings = []
+    for member_id, class_id in pairs:
+        start = time.perf_counter()
+        procedure(member_id, class_id)
+        timings.append(time.perf_counter() - start)
+
+    engine.dispose()
+    return timings
+
+
+def report(name, timings):
+    timings_ms = sorted(t * 1000 for t in timings)
+    p95 = timings_ms[int(len(timings_ms) * 0.95) - 1]
+    print(f"{name:<25} calls: {len(timings_ms):>5}   mean: {statistics.mean(timings_ms):7.3f} ms   "
+          f"median: {statistics.median(timings_ms):7.3f} ms   p95: {p95:7.3f} ms")
+
+
+if __name__ == '__main__':
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        build_database(os.path.join(work_dir, 'source.db'), source_file=DATABASE_FILE)
+
+        # every member against every class: covers successful inserts as well as each rejection
+        with database.get_engine().connect() as connection:
+            member_ids = connection.execute(text("SELECT id FROM members")).scalars().all()
+            class_ids = connection.execute(text("SELECT id FROM classes")).scalars().all()
+        pairs = [(member_id, class_id) for class_id in class_ids for member_id in member_ids]
+        database.configure_engine()
+
+        legacy_timings, engine_timings, batch_timings = [], [], []
+        for _ in range(rounds):
+            legacy_timings += run(legacy_add_registration, pairs, work_dir)
+            engine_timings += run(crprod.add_registration, pairs, work_dir)
+
+            engine = use_database_copy(work_dir, 'add_registrations')
+            start = time.perf_counter()
+            crprod.add_registrations(pairs)
+            batch_timings.append(time.perf_counter() - start)
+            engine.dispose()
+        database.configure_engine()
+
+    report('legacy add_registration', legacy_timings)
+    report('add_registration', engine_timings)
+    print(f"speed-up (mean): {statistics.mean(legacy_timings) / statistics.mean(engine_timings):.1f}x")
+    batch_ms = statistics.mean(batch_timings) * 1000
+    print(f"add_registrations         pairs: {len(pairs):>5}   total: {batch_ms:7.3f} ms   "
+          f"per pair: {batch_ms / len(pairs):7.3f} ms")
@@ -0,0 +1,162 @@
+# Throughput of concurrent registration requests through async_api.py compared with the sync path.
+# Every request checks the member and the class (registered? free spots?) and then registers the member.
+# The sync path handles the requests one after the other; the async paths run up to ### requests at a time:
+# async_api with the two checks of a request running concurrently, and the sync functions called on the event loop
+# (which never lets another request or timer run before a request is done). Every run starts from a fresh copy of
+# the same database with the same requests.
+#
+# Two workloads:
+# - database only: nothing else writes. The calls hold the GIL most of the time and SQLite has one write lock, so
+#   the thread pool only adds its hand-over and async_api is slower than the sync path
+# - beside a writer: another process takes the write lock for 20 ms every 40 ms (like a batch job). A registration
+#   waits for the lock, which blocks the sync path and the event loop; with async_api the other requests keep
+#   running their checks meanwhile, and the event loop stays responsive
+# The loop lag is the longest delay of a 1 ms timer on the event loop during the run.
+#
+#   python benchmarks/bench_async.py [persons] [requests]
+
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts', 'python'))
+
+import async_api  # noqa: E402
+import create_functions as crfunc  # noqa: E402
+import create_procedures as crprod  # noqa: E402
+import database  # noqa: E402
+from generate_data import build_database  # noqa: E402
+
+concurrency_levels = [1, 4, 8, 16]
+
+
+def get_ids():
+    with database.get_engine().connect() as connection:
+        member_ids = connection.execute(text("SELECT id FROM members")).scalars().all()
+        class_ids = connection.execute(text("SELECT id FROM classes")).scalars().all()
+    return member_ids, class_ids
+
+
+def handle_request(member_id, class_id):
+    crfunc.is_member_registered(member_id, class_id)
+    crfunc.count_free_spots_by_class(class_id)
+    return crprod.add_registration(member_id, class_id)
+
+
+async def handle_request_async(member_id, class_id):
+    await asyncio.gather(async_api.is_member_registered(member_id, class_id),
+                         async_api.count_free_spots_by_class(class_id))
+    return await async_api.add_registration(member_id, class_id)
+
+
+# the sync functions called from a coroutine, blocking the event loop while they run
+async def handle_request_on_loop(member_id, class_id):
+    return handle_request(member_id, class_id)
+
+
+# runs in a separate process until stopped: takes the write lock of the database for 20 ms every 40 ms
+def hold_write_lock(database_file, stopping):
+    connection = sqlite3.connect(database_file, isolation_level=None, timeout=30)
+    while not stopping.is_set():
+        connection.execute('BEGIN IMMEDIATE')
+        time.sleep(0.02)
+        connection.execute('COMMIT')
+        time.sleep(0.02)
+    connection.close()
+
+
+# longest delay of a 1 ms timer of the event loop until stopped, in seconds
+async def watch_loop(stopping):
+    loop = asyncio.get_running_loop()
+    lag = 0
+    while not stopping.is_set():
+        start = loop.time()
+        await asyncio.sleep(0.001)
+        lag = max(lag, loop.time() - start - 0.001)
+    return lag
+
+
+# runs the requests; returns the loop lag
+async def run_async(requests, concurrency, handle=handle_request_async):
+    semaphore = asyncio.Semaphore(concurrency)
+    stopping = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stopping))
+
+    async def limited(member_id, class_id):
+        async with semaphore:
+            return await handle(member_id, class_id)
+
+    await asyncio.gather(*(limited(member_id, class_id) for member_id, class_id in requests))
+    stopping.set()
+    return await watcher
+
+
+def report(name, requests, seconds, lag=None):
+    line = f"{name:<46} requests: {len(requests):>6}   {seconds:7.2f} s   {len(requests) / seconds:6.0f} requests/s"
+    if lag is not None:
+        line += f"   loop lag: {lag * 1000:6.2f} ms"
+    print(line)
+
+
+# Runs the requests on a fresh copy of the database, beside a writer process if writer: one after the other without
+# handle, else with the coroutine handle, concurrency at a time; returns the seconds and the loop lag
+def run_on_copy(work_dir, requests, writer, handle=None, concurrency=1):
+    database_file = os.path.join(work_dir, 'mygym.db')
+    shutil.copy(os.path.join(work_dir, 'source.db'), database_file)
+    database.configure_engine(f'sqlite:///{database_file}', pool_size=concurrency)
+    async_api.settings['workers'] = concurrency
+    if writer:
+        context = multiprocessing.get_context('fork')
+        stopping = context.Event()
+        writer_process = context.Process(target=hold_write_lock, args=(database_file, stopping))
+        writer_process.start()
+
+    start = time.perf_counter()
+    lag = None
+    if handle is None:
+        for member_id, class_id in requests:
+            handle_request(member_id, class_id)
+    else:
+        lag = asyncio.run(run_async(requests, concurrency, handle))
+    seconds = time.perf_counter() - start
+
+    async_api.shutdown()
+    if writer:
+        stopping.set()
+        writer_process.join()
+    database.configure_engine()
+    return seconds, lag
+
+
+if __name__ == '__main__':
+    persons = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    request_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    pool_size = database.settings['pool_size']
+    with tempfile.TemporaryDirectory() as work_dir:
+        build_database(os.path.join(work_dir, 'source.db'), persons)
+        member_ids, class_ids = get_ids()
+        database.configure_engine()
+        rng = random.Random(0)
+        requests = [(rng.choice(member_ids), rng.choice(class_ids)) for _ in range(request_count)]
+
+        # fewer requests beside the writer, every registration waits for it
+        for workload, writer, count in [('database only', False, request_count),
+                                        ('beside a writer', True, request_count // 4)]:
+            report(f'{workload}: sync', requests[:count], *run_on_copy(work_dir, requests[:count], writer))
+            concurrency = concurrency_levels[-1]
+            report(f'{workload}: on the loop, {concurrency} at a time', requests[:count],
+                   *run_on_copy(work_dir, requests[:count], writer, handle_request_on_loop, concurrency))
+            for concurrency in concurrency_levels:
+                report(f'{workload}: async, {concurrency} at a time', requests[:count],
+                       *run_on_copy(work_dir, requests[:count], writer, handle_request_async, concurrency))
+        database.configure_engine(pool_size=pool_size)
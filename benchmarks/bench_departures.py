@@ -0,0 +1,72 @@
+# Time to record ### departures through tr_update_leaving (one UPDATE of persons per departure, all in one
+# transaction) compared with process_departures (set-based updates of registrations and persons).
+# Both paths start from the same generated database with enough active members.
+#
+#   python benchmarks/bench_departures.py [departures ...]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+from sqlalchemy import text
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts', 'python'))
+
+import create_procedures as crprod  # noqa: E402
+import create_trigger as crtrig  # noqa: E402
+import database  # noqa: E402
+from generate_data import build_database  # noqa: E402
+
+leavedate = date(2025, 1, 31)
+
+
+# a fresh copy of the generated database; returns the IDs of persons who haven't left yet
+def use_database_copy(database_file, work_dir, name):
+    copy_file = os.path.join(work_dir, f'{name}.db')
+    shutil.copy(database_file, copy_file)
+    database.configure_engine(f'sqlite:///{copy_file}')
+    with database.get_engine().connect() as connection:
+        return connection.execute(text("SELECT id FROM persons WHERE leavedate IS NULL ORDER BY id")).scalars().all()
+
+
+def depart_with_trigger(pairs):
+    with database.get_engine().begin() as connection:
+        connection.execute(text("UPDATE persons SET leavedate = :leavedate WHERE id = :person_id"),
+                           [{'leavedate': leavedate.isoformat(), 'person_id': person_id} for person_id, leavedate
+                            in pairs])
+
+
+def run(database_file, work_dir, procedure, departures):
+    person_ids = use_database_copy(database_file, work_dir, procedure.__name__)
+    if len(person_ids) < departures:
+        raise ValueError(f"Only {len(person_ids)} persons can leave, {departures} requested.")
+    pairs = [(person_id, leavedate) for person_id in person_ids[:departures]]
+
+    start = time.perf_counter()
+    procedure(pairs)
+    seconds = time.perf_counter() - start
+
+    assert crtrig.check_class_occupancy() == []
+    database.configure_engine()
+    return seconds
+
+
+if __name__ == '__main__':
+    departure_counts = [int(arg) for arg in sys.argv[1:]] or [1000, 100000]
+    # about 70% of the generated persons are still there
+    persons = max(departure_counts) * 3 // 2
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        database_file = os.path.join(work_dir, 'mygym.db')
+        build_database(database_file, persons)
+        database.configure_engine()
+
+        for departures in departure_counts:
+            trigger_seconds = run(database_file, work_dir, depart_with_trigger, departures)
+            bulk_seconds = run(database_file, work_dir, crprod.process_departures, departures)
+            print(f"{departures:>7} departures   tr_update_leaving: {trigger_seconds:7.3f} s   "
+                  f"process_departures: {bulk_seconds:7.3f} s   speed-up: {trigger_seconds / bulk_seconds:5.1f}x")
@@ -0,0 +1,82 @@
+# Latency of search_persons on a generated database (by default a million persons) for typical front desk
+# queries, compared with LIKE '%...%' over the searchable columns of persons, which has to scan the table
+# (and stops at the first 20 matches, without ranking).
+#
+#   python benchmarks/bench_search.py [persons] [repetitions]
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts', 'python'))
+
+import create_functions as crfunc  # noqa: E402
+import database  # noqa: E402
+from generate_data import build_database  # noqa: E402
+
+like_word = """
+(persons.surname LIKE :word{i} OR persons.forename LIKE :word{i} OR persons.email LIKE :word{i}
+OR persons.mobile LIKE :word{i} OR persons.landline LIKE :word{i} OR cities.name LIKE :word{i})
+"""
+
+
+# the search without the index: every word somewhere in the searchable columns (unranked)
+def search_like(connection, query):
+    words = query.split()
+    query_like = text(f"""
+        SELECT persons.id
+        FROM persons
+        INNER JOIN cities ON persons.city_id = cities.id
+        WHERE {' AND '.join(like_word.format(i=i) for i in range(len(words)))}
+        LIMIT 20
+    """)
+    return connection.execute(query_like, {f'word{i}': f'%{word}%' for i, word in enumerate(words)}).all()
+
+
+# queries built from the generated person in the middle of the table
+def get_queries():
+    with database.get_engine().connect() as connection:
+        surname, forename, email, mobile = connection.execute(text("""
+            SELECT surname, forename, email, mobile FROM persons
+            WHERE email IS NOT NULL AND mobile IS NOT NULL AND id >= (SELECT MAX(id) / 2 FROM persons)
+            ORDER BY id LIMIT 1
+        """)).one()
+    return {
+        'part of a surname': surname[1:5],
+        'forename and surname': f'{forename} {surname}',
+        'part of an email address': email.split('@')[0][-8:],
+        'part of a mobile number': mobile[-7:],
+    }
+
+
+def measure(call, repetitions):
+    seconds = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        call()
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds), max(seconds)
+
+
+if __name__ == '__main__':
+    persons = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        start = time.perf_counter()
+        build_database(os.path.join(work_dir, 'mygym.db'), persons)
+        print(f"{persons} persons, database and search index built in {time.perf_counter() - start:.1f} s")
+
+        for name, query in get_queries().items():
+            matches = len(crfunc.search_persons(query))
+            median, slowest = measure(lambda: crfunc.search_persons(query), repetitions)
+            with database.get_engine().connect() as connection:
+                like_median, _ = measure(lambda: search_like(connection, query), max(repetitions // 10, 1))
+            print(f"{name:<26} {query!r:<28} matches: {matches:>3}   search_persons: {median * 1000:7.2f} ms "
+                  f"(max {slowest * 1000:7.2f} ms)   LIKE: {like_median * 1000:8.2f} ms")
+        database.configure_engine()
@@ -0,0 +1,149 @@
+# Studios writing at the same time: one thread (and one process, like one application server per studio) per studio
+# registering members for the studio's classes, on one shared database compared with one shard per studio (split by
+# sharding.split_database()). Also times the reports over all studios, fanned out over the process pool, compared
+# with the shards one after the other and with the shared database. Parallel runs need as many CPUs as studios.
+#
+#   python benchmarks/bench_shards.py [persons] [studios] [registrations per studio]
+
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import text
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts', 'python'))
+
+import create_procedures as crprod  # noqa: E402
+import database  # noqa: E402
+import sharding  # noqa: E402
+from generate_data import build_database  # noqa: E402
+
+
+# studio -> (room IDs, [(member ID, class ID), ...]), rooms dealt out round robin
+def get_studio_requests(studios, registrations):
+    rng = random.Random(0)
+    with database.get_engine().connect() as connection:
+        member_ids = connection.execute(text("SELECT id FROM members")).scalars().all()
+        classes = connection.execute(text("""
+            SELECT classes.id, classtypes.room_id FROM classes
+            INNER JOIN classofferings ON classes.classoffering_id = classofferings.id
+            INNER JOIN classtypes ON classofferings.classtype_id = classtypes.id
+        """)).all()
+        room_ids = connection.execute(text("SELECT id FROM rooms ORDER BY id")).scalars().all()
+
+    studio_requests = {}
+    for number in range(studios):
+        rooms = set(room_ids[number::studios])
+        class_ids = [class_id for class_id, room_id in classes if room_id in rooms]
+        studio_requests[f'studio{number + 1}'] = (sorted(rooms), [(rng.choice(member_ids), rng.choice(class_ids))
+                                                                 for _ in range(registrations)])
+    return studio_requests
+
+
+# one thread per studio; returns the seconds until all are done
+def run_studios(studio_requests, sharded):
+    def register(studio, requests):
+        if sharded:
+            with sharding.use_studio(studio):
+                for member_id, class_id in requests:
+                    crprod.register_member(member_id, class_id)
+        else:
+            for member_id, class_id in requests:
+                crprod.register_member(member_id, class_id)
+
+    threads = [threading.Thread(target=register, args=(studio, requests))
+               for studio, (rooms, requests) in studio_requests.items()]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+# runs in a worker process: (start, end) of the requests on the database of the URL
+def register_in_process(url, requests):
+    database.configure_engine(url)
+    start = time.time()
+    for member_id, class_id in requests:
+        crprod.register_member(member_id, class_id)
+    return start, time.time()
+
+
+# one process per studio; returns the seconds from the first start to the last end
+def run_studio_processes(pool, studio_requests, urls):
+    futures = [pool.submit(register_in_process, urls[studio], requests)
+               for studio, (rooms, requests) in studio_requests.items()]
+    times = [future.result() for future in futures]
+    return max(end for start, end in times) - min(start for start, end in times)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    persons = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    studios = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    registrations = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_file = os.path.join(work_dir, 'mygym.db')
+        build_database(source_file, persons)
+        studio_requests = get_studio_requests(studios, registrations)
+
+        shared_file = os.path.join(work_dir, 'shared.db')
+        shutil.copy(source_file, shared_file)
+        sharding.split_database({studio: rooms for studio, (rooms, requests) in studio_requests.items()},
+                                work_dir, f'sqlite:///{source_file}')
+
+        shards = dict(sharding.settings['shards'])
+        database.configure_engine(f'sqlite:///{shared_file}')
+        # a copy of the shared database and the shards for the second run
+        for url in [database.settings['url'], *shards.values()]:
+            path = url[len('sqlite:///'):]
+            shutil.copy(path, path.replace('.db', '-processes.db'))
+
+        total = studios * registrations
+        shared_seconds = run_studios(studio_requests, sharded=False)
+        sharded_seconds = run_studios(studio_requests, sharded=True)
+        print(f"threads     {total} registrations   one database: {shared_seconds:6.2f} s "
+              f"({total / shared_seconds:6.0f}/s)   one shard per studio: {sharded_seconds:6.2f} s "
+              f"({total / sharded_seconds:6.0f}/s)")
+
+        with ProcessPoolExecutor(studios, mp_context=multiprocessing.get_context('spawn')) as pool:
+            # start the workers before timing
+            list(pool.map(time.sleep, [0.5] * studios))
+            shared_url = database.settings['url'].replace('.db', '-processes.db')
+            shared_seconds = run_studio_processes(pool, studio_requests, {studio: shared_url for studio in shards})
+            sharded_seconds = run_studio_processes(pool, studio_requests, {studio: url.replace('.db', '-processes.db')
+                                                                           for studio, url in shards.items()})
+        print(f"processes   {total} registrations   one database: {shared_seconds:6.2f} s "
+              f"({total / shared_seconds:6.0f}/s)   one shard per studio: {sharded_seconds:6.2f} s "
+              f"({total / sharded_seconds:6.0f}/s)")
+
+        # the first fan-out starts the worker processes
+        startup_seconds = timed(sharding.count_registrations_by_classtype)
+        fan_out_seconds = timed(sharding.count_registrations_by_classtype)
+        sequential_seconds = timed(sharding.for_all_studios, sharding.get_registration_totals)
+        shared_seconds = timed(sharding.get_registration_totals)
+        print(f"registration totals   fan-out: {fan_out_seconds * 1000:7.1f} ms "
+              f"(first call {startup_seconds:5.2f} s)   "
+              f"shards one after the other: {sequential_seconds * 1000:7.1f} ms   "
+              f"one database: {shared_seconds * 1000:7.1f} ms")
+
+        fan_out_seconds = timed(sharding.read_view_all_studios, 'vw_registrations')
+        sequential_seconds = timed(sharding.for_all_studios, sharding.read_view, 'vw_registrations')
+        print(f"vw_registrations      fan-out: {fan_out_seconds * 1000:7.1f} ms   "
+              f"shards one after the other: {sequential_seconds * 1000:7.1f} ms")
+        sharding.shutdown()
+        database.configure_engine()
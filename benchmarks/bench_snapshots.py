@@ -0,0 +1,118 @@
+# Latency of add_registration on the database while report threads read the reporting views: without reports,
+# with the reports reading the database itself, and with the reports reading snapshots (snapshots.py) taken every
+# second. Runs with the rollback journal (SQLite's default, readers block commits) and the write-ahead log.
+#
+#   python benchmarks/bench_snapshots.py [persons] [registrations] [report threads]
+
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import text
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts', 'python'))
+
+import create_procedures as crprod  # noqa: E402
+import database  # noqa: E402
+import reporting  # noqa: E402
+import snapshots  # noqa: E402
+from generate_data import build_database  # noqa: E402
+
+report_views = ['vw_registrations', 'vw_yogaparticipants', 'vw_trainersasparticipants']
+
+
+def get_requests(registrations):
+    rng = random.Random(0)
+    with database.get_engine().connect() as connection:
+        member_ids = connection.execute(text("SELECT id FROM members")).scalars().all()
+        class_ids = connection.execute(text("SELECT id FROM classes")).scalars().all()
+    return [(rng.choice(member_ids), rng.choice(class_ids)) for _ in range(registrations)]
+
+
+# report threads reading whole views until stopped; returns the threads and the list counting the reports read
+def start_reports(threads, stopping):
+    reports = []
+
+    def read_reports():
+        while not stopping.is_set():
+            for view in report_views:
+                for _ in reporting.stream_view(view):
+                    pass
+                reports.append(view)
+
+    report_threads = [threading.Thread(target=read_reports) for _ in range(threads)]
+    for thread in report_threads:
+        thread.start()
+    return report_threads, reports
+
+
+def percentile(seconds, fraction):
+    return seconds[min(int(len(seconds) * fraction), len(seconds) - 1)]
+
+
+def run(requests, report_threads, snapshot):
+    if snapshot:
+        snapshots.start(interval=1)
+    stopping = threading.Event()
+    threads, reports = start_reports(report_threads, stopping)
+    time.sleep(0.2)
+
+    seconds = []
+    start = time.perf_counter()
+    for member_id, class_id in requests:
+        call_start = time.perf_counter()
+        crprod.add_registration(member_id, class_id)
+        seconds.append(time.perf_counter() - call_start)
+    total = time.perf_counter() - start
+
+    stopping.set()
+    for thread in threads:
+        thread.join()
+    age = snapshots.snapshot_age()
+    taken = snapshots.snapshot_statistics()['seconds']
+    snapshots.stop()
+    seconds.sort()
+    return statistics.median(seconds), percentile(seconds, 0.95), percentile(seconds, 0.99), seconds[-1], \
+        len(requests) / total, len(reports), age, taken
+
+
+if __name__ == '__main__':
+    persons = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    registrations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    report_threads = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    sqlite_profile = database.settings['sqlite_profile']
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_file = os.path.join(work_dir, 'source.db')
+        build_database(source_file, persons)
+        database.configure_engine()
+
+        for profile in ['default', 'balanced']:
+            for name, threads, snapshot in [('no reports', 0, False),
+                                            ('reports on the database', report_threads, False),
+                                            ('reports on snapshots', report_threads, True)]:
+                # the same registrations on a fresh copy for every run
+                database_file = os.path.join(work_dir, 'mygym.db')
+                shutil.copy(source_file, database_file)
+                connection = sqlite3.connect(database_file)
+                connection.execute('PRAGMA journal_mode = DELETE')
+                connection.close()
+                database.configure_engine(f'sqlite:///{database_file}', sqlite_profile=profile)
+                requests = get_requests(registrations)
+
+                median, p95, p99, slowest, rate, reports, age, taken = run(requests, threads, snapshot)
+                line = (f"{profile:<9} {name:<24} add_registration p50 {median * 1000:6.2f} ms  "
+                        f"p95 {p95 * 1000:6.2f} ms  p99 {p99 * 1000:7.2f} ms  max {slowest * 1000:7.2f} ms  "
+                        f"{rate:6.0f}/s  reports: {reports:4}")
+                if snapshot:
+                    line += f"  snapshot age {age:4.2f} s (taken in {taken * 1000:.0f} ms)"
+                print(line)
+                database.configure_engine()
+        database.configure_engine(sqlite_profile=sqlite_profile)
@@ -0,0 +1,108 @@
+# Mixed read/write throughput of the SQLite profiles in database.py.
+# Reader processes run lookups from create_functions while writer processes register
+# members with add_registration and remove the registration again.
+#
+#   python benchmarks/bench_sqlite_profiles.py [seconds] [readers] [writers]
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_FILE = os.path.join(ROOT_DIR, 'data', 'mygym.db')
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts', 'python'))
+
+import create_functions as crfunc  # noqa: E402
+import create_procedures as crprod  # noqa: E402
+import database  # noqa: E402
+from generate_data import build_database  # noqa: E402
+
+
+# only SQLITE_BUSY ("database is locked") counts as a locked error, anything else is a bug of the benchmark
+def is_locked(error):
+    return (getattr(error.orig, 'sqlite_errorname', None) == 'SQLITE_BUSY'
+            or 'database is locked' in str(error.orig))
+
+
+def reader(url, profile, seconds, worker):
+    database.configure_engine(url, sqlite_profile=profile)
+    operations = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            crfunc.count_free_spots_by_class(operations % 20 + 1)
+            crfunc.is_member_registered(operations % 50 + 1, operations % 20 + 1)
+            operations += 2
+        except OperationalError as e:
+            if not is_locked(e):
+                raise
+            errors += 1
+    return 'read', operations, errors
+
+
+def writer(url, profile, seconds, worker):
+    database.configure_engine(url, sqlite_profile=profile)
+    operations = errors = 0
+    # each writer works on its own members, so the registrations can always be removed again
+    member_ids = range(20 + worker * 5, 25 + worker * 5)
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        member_id, class_id = member_ids[operations % 5], operations % 20 + 1
+        try:
+            crprod.add_registration(member_id, class_id)
+            with database.get_engine().begin() as connection:
+                connection.execute(
+                    text("DELETE FROM registrations "
+                         "WHERE member_id = :member_id AND startdate = DATE('now', 'localtime')"),
+                    {'member_id': member_id}
+                )
+            operations += 1
+        except OperationalError as e:
+            if not is_locked(e):
+                raise
+            errors += 1
+    return 'write', operations, errors
+
+
+def run(profile, seconds, readers, writers, work_dir):
+    database_file = os.path.join(work_dir, f'{profile}.db')
+    shutil.copy(os.path.join(work_dir, 'source.db'), database_file)
+    url = f'sqlite:///{database_file}'
+
+    tasks = ([(reader, worker) for worker in range(readers)]
+             + [(writer, worker) for worker in range(writers)])
+    with multiprocessing.get_context('fork').Pool(len(tasks)) as pool:
+        results = pool.starmap(run_task, [(task, url, profile, seconds, worker) for task, worker in tasks])
+
+    totals = {'read': [0, 0], 'write': [0, 0]}
+    for kind, operations, errors in results:
+        totals[kind][0] += operations
+        totals[kind][1] += errors
+    return totals
+
+
+def run_task(task, url, profile, seconds, worker):
+    return task(url, profile, seconds, worker)
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    writers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    print(f"{readers} readers, {writers} writers, {seconds:.0f} s per profile")
+    print(f"{'profile':<10} {'reads/s':>10} {'writes/s':>10} {'locked errors':>14}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        # the example database with the current schema, views and triggers, copied for every profile
+        build_database(os.path.join(work_dir, 'source.db'), source_file=DATABASE_FILE)
+        database.configure_engine()
+        for profile in database.sqlite_profiles:
+            totals = run(profile, seconds, readers, writers, work_dir)
+            print(f"{profile:<10} {totals['read'][0] / seconds:>10.0f} {totals['write'][0] / seconds:>10.0f} "
+                  f"{totals['read'][1] + totals['write'][1]:>14}")
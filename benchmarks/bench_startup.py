@@ -0,0 +1,69 @@
+# Import time of the data layer and latency of the first query in a fresh process.
+# Pass a git revision to measure the scripts as they were at that revision ('.' is the working tree):
+#
+#   python benchmarks/bench_startup.py [. | revision] [runs]
+#
+# Only reads from data/mygym.db.
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+probe_functions = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+import create_functions
+imported = time.perf_counter()
+create_functions.check_member_exists(1)
+first_query = time.perf_counter()
+create_functions.check_member_exists(2)
+second_query = time.perf_counter()
+print(json.dumps([imported - start, first_query - imported, second_query - first_query]))
+"""
+
+probe_procedures = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+import create_procedures
+print(json.dumps([time.perf_counter() - start]))
+"""
+
+
+def measure(probe, scripts_dir, runs):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', probe, scripts_dir], cwd=ROOT_DIR, check=True,
+                                capture_output=True, text=True).stdout
+        timings.append(json.loads(output))
+    return [statistics.median(column) * 1000 for column in zip(*timings)]
+
+
+if __name__ == '__main__':
+    revision = sys.argv[1] if len(sys.argv) > 1 else None
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    revision = revision if revision != '.' else None
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if revision:
+            archive = subprocess.run(['git', 'archive', revision, 'scripts/python'], cwd=ROOT_DIR, check=True,
+                                     capture_output=True).stdout
+            subprocess.run(['tar', '-x', '-C', work_dir], input=archive, check=True)
+            scripts_dir = os.path.join(work_dir, 'scripts', 'python')
+        else:
+            scripts_dir = os.path.join(ROOT_DIR, 'scripts', 'python')
+
+        import_ms, first_query_ms, second_query_ms = measure(probe_functions, scripts_dir, runs)
+        import_procedures_ms, = measure(probe_procedures, scripts_dir, runs)
+
+    print(f"{revision or 'working tree'} (median of {runs} processes)")
+    print(f"  import create_functions: {import_ms:7.2f} ms")
+    print(f"  first query:             {first_query_ms:7.2f} ms")
+    print(f"  second query:            {second_query_ms:7.2f} ms")
+    print(f"  import create_procedures: {import_procedures_ms:6.2f} ms")
@@ -0,0 +1,85 @@
+# CPU time per execution of the point lookups of create_functions.py, building the select() construct on every
+# call (as before statements.py) compared with executing the prebuilt statement of the registry.
+# Runs on a copy of the example database (brought up to the current schema); also prints the compiled cache
+# statistics of the registry.
+#
+#   python benchmarks/bench_statements.py [executions]
+
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts', 'python'))
+
+import create_functions  # noqa: E402, F401 (registers the statements)
+import database  # noqa: E402
+import statements  # noqa: E402
+from generate_data import build_database  # noqa: E402
+
+as_of = date(2023, 6, 1)
+
+# parameters of every registered statement
+parameters = {
+    'members_exists': {'record_id': 1},
+    'trainers_exists': {'record_id': 1},
+    'classes_exists': {'record_id': 1},
+    'weekdays_exists': {'record_id': 1},
+    'classtypes_exists': {'record_id': 1},
+    'trainer_name': {'trainer_id': 1},
+    'member_name': {'member_id': 1},
+    'class_and_weekday': {'class_id': 1},
+    'weekday_name': {'weekday_id': 1},
+    'registrations_by_year': {'start': date(2022, 1, 1), 'end': date(2023, 1, 1)},
+    'membership': {'member_id': 1},
+    'classes_by_trainer': {'trainer_id': 1, 'weekday_id': 2},
+    'member_instructor': {'member_id': 1, 'class_id': 1},
+    'occupancy': {'class_id': 1, 'today': as_of},
+    'occupancy_as_of': {'class_id': 1, 'as_of': as_of},
+    'member_registered': {'member_id': 1, 'class_id': 1},
+    'member_registered_as_of': {'member_id': 1, 'class_id': 1, 'as_of': as_of},
+    'max_spots': {'class_id': 1},
+    'participants': {'as_of': as_of},
+    'participants_by_classtype': {'classtype_id': 1, 'as_of': as_of},
+    'occupancy_timeline': {'class_id': 1, 'start': date(2023, 1, 1), 'end': date(2023, 12, 31)},
+    'search_persons': {'terms': '"schwan"', 'limit': 20},
+}
+
+
+# CPU seconds per execution
+def measure(connection, get_statement, statement_parameters, executions):
+    for _ in range(executions // 10):
+        connection.execute(get_statement(), statement_parameters).fetchall()
+    start = time.process_time()
+    for _ in range(executions):
+        connection.execute(get_statement(), statement_parameters).fetchall()
+    return (time.process_time() - start) / executions
+
+
+if __name__ == '__main__':
+    executions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        database_file = os.path.join(work_dir, 'mygym.db')
+        build_database(database_file, source_file=os.path.join(ROOT_DIR, 'data', 'mygym.db'))
+
+        total_built = total_prebuilt = 0
+        with database.get_engine().connect() as connection:
+            for name, build in statements.builders.items():
+                prebuilt = statements.registry[name]
+                built_seconds = measure(connection, build, parameters[name], executions)
+                prebuilt_seconds = measure(connection, lambda: prebuilt, parameters[name], executions)
+                total_built += built_seconds
+                total_prebuilt += prebuilt_seconds
+                print(f"{name:<27} built per call: {built_seconds * 1e6:7.1f} us   "
+                      f"prebuilt: {prebuilt_seconds * 1e6:7.1f} us   "
+                      f"saving: {(built_seconds - prebuilt_seconds) * 1e6:6.1f} us")
+
+        print(f"{'all statements':<27} built per call: {total_built * 1e6:7.1f} us   "
+              f"prebuilt: {total_prebuilt * 1e6:7.1f} us   speed-up: {total_built / total_prebuilt:5.2f}x")
+
+        for name, statistics in statements.statement_statistics().items():
+            print(f"{name:<27} executions: {statistics['executions']:>6}   hit ratio: {statistics['hit_ratio']:.4f}")
+        database.configure_engine()
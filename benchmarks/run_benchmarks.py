@@ -0,0 +1,198 @@
+# Benchmark suite for every function, procedure, view and trigger at several dataset scales.
+# The datasets are generated with generate_data.py into temporary databases. Results are written
+# as JSON and compared against a stored baseline; a benchmark whose median is slower than the
+# baseline by more than the tolerance counts as a regression (exit code 1).
+#
+#   python benchmarks/run_benchmarks.py [--scales 1000 10000 100000] [--calls 200]
+#                                       [--output benchmarks/results.json] [--baseline benchmarks/baseline.json]
+#                                       [--tolerance 0.25] [--save-baseline] [--profile default] [--repeats 1]
+#
+# The stored baseline was measured on one machine; save a new one before comparing on another.
+# With --repeats the whole suite runs several times and every benchmark keeps the run with the median p50,
+# which evens out the noise of single runs (the stored baseline was saved with --repeats 5).
+# The SQLite profile (database.sqlite_profiles) is pinned by --profile, not taken from MYGYM_SQLITE_PROFILE,
+# and stored with the results; a baseline is only compared against runs with its profile.
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from itertools import cycle
+
+import sqlalchemy
+from sqlalchemy import text
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts', 'python'))
+
+import create_functions as crfunc  # noqa: E402
+import create_procedures as crprod  # noqa: E402
+import database  # noqa: E402
+from generate_data import build_database  # noqa: E402
+
+BASELINE_FILE = os.path.join(ROOT_DIR, 'benchmarks', 'baseline.json')
+views = ['vw_classes', 'vw_registrations', 'vw_trainersasparticipants', 'vw_employeesasinstructors',
+         'vw_yogaparticipants']
+
+
+def scan_view(view):
+    with database.get_engine().connect() as connection:
+        return connection.execute(text(f"SELECT * FROM {view}")).fetchall()
+
+
+# Setting a leavedate makes tr_update_leaving end all open registrations of the member
+def set_leavedate(person_ids):
+    person_id = next(person_ids)
+    with database.get_engine().begin() as connection:
+        connection.execute(text("UPDATE persons SET leavedate = :leavedate WHERE id = :person_id"),
+                           {'leavedate': (date.today() + timedelta(days=30)).isoformat(), 'person_id': person_id})
+
+
+# benchmark name -> (call taking a random generator, whether it is a full scan called fewer times)
+def get_benchmarks(connection):
+    member_ids = connection.execute(text("SELECT id FROM members")).scalars().all()
+    class_ids = connection.execute(text("SELECT id FROM classes")).scalars().all()
+    trainer_ids = connection.execute(text("SELECT id FROM trainers")).scalars().all()
+    # members still active with open registrations, one per tr_update_leaving call (repeated when exhausted)
+    leaving_person_ids = cycle(connection.execute(text("""
+        SELECT DISTINCT members.person_id
+        FROM members
+        INNER JOIN persons ON members.person_id = persons.id
+        INNER JOIN registrations ON members.id = registrations.member_id
+        WHERE persons.leavedate IS NULL AND registrations.enddate IS NULL
+        ORDER BY members.person_id
+    """)).scalars().all())
+
+    benchmarks = {
+        'count_registrations_by_year': (lambda rng: crfunc.count_registrations_by_year(rng.randint(2015, 2024)), False),
+        'is_membership_terminated': (lambda rng: crfunc.is_membership_terminated(rng.choice(member_ids)), False),
+        'get_classes_by_trainer': (lambda rng: crfunc.get_classes_by_trainer(rng.choice(trainer_ids),
+                                                                             rng.randint(1, 7)), False),
+        'is_member_instructor': (lambda rng: crfunc.is_member_instructor(rng.choice(member_ids),
+                                                                         rng.choice(class_ids)), False),
+        'get_registrations_by_class': (lambda rng: crfunc.get_registrations_by_class(rng.choice(class_ids)), False),
+        'is_member_registered': (lambda rng: crfunc.is_member_registered(rng.choice(member_ids),
+                                                                         rng.choice(class_ids)), False),
+        'count_free_spots_by_class': (lambda rng: crfunc.count_free_spots_by_class(rng.choice(class_ids)), False),
+        'add_registration': (lambda rng: crprod.add_registration(rng.choice(member_ids), rng.choice(class_ids)),
+                             False),
+        'tr_update_leaving': (lambda rng: set_leavedate(leaving_person_ids), False),
+    }
+    for view in views:
+        benchmarks[view] = (lambda rng, view=view: scan_view(view), True)
+    return benchmarks
+
+
+def percentile(sorted_timings, fraction):
+    return sorted_timings[min(len(sorted_timings) - 1, int(len(sorted_timings) * fraction))]
+
+
+def measure(call, calls, seed):
+    rng = random.Random(seed)
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call(rng)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return {
+        'calls': calls,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'throughput_per_s': calls / sum(timings),
+    }
+
+
+def run(scales, calls, scan_calls):
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for persons in scales:
+            build_database(os.path.join(work_dir, f'mygym_{persons}.db'), persons, seed=persons)
+            with database.get_engine().connect() as connection:
+                benchmarks = get_benchmarks(connection)
+
+            results[str(persons)] = {}
+            for name, (call, full_scan) in benchmarks.items():
+                result = measure(call, scan_calls if full_scan else calls, seed=persons)
+                results[str(persons)][name] = result
+                print(f"{persons:>8} persons  {name:<28} p50 {result['p50_ms']:8.3f} ms  "
+                      f"p95 {result['p95_ms']:8.3f} ms  p99 {result['p99_ms']:8.3f} ms  "
+                      f"{result['throughput_per_s']:9.0f} calls/s")
+            database.configure_engine()
+    return results
+
+
+# per scale and benchmark the result of the run with the median p50
+def median_results(runs):
+    results = {}
+    for persons, benchmarks in runs[0].items():
+        results[persons] = {}
+        for name in benchmarks:
+            measured = sorted((run[persons][name] for run in runs), key=lambda result: result['p50_ms'])
+            results[persons][name] = measured[len(measured) // 2]
+    return results
+
+
+# benchmarks whose median got slower than the baseline by more than the tolerance
+def compare(results, baseline, tolerance):
+    regressions = []
+    for persons, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            expected = baseline.get(persons, {}).get(name)
+            if expected and result['p50_ms'] > expected['p50_ms'] * (1 + tolerance):
+                regressions.append((persons, name, expected['p50_ms'], result['p50_ms']))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark functions, procedures, views and triggers.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--scan-calls', type=int, default=20)
+    parser.add_argument('--output', default=os.path.join(ROOT_DIR, 'benchmarks', 'results.json'))
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--profile', default='default', choices=sorted(database.sqlite_profiles),
+                        help='SQLite profile of the benchmark databases')
+    parser.add_argument('--repeats', type=int, default=1, help='runs of the suite, the median run is kept')
+    args = parser.parse_args()
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        baseline_profile = baseline['environment'].get('sqlite_profile')
+        if baseline_profile != args.profile:
+            sys.exit(f"{args.baseline} was measured with the SQLite profile {baseline_profile}, "
+                     f"run with --profile {baseline_profile} or save a new baseline")
+
+    database.configure_engine(sqlite_profile=args.profile)
+    results = median_results([run(args.scales, args.calls, args.scan_calls) for _ in range(args.repeats)])
+    report = {
+        'environment': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                        'sqlalchemy': sqlalchemy.__version__, 'machine': platform.machine(),
+                        'sqlite_profile': args.profile},
+        'results': results,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as output:
+            json.dump(report, output, indent=2)
+        print(f"baseline saved to {args.baseline}")
+    elif baseline is not None:
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for persons, name, expected, measured in regressions:
+            print(f"REGRESSION {name} at {persons} persons: p50 {measured:.3f} ms (baseline {expected:.3f} ms)")
+        print(f"{len(regressions)} regression(s) against {args.baseline}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,112 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+import create_functions as crfunc
+import create_procedures as crprod
+import database
+
+# Async variants of the functions and procedures for asyncio applications.
+# aiosqlite is not a dependency of the project, so the blocking calls run on a dedicated thread pool, each thread
+# taking its own connection from the engine pool. Independent calls can run concurrently with asyncio.gather():
+#
+#   import async_api
+#   terminated, registered = await asyncio.gather(async_api.is_membership_terminated(1),
+#                                                 async_api.is_member_registered(1, 1))
+#   message = await async_api.add_registration(1, 1)
+#
+# Only use it inside an asyncio application, where calling the sync functions would block the event loop for the
+# whole call, including the wait for the write lock while another process writes: async_api keeps the loop running
+# and lets the other requests go on with their reads meanwhile. It doesn't make a call faster: with nothing to wait
+# for, the hand-over to the threads makes the requests slower than the sync path. benchmarks/bench_async.py measures
+# both cases. Scripts and threaded applications call create_functions.py and create_procedures.py directly.
+
+# number of database threads, by default as many as the engine keeps connections
+settings = {
+    'workers': int(os.environ.get('MYGYM_ASYNC_WORKERS', database.settings['pool_size'])),
+}
+
+executor = None
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=settings['workers'], thread_name_prefix='mygym-db')
+    return executor
+
+
+# Wait for the running calls and stop the threads; the next call starts a new pool
+def shutdown():
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=True)
+        executor = None
+
+
+# Run a blocking function on the database threads (with the context variables of the caller, e.g. the API call
+# of instrumentation.py)
+async def run_sync(function, *args, **kwargs):
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_executor(),
+                                                            partial(context.run, function, *args, **kwargs))
+
+
+def to_async(function):
+    @wraps(function)
+    async def wrapper(*args, **kwargs):
+        return await run_sync(function, *args, **kwargs)
+    return wrapper
+
+
+# lookups
+check_member_exists = to_async(crfunc.check_member_exists)
+check_trainer_exists = to_async(crfunc.check_trainer_exists)
+check_class_exists = to_async(crfunc.check_class_exists)
+check_weekday_exists = to_async(crfunc.check_weekday_exists)
+check_classtype_exists = to_async(crfunc.check_classtype_exists)
+get_person_name = to_async(crfunc.get_person_name)
+get_class_and_weekday = to_async(crfunc.get_class_and_weekday)
+get_weekday_name = to_async(crfunc.get_weekday_name)
+
+# functions
+count_registrations_by_year = to_async(crfunc.count_registrations_by_year)
+count_registrations_by_period = to_async(crfunc.count_registrations_by_period)
+is_membership_terminated = to_async(crfunc.is_membership_terminated)
+get_classes_by_trainer = to_async(crfunc.get_classes_by_trainer)
+is_member_instructor = to_async(crfunc.is_member_instructor)
+get_registrations_by_class = to_async(crfunc.get_registrations_by_class)
+is_member_registered = to_async(crfunc.is_member_registered)
+count_free_spots_by_class = to_async(crfunc.count_free_spots_by_class)
+get_participants_by_classtype = to_async(crfunc.get_participants_by_classtype)
+get_participants_by_classtypes = to_async(crfunc.get_participants_by_classtypes)
+get_occupancy_timeline = to_async(crfunc.get_occupancy_timeline)
+search_persons = to_async(crfunc.search_persons)
+
+# batch functions
+is_membership_terminated_batch = to_async(crfunc.is_membership_terminated_batch)
+get_classes_by_trainer_batch = to_async(crfunc.get_classes_by_trainer_batch)
+is_member_instructor_batch = to_async(crfunc.is_member_instructor_batch)
+get_registrations_by_class_batch = to_async(crfunc.get_registrations_by_class_batch)
+is_member_registered_batch = to_async(crfunc.is_member_registered_batch)
+count_free_spots_by_class_batch = to_async(crfunc.count_free_spots_by_class_batch)
+count_registrations_by_class_batch = to_async(crfunc.count_registrations_by_class_batch)
+
+# procedures
+register_member = to_async(crprod.register_member)
+add_registration = to_async(crprod.add_registration)
+add_registrations = to_async(crprod.add_registrations)
+process_departures = to_async(crprod.process_departures)
+
+
+# The checks shown before a member registers for a class, run concurrently:
+# (membership terminated, registered, instructor, free spots)
+async def get_registration_checks(member_id, class_id):
+    terminated, registered, instructor, free_spots = await asyncio.gather(
+        is_membership_terminated(member_id),
+        is_member_registered(member_id, class_id),
+        is_member_instructor(member_id, class_id),
+        count_free_spots_by_class(class_id))
+    return terminated[0], registered[-1], instructor[-1], free_spots[-1]
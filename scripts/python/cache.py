@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import get_engine
+
+# Read-through cache for reference lookups (weekdays, class types, person names, ...), which rarely change.
+# Every cache is bounded (least recently used entries are evicted) and its entries expire after a TTL.
+# Commits of ORM sessions clear the caches depending on the written tables; writes through Core or plain SQL
+# should call invalidate() with the table names, otherwise their changes are visible after the TTL at the latest.
+
+# settings, can be overridden through environment variables
+settings = {
+    'enabled': os.environ.get('MYGYM_CACHE', '1') == '1',
+    'maxsize': int(os.environ.get('MYGYM_CACHE_SIZE', 1024)),
+    'ttl': float(os.environ.get('MYGYM_CACHE_TTL', 300)),
+    # databases (engines) with their own entries, e.g. the shards of sharding.py
+    'engines': int(os.environ.get('MYGYM_CACHE_ENGINES', 8)),
+}
+
+# qualified function name (module.function) -> LookupCache
+caches = {}
+
+
+class LookupCache:
+    def __init__(self, name, tables, maxsize, ttl):
+        self.name = name
+        self.tables = set(tables)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # engine the entries were read from -> (key -> (expiry time, value)), least recently used first;
+        # a new engine (other database) starts with empty entries, the least recently used engine is dropped
+        self.partitions = OrderedDict()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    # (True, value) if the key is cached and not expired, else (False, None)
+    def get(self, engine, key):
+        with self.lock:
+            entry = self.partitions.get(engine, {}).get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.partitions[engine].move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1]
+                del self.partitions[engine][key]
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, engine, key, value):
+        with self.lock:
+            if engine not in self.partitions:
+                self.partitions[engine] = OrderedDict()
+                while len(self.partitions) > settings['engines']:
+                    self.partitions.popitem(last=False)
+            self.partitions.move_to_end(engine)
+
+            entries = self.partitions[engine]
+            entries[key] = (time.monotonic() + self.ttl, value)
+            entries.move_to_end(key)
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.partitions.clear()
+
+    def statistics(self):
+        with self.lock:
+            size = sum(len(entries) for entries in self.partitions.values())
+            return {'hits': self.hits, 'misses': self.misses, 'size': size, 'maxsize': self.maxsize,
+                    'evictions': self.evictions, 'expirations': self.expirations}
+
+
+# Decorator caching the results of a lookup function reading the given tables.
+# Empty results (record not found) are not cached, so new records are found right away.
+# The entries are kept per engine the lookup reads from, get_engine() unless engine_of (called with the arguments
+# of the lookup) picks another one, e.g. database.get_class_engine for lookups by class ID.
+def cached(*tables, maxsize=None, ttl=None, engine_of=None):
+    def decorator(function):
+        cache = LookupCache(f'{function.__module__}.{function.__name__}', tables, maxsize or settings['maxsize'],
+                            ttl or settings['ttl'])
+        caches[cache.name] = cache
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not settings['enabled']:
+                return function(*args, **kwargs)
+
+            engine = engine_of(*args, **kwargs) if engine_of else get_engine()
+            key = (args, tuple(sorted(kwargs.items())))
+            found, value = cache.get(engine, key)
+            if not found:
+                value = function(*args, **kwargs)
+                if value:
+                    cache.put(engine, key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+# Clear the caches reading any of the tables (all caches without tables)
+def invalidate(*tables):
+    for cache in caches.values():
+        if not tables or cache.tables.intersection(tables):
+            cache.clear()
+
+
+# cache name -> hits, misses, size, maxsize, evictions, expirations
+def cache_statistics():
+    return {name: cache.statistics() for name, cache in caches.items()}
+
+
+# tables written by an ORM session are collected at every flush and invalidated once the transaction commits
+@event.listens_for(Session, 'after_flush')
+def collect_written_tables(session, flush_context):
+    written_tables = session.info.setdefault('written_tables', set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        written_tables.add(instance.__table__.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_written_tables(session):
+    written_tables = session.info.pop('written_tables', None)
+    if written_tables:
+        invalidate(*written_tables)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_written_tables(session):
+    session.info.pop('written_tables', None)
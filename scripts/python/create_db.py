@@ -1,6 +1,9 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, Time, ForeignKey, UniqueConstraint, CheckConstraint
+from sqlalchemy import Column, Integer, String, Date, Time, ForeignKey, UniqueConstraint, CheckConstraint, Index
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
+from database import get_engine
+from create_trigger import create_triggers
+from create_views import create_views
 
 # create a base class
 Base = declarative_base()
@@ -29,6 +32,9 @@ class Person(Base):
 
     __table_args__ = (
         CheckConstraint('leavedate IS NULL OR leavedate > enterdate', name='check_leavedate'),
+        Index('ix_persons_enterdate', 'enterdate'),
+        Index('ix_persons_leavedate', 'leavedate'),
+        Index('ix_persons_city_id', 'city_id'),
     )
 
     def __repr__(self):
@@ -116,6 +122,7 @@ class ClassType(Base):
 
     __table_args__ = (
         CheckConstraint('maxparticipants > 0', name='check_maxparticipants'),
+        Index('ix_classtypes_room_id', 'room_id'),
     )
 
     def __repr__(self):
@@ -147,6 +154,7 @@ class ClassOffering(Base):
 
     __table_args__ = (
         UniqueConstraint('classtype_id', 'trainer_id', name='uix_classtype_trainer'),
+        Index('ix_classofferings_trainer_id', 'trainer_id'),
     )
 
     def __repr__(self):
@@ -164,9 +172,11 @@ class Class(Base):
     classoffering = relationship('ClassOffering', back_populates='classes')
     weekday = relationship('Weekday', back_populates='classes')
     registrations = relationship('Registration', back_populates='class_')
+    occupancy = relationship('ClassOccupancy', back_populates='class_', uselist=False)
 
     __table_args__ = (
         UniqueConstraint('classoffering_id', 'weekday_id', 'time', name='uix_classoffering_weekday_time'),
+        Index('ix_classes_weekday_id', 'weekday_id'),
     )
 
     def __repr__(self):
@@ -202,6 +212,8 @@ class Registration(Base):
     __table_args__ = (
         UniqueConstraint('class_id', 'member_id', name='uix_class_member'),
         CheckConstraint('enddate IS NULL OR enddate > startdate', name='check_enddate'),
+        Index('ix_registrations_member_id', 'member_id'),
+        Index('ix_registrations_class_id_startdate', 'class_id', 'startdate', 'enddate'),
     )
 
     def __repr__(self):
@@ -209,10 +221,39 @@ class Registration(Base):
                 f"startdate={self.startdate}, enddate={self.enddate})>")
 
 
-# create database engine
-engine = create_engine('sqlite:///data/mygym.db')
+# number of active registrations (started and without an enddate in the past) per class as of the day counted_on,
+# maintained by triggers; counts of an earlier day are recounted before they are used (see create_trigger.py)
+class ClassOccupancy(Base):
+    __tablename__ = 'class_occupancy'
 
-# create tables
-Base.metadata.create_all(engine)
+    class_id = Column(Integer, ForeignKey('classes.id'), primary_key=True, nullable=False)
+    registrations = Column(Integer, nullable=False, default=0)
+    counted_on = Column(Date)
+
+    class_ = relationship('Class', back_populates='occupancy')
+
+    def __repr__(self):
+        return f"<ClassOccupancy(class_id={self.class_id}, registrations={self.registrations})>"
+
+
+# create tables, and the indexes that are missing on already existing tables
+def create_schema():
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+# bring a database up to date: schema, views and triggers (which also recount class_occupancy and rebuild the
+# search index)
+def migrate_database():
+    create_schema()
+    create_views()
+    create_triggers()
+
+
+if __name__ == '__main__':
+    migrate_database()
 
 # %%
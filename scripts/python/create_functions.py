@@ -1,107 +1,220 @@
-from sqlalchemy import create_engine, Table, MetaData, select, func, and_
-from datetime import datetime
-
-# create database engine
-engine = create_engine('sqlite:///data/mygym.db')
-
-# load metadata
-metadata = MetaData()
-persons = Table('persons', metadata, autoload_with=engine)
-members = Table('members', metadata, autoload_with=engine)
-employees = Table('employees', metadata, autoload_with=engine)
-trainers = Table('trainers', metadata, autoload_with=engine)
-classes = Table('classes', metadata, autoload_with=engine)
-classtypes = Table('classtypes', metadata, autoload_with=engine)
-classofferings = Table('classofferings', metadata, autoload_with=engine)
-registrations = Table('registrations', metadata, autoload_with=engine)
-weekdays = Table('weekdays', metadata, autoload_with=engine)
-
-
-# generalized functions to check existence of records
-def check_exists(table, record_id, engine):
-    with engine.connect() as connection:
-        query = select(table.c.id).where(table.c.id == record_id)
-        result = connection.execute(query).fetchone()
+from sqlalchemy import select, func, and_, or_, case, bindparam, text, Date
+from datetime import datetime, date, timedelta
+from collections import Counter, defaultdict
+from itertools import groupby
+import json
+from database import get_engine, get_class_engine
+from instrumentation import api_call
+from cache import cached
+from statements import register
+from create_db import (Person, Member, Employee, Trainer, Class, ClassType, ClassOffering, Registration, Weekday,
+                       ClassOccupancy)
+
+# tables of the declarative models (no reflection needed)
+persons = Person.__table__
+members = Member.__table__
+employees = Employee.__table__
+trainers = Trainer.__table__
+classes = Class.__table__
+classtypes = ClassType.__table__
+classofferings = ClassOffering.__table__
+registrations = Registration.__table__
+weekdays = Weekday.__table__
+class_occupancy = ClassOccupancy.__table__
+
+
+# prebuilt statements of the point lookups (see statements.py), table name -> existence check
+def build_exists_query(table):
+    return select(table.c.id).where(table.c.id == bindparam('record_id'))
+
+
+exists_queries = {table.name: register(f'{table.name}_exists', lambda table=table: build_exists_query(table))
+                  for table in (members, trainers, classes, weekdays, classtypes)}
+
+query_trainer_name = register('trainer_name', lambda: select(
+    persons.c.surname, persons.c.forename
+).select_from(persons
+              .join(employees, persons.c.id == employees.c.person_id)
+              .join(trainers, employees.c.id == trainers.c.employee_id)
+              ).where(trainers.c.id == bindparam('trainer_id')))
+
+query_member_name = register('member_name', lambda: select(
+    persons.c.surname, persons.c.forename
+).select_from(persons
+              .join(members, persons.c.id == members.c.person_id)
+              ).where(members.c.id == bindparam('member_id')))
+
+query_class_and_weekday = register('class_and_weekday', lambda: select(
+    classtypes.c.name, weekdays.c.name
+).select_from(classes
+              .join(classofferings, classes.c.classoffering_id == classofferings.c.id)
+              .join(classtypes, classofferings.c.classtype_id == classtypes.c.id)
+              .join(weekdays, classes.c.weekday_id == weekdays.c.id)
+              ).where(classes.c.id == bindparam('class_id')))
+
+query_weekday_name = register('weekday_name', lambda: select(
+    weekdays.c.name
+).where(weekdays.c.id == bindparam('weekday_id')))
+
+
+# generalized functions to check existence of records (on the given engine, default get_engine())
+def check_exists(table, record_id, engine=None):
+    with (engine or get_engine()).connect() as connection:
+        result = connection.execute(exists_queries[table.name], {'record_id': record_id}).fetchone()
         return result is not None
 
 
+@api_call
 def check_member_exists(member_id):
-    return check_exists(members, member_id, engine)
+    return check_exists(members, member_id)
 
 
+@api_call
 def check_trainer_exists(trainer_id):
-    return check_exists(trainers, trainer_id, engine)
+    return check_exists(trainers, trainer_id)
 
 
+@api_call
+@cached('classes', engine_of=get_class_engine)
 def check_class_exists(class_id):
-    return check_exists(classes, class_id, engine)
+    return check_exists(classes, class_id, get_class_engine(class_id))
 
 
+@api_call
+@cached('weekdays')
 def check_weekday_exists(weekday_id):
-    return check_exists(weekdays, weekday_id, engine)
+    return check_exists(weekdays, weekday_id)
 
 
-# generalized functions to get record information
+@api_call
+@cached('classtypes')
+def check_classtype_exists(classtype_id):
+    return check_exists(classtypes, classtype_id)
+
+
+# generalized functions to get record information (cached, they rarely change)
+@api_call
+@cached('persons', 'members', 'employees', 'trainers')
 def get_person_name(member_id=None, trainer_id=None):
-    with engine.connect() as connection:
+    with get_engine().connect() as connection:
         if trainer_id:
-            query = select(persons.c.surname, persons.c.forename
-                           ).select_from(persons
-                                         .join(employees, persons.c.id == employees.c.person_id)
-                                         .join(trainers, employees.c.id == trainers.c.employee_id)
-                                         ).where(trainers.c.id == trainer_id)
+            result = connection.execute(query_trainer_name, {'trainer_id': trainer_id}).fetchone()
 
         elif member_id:
-            query = select(persons.c.surname, persons.c.forename
-                           ).select_from(persons
-                                         .join(members, persons.c.id == members.c.person_id)
-                                         ).where(members.c.id == member_id)
+            result = connection.execute(query_member_name, {'member_id': member_id}).fetchone()
 
-        result = connection.execute(query).fetchone()
         return result
 
 
+@api_call
+@cached('classes', 'classofferings', 'classtypes', 'weekdays', engine_of=get_class_engine)
 def get_class_and_weekday(class_id):
-    with engine.connect() as connection:
-        query = select(classtypes.c.name, weekdays.c.name
-                       ).select_from(classes
-                                     .join(classofferings, classes.c.classoffering_id == classofferings.c.id)
-                                     .join(classtypes, classofferings.c.classtype_id == classtypes.c.id)
-                                     .join(weekdays, classes.c.weekday_id == weekdays.c.id)
-                                     ).where(classes.c.id == class_id)
-
-        result = connection.execute(query).fetchone()
+    with get_class_engine(class_id).connect() as connection:
+        result = connection.execute(query_class_and_weekday, {'class_id': class_id}).fetchone()
         return result
 
 
+@api_call
+@cached('weekdays')
+def get_weekday_name(weekday_id):
+    with get_engine().connect() as connection:
+        result = connection.execute(query_weekday_name, {'weekday_id': weekday_id}).fetchone()
+        return result[0] if result else None
+
+
 # create (table-valued / scalar-valued) functions
+# half-open date range, so the index on enterdate can be used
+query_registrations_by_year = register('registrations_by_year', lambda: select(
+    func.count()
+).where(and_(persons.c.enterdate >= bindparam('start'), persons.c.enterdate < bindparam('end'))))
+
+
 # 1. How many persons registered in the year ### ?
+@api_call
 def count_registrations_by_year(year):
-    with engine.connect() as connection:
-        query = select(func.count()
-                       ).where(func.strftime('%Y', persons.c.enterdate) == str(year))
-
-        result = connection.execute(query).fetchone()
+    with get_engine().connect() as connection:
+        result = connection.execute(query_registrations_by_year,
+                                    {'start': date(year, 1, 1), 'end': date(year + 1, 1, 1)}).fetchone()
         return result[0] if result else 0
 
 
-# 2. Has the member with the ID ### terminated its membership?
-def is_membership_terminated(member_id):
+# first day of the year / month / week (starting on Monday) of a date, in SQL and in Python
+period_starts = {
+    'year': lambda day: func.strftime('%Y-01-01', day),
+    'month': lambda day: func.strftime('%Y-%m-01', day),
+    'week': lambda day: func.date(day, 'weekday 0', '-6 days'),
+}
+
+
+def get_period_start(day, granularity):
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day - timedelta(days=day.weekday())
+
+
+def get_next_period_start(period_start, granularity):
+    if granularity == 'year':
+        return period_start.replace(year=period_start.year + 1)
+    if granularity == 'month':
+        return (period_start + timedelta(days=31)).replace(day=1)
+    return period_start + timedelta(days=7)
+
+
+# 1. How many persons registered per year / month / week from ### (inclusive) to ### (exclusive)?
+@api_call
+def count_registrations_by_period(start, end, granularity='year'):
+    if granularity not in period_starts:
+        raise ValueError(f"Granularity {granularity} doesn't exist, use one of {', '.join(period_starts)}!")
+
+    with get_engine().connect() as connection:
+        period_start = period_starts[granularity](persons.c.enterdate).label('period_start')
+        query = select(period_start, func.count()
+                       ).where(and_(persons.c.enterdate >= start, persons.c.enterdate < end)
+                               ).group_by(period_start)
+
+        result = dict(connection.execute(query).fetchall())
+
+    # one entry per period, including periods without registrations
+    histogram = []
+    period = get_period_start(start, granularity)
+    while period < end:
+        histogram.append((period, result.get(period.isoformat(), 0)))
+        period = get_next_period_start(period, granularity)
+    return histogram
+
+
+query_membership = register('membership', lambda: select(
+    persons.c.surname, persons.c.forename, persons.c.leavedate
+).join(members, persons.c.id == members.c.person_id
+       ).where(members.c.id == bindparam('member_id')))
+
+
+# 2. Has the member with the ID ### terminated its membership (on date ###, default today)?
+@api_call
+def is_membership_terminated(member_id, as_of=None):
     # check existence of member_id
     if not check_member_exists(member_id):
         raise ValueError(f"Member with ID {member_id} not found.")
 
-    with engine.connect() as connection:
-        query = select(persons.c.surname, persons.c.forename, persons.c.leavedate
-                       ).join(members, persons.c.id == members.c.person_id
-                              ).where(members.c.id == member_id)
-
-        result = connection.execute(query).fetchone()
+    with get_engine().connect() as connection:
+        result = connection.execute(query_membership, {'member_id': member_id}).fetchone()
         surname, forename, leavedate = result
-        return (leavedate is not None and leavedate < datetime.now().date()), forename, surname
+        return (leavedate is not None and leavedate < (as_of or datetime.now().date())), forename, surname
+
+
+query_classes_by_trainer = register('classes_by_trainer', lambda: select(
+    classtypes.c.name, classes.c.time
+).select_from(classtypes
+              .join(classofferings, classtypes.c.id == classofferings.c.classtype_id)
+              .join(classes, classofferings.c.id == classes.c.classoffering_id)
+              ).where(and_(classofferings.c.trainer_id == bindparam('trainer_id'),
+                           classes.c.weekday_id == bindparam('weekday_id'))))
 
 
 # 3. Which class(es) does the trainer with the ID ### teach on weekday ID ###?
+@api_call
 def get_classes_by_trainer(trainer_id, weekday_id):
     # check existence of trainer_id
     if not check_trainer_exists(trainer_id):
@@ -114,22 +227,27 @@ def get_classes_by_trainer(trainer_id, weekday_id):
     # get surname and forename of the trainer
     surname, forename = get_person_name(trainer_id=trainer_id)
 
-    with engine.connect() as connection:
-        weekday_query = select(weekdays.c.name).where(weekdays.c.id == weekday_id)
-        weekday = connection.execute(weekday_query).fetchone()[0]
-
-        main_query = select(classtypes.c.name, classes.c.time
-                            ).select_from(classtypes
-                                          .join(classofferings, classtypes.c.id == classofferings.c.classtype_id)
-                                          .join(classes, classofferings.c.id == classes.c.classoffering_id)
-                                          ).where(
-            and_(classofferings.c.trainer_id == trainer_id, classes.c.weekday_id == weekday_id))
+    # get the name of the weekday
+    weekday = get_weekday_name(weekday_id)
 
-        result = connection.execute(main_query).fetchall()
+    with get_engine().connect() as connection:
+        result = connection.execute(query_classes_by_trainer,
+                                    {'trainer_id': trainer_id, 'weekday_id': weekday_id}).fetchall()
         return forename, surname, weekday, result
 
 
+query_member_instructor = register('member_instructor', lambda: select(
+    classes.c.id
+).select_from(classofferings
+              .join(trainers, classofferings.c.trainer_id == trainers.c.id)
+              .join(employees, trainers.c.employee_id == employees.c.id)
+              .join(members, employees.c.person_id == members.c.person_id)
+              .join(classes, classofferings.c.id == classes.c.classoffering_id)
+              ).where(and_(members.c.id == bindparam('member_id'), classes.c.id == bindparam('class_id'))))
+
+
 # 4. Is the member with the ID ### instructor of class ID ###?
+@api_call
 def is_member_instructor(member_id, class_id):
     # check existence of member_id
     if not check_member_exists(member_id):
@@ -145,21 +263,50 @@ def is_member_instructor(member_id, class_id):
     # get the names of class and weekday
     class_, weekday = get_class_and_weekday(class_id)
 
-    with engine.connect() as connection:
-        query = select(classes.c.id
-                       ).select_from(classofferings
-                                     .join(trainers, classofferings.c.trainer_id == trainers.c.id)
-                                     .join(employees, trainers.c.employee_id == employees.c.id)
-                                     .join(members, employees.c.person_id == members.c.person_id)
-                                     .join(classes, classofferings.c.id == classes.c.classoffering_id)
-                                     ).where(and_(members.c.id == member_id, classes.c.id == class_id))
-
-        result = connection.execute(query).fetchone()
+    with get_class_engine(class_id).connect() as connection:
+        result = connection.execute(query_member_instructor, {'member_id': member_id, 'class_id': class_id}).fetchone()
         return forename, surname, class_, weekday, bool(result)
 
 
-# 5. How many members are registered for class ID ###?
-def get_registrations_by_class(class_id):
+# registrations active on a date: started on or before it and not ended before it
+# (class_occupancy counts the registrations active today the same way, see create_trigger.py)
+def active_on(as_of):
+    return and_(registrations.c.startdate <= as_of,
+                or_(registrations.c.enddate.is_(None), registrations.c.enddate >= as_of))
+
+
+# registrations active today: the count kept by the triggers in create_trigger.py if it was counted today,
+# otherwise (no write since the day changed) counted from the registrations
+def occupancy_today(today):
+    counted = select(func.count()).where(and_(registrations.c.class_id == classes.c.id, active_on(today))
+                                         ).scalar_subquery()
+    return case((class_occupancy.c.counted_on >= today, class_occupancy.c.registrations), else_=counted)
+
+
+query_occupancy = register('occupancy', lambda: select(
+    occupancy_today(bindparam('today', type_=Date))
+).select_from(classes
+              .outerjoin(class_occupancy, classes.c.id == class_occupancy.c.class_id)
+              ).where(classes.c.id == bindparam('class_id')))
+
+query_occupancy_as_of = register('occupancy_as_of', lambda: select(
+    func.count()
+).where(and_(registrations.c.class_id == bindparam('class_id'), active_on(bindparam('as_of')))))
+
+
+# number of active registrations of a class, today as maintained by the triggers in create_trigger.py (see
+# occupancy_today), on other dates counted from the registrations
+def get_occupied_spots(connection, class_id, as_of=None):
+    if as_of is None:
+        result = connection.execute(query_occupancy, {'class_id': class_id, 'today': date.today()}).fetchone()
+    else:
+        result = connection.execute(query_occupancy_as_of, {'class_id': class_id, 'as_of': as_of}).fetchone()
+    return result[0] if result else 0
+
+
+# 5. How many members are registered for class ID ### (on date ###, default today)?
+@api_call
+def get_registrations_by_class(class_id, as_of=None):
     # check existence of class_id
     if not check_class_exists(class_id):
         raise ValueError(f"Class with ID {class_id} not found.")
@@ -167,19 +314,23 @@ def get_registrations_by_class(class_id):
     # get the names of class and weekday
     class_, weekday = get_class_and_weekday(class_id)
 
-    with engine.connect() as connection:
-        query = select(func.count()
-                       ).select_from(registrations
-                                     .join(members, members.c.id == registrations.c.member_id)
-                                     ).where(registrations.c.class_id == class_id)
+    with get_class_engine(class_id).connect() as connection:
+        return class_, weekday, get_occupied_spots(connection, class_id, as_of)
+
 
-        result = connection.execute(query).fetchone()
+query_member_registered = register('member_registered', lambda: select(
+    registrations.c.id
+).where(and_(registrations.c.member_id == bindparam('member_id'), registrations.c.class_id == bindparam('class_id'))))
 
-        return class_, weekday, result[0] if result else 0
+query_member_registered_as_of = register('member_registered_as_of', lambda: select(
+    registrations.c.id
+).where(and_(registrations.c.member_id == bindparam('member_id'), registrations.c.class_id == bindparam('class_id'),
+             active_on(bindparam('as_of')))))
 
 
-# 6. Is the member with the ID ### registered for class ID ###?
-def is_member_registered(member_id, class_id):
+# 6. Is the member with the ID ### registered for class ID ### (at all, or on date ###)?
+@api_call
+def is_member_registered(member_id, class_id, as_of=None):
     # check existence of member_id
     if not check_member_exists(member_id):
         raise ValueError(f"Member with ID {member_id} not found.")
@@ -194,18 +345,27 @@ def is_member_registered(member_id, class_id):
     # get the names of class and weekday
     class_, weekday = get_class_and_weekday(class_id)
 
-    with engine.connect() as connection:
-        query = select(registrations.c.id
-                       ).select_from(registrations
-                                     ).where(
-            and_(registrations.c.member_id == member_id, registrations.c.class_id == class_id))
-
-        result = connection.execute(query).fetchone()
+    with get_class_engine(class_id).connect() as connection:
+        if as_of is None:
+            result = connection.execute(query_member_registered,
+                                        {'member_id': member_id, 'class_id': class_id}).fetchone()
+        else:
+            result = connection.execute(query_member_registered_as_of,
+                                        {'member_id': member_id, 'class_id': class_id, 'as_of': as_of}).fetchone()
         return forename, surname, class_, weekday, bool(result)
 
 
-# 7. How many free spots are available for class ID ###?
-def count_free_spots_by_class(class_id):
+query_max_spots = register('max_spots', lambda: select(
+    classtypes.c.maxparticipants
+).select_from(classes
+              .join(classofferings, classes.c.classoffering_id == classofferings.c.id)
+              .join(classtypes, classofferings.c.classtype_id == classtypes.c.id)
+              ).where(classes.c.id == bindparam('class_id')))
+
+
+# 7. How many free spots are available for class ID ### (on date ###, default today)?
+@api_call
+def count_free_spots_by_class(class_id, as_of=None):
     # check existence of class_id
     if not check_class_exists(class_id):
         raise ValueError(f"Class with ID {class_id} not found.")
@@ -213,21 +373,339 @@ def count_free_spots_by_class(class_id):
     # get the names of class and weekday
     class_, weekday = get_class_and_weekday(class_id)
 
-    with engine.connect() as connection:
-        query_occupied_spots = select(func.count()
-                                      ).select_from(registrations
-                                                    ).where(registrations.c.class_id == class_id)
-
-        occupied_spots = connection.execute(query_occupied_spots).fetchone()[0]
+    with get_class_engine(class_id).connect() as connection:
+        occupied_spots = get_occupied_spots(connection, class_id, as_of)
 
-        query_max_spots = select(classtypes.c.maxparticipants
-                                 ).select_from(classes
-                                               .join(classofferings, classes.c.classoffering_id == classofferings.c.id)
-                                               .join(classtypes, classofferings.c.classtype_id == classtypes.c.id)
-                                               ).where(classes.c.id == class_id)
-
-        max_spots = connection.execute(query_max_spots).fetchone()[0]
+        max_spots = connection.execute(query_max_spots, {'class_id': class_id}).fetchone()[0]
 
         free_spots = max(max_spots - occupied_spots, 0)
 
         return class_, weekday, free_spots
+
+
+# participants (registered on the date and not ended before it) of all classes, by class type
+def participants_query(as_of):
+    return select(classtypes.c.id, persons.c.surname, persons.c.forename, weekdays.c.name, classes.c.time,
+                  registrations.c.startdate
+                  ).select_from(classtypes
+                                .join(classofferings, classtypes.c.id == classofferings.c.classtype_id)
+                                .join(classes, classofferings.c.id == classes.c.classoffering_id)
+                                .join(weekdays, classes.c.weekday_id == weekdays.c.id)
+                                .join(registrations, classes.c.id == registrations.c.class_id)
+                                .join(members, registrations.c.member_id == members.c.id)
+                                .join(persons, members.c.person_id == persons.c.id)
+                                ).where(active_on(as_of)
+                                        ).order_by(classtypes.c.id, classes.c.weekday_id, classes.c.time,
+                                                   registrations.c.startdate, registrations.c.id)
+
+
+query_participants = register('participants', lambda: participants_query(bindparam('as_of')))
+
+query_participants_by_classtype = register('participants_by_classtype', lambda: participants_query(
+    bindparam('as_of')
+).where(classtypes.c.id == bindparam('classtype_id')))
+
+
+# 8. Who participates in the classes of class type ID ### on date ### (default today)?
+@api_call
+def get_participants_by_classtype(classtype_id, as_of=None):
+    # check existence of classtype_id
+    if not check_classtype_exists(classtype_id):
+        raise ValueError(f"Class type with ID {classtype_id} not found.")
+
+    with get_engine().connect() as connection:
+        result = connection.execute(query_participants_by_classtype,
+                                    {'classtype_id': classtype_id, 'as_of': as_of or date.today()}).fetchall()
+        return [row[1:] for row in result]
+
+
+# Participants of all class types on date ### in one query: class type ID -> list of
+# (surname, forename, weekday, time, startdate); class types without participants are left out
+@api_call
+def get_participants_by_classtypes(as_of=None):
+    with get_engine().connect() as connection:
+        result = connection.execute(query_participants, {'as_of': as_of or date.today()})
+        return {classtype_id: [row[1:] for row in rows] for classtype_id, rows in groupby(result, lambda row: row[0])}
+
+
+query_occupancy_timeline = register('occupancy_timeline', lambda: select(
+    registrations.c.startdate, registrations.c.enddate
+).where(and_(registrations.c.class_id == bindparam('class_id'), registrations.c.startdate <= bindparam('end'),
+             or_(registrations.c.enddate.is_(None), registrations.c.enddate >= bindparam('start')))))
+
+
+# 9. How many participants did class ID ### have on every day from ### to ### (inclusive)?
+@api_call
+def get_occupancy_timeline(class_id, start, end):
+    # check existence of class_id
+    if not check_class_exists(class_id):
+        raise ValueError(f"Class with ID {class_id} not found.")
+
+    with get_class_engine(class_id).connect() as connection:
+        result = connection.execute(query_occupancy_timeline,
+                                    {'class_id': class_id, 'start': start, 'end': end}).fetchall()
+
+    # +1 on the first active day of every registration in the range, -1 on the day after its last one,
+    # added up in a single sweep over the days
+    changes = Counter()
+    for startdate, enddate in result:
+        changes[max(startdate, start)] += 1
+        if enddate is not None and enddate < end:
+            changes[enddate + timedelta(days=1)] -= 1
+
+    timeline = []
+    active = 0
+    day = start
+    while day <= end:
+        active += changes[day]
+        timeline.append((day, active))
+        day += timedelta(days=1)
+    return timeline
+
+
+# the best matches of the search index (see create_trigger.py), with their membership, employment and trainer IDs
+query_search_persons = register('search_persons', lambda: text("""
+SELECT
+    persons.id AS person_id,
+    persons.surname,
+    persons.forename,
+    persons.email,
+    persons.mobile,
+    matches.city,
+    members.id AS member_id,
+    employees.id AS employee_id,
+    trainers.id AS trainer_id,
+    persons.leavedate
+FROM
+    (
+        SELECT rowid, city, rank
+        FROM persons_search
+        WHERE persons_search MATCH :terms
+        ORDER BY rank
+        LIMIT :limit
+    ) AS matches
+    INNER JOIN persons ON matches.rowid = persons.id
+    LEFT JOIN members ON persons.id = members.person_id
+    LEFT JOIN employees ON persons.id = employees.person_id
+    LEFT JOIN trainers ON employees.id = trainers.employee_id
+ORDER BY
+    matches.rank
+"""))
+
+
+# search terms in FTS5 syntax: every word of the query as a string (all have to match), words shorter than
+# the 3 characters of a trigram can't be searched and are left out
+def get_search_terms(query):
+    words = [word for word in query.split() if len(word) >= 3]
+    if not words:
+        raise ValueError(f"Search query '{query}' needs a word of at least 3 characters.")
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+
+
+# 10. Which persons match the search ### (parts of names, email addresses, phone numbers, city or postcode)?
+@api_call
+def search_persons(query, limit=20):
+    terms = get_search_terms(query)
+
+    with get_engine().connect() as connection:
+        return connection.execute(query_search_persons, {'terms': terms, 'limit': limit}).fetchall()
+
+
+# batch variants of the functions above
+# They take sequences of IDs (or ID pairs) and answer with one query. The result is columnar
+# (a dict of lists, one entry per found ID or pair) together with all requested IDs that don't exist.
+def to_columns(rows, names):
+    return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+
+def get_missing_ids(requested_ids, found_ids):
+    found_ids = set(found_ids)
+    return sorted({record_id for record_id in requested_ids if record_id not in found_ids})
+
+
+# (position, (ID, ID)) pairs as a table, passed to SQLite as a single JSON parameter
+def pairs_table(positioned_pairs, first_name, second_name):
+    rows = [[position, *pair] for position, pair in positioned_pairs]
+    requests = func.json_each(json.dumps(rows)).table_valued('value')
+    return select(func.json_extract(requests.c.value, '$[0]').label('position'),
+                  func.json_extract(requests.c.value, '$[1]').label(first_name),
+                  func.json_extract(requests.c.value, '$[2]').label(second_name)
+                  ).subquery('requests')
+
+
+# Run query(connection, requests) once per database of the classes (with shards, the shard of their studio),
+# each with the (position, request) pairs of its classes, and merge the rows (which start with the position)
+# in the order of the requests
+def query_by_class_engine(requests, class_id_of, query):
+    by_engine = defaultdict(list)
+    for position, request in enumerate(requests):
+        by_engine[get_class_engine(class_id_of(request))].append((position, request))
+
+    rows = []
+    for engine, engine_requests in by_engine.items():
+        with engine.connect() as connection:
+            rows.extend(query(connection, engine_requests))
+    return [row[1:] for row in sorted(rows, key=lambda row: row[0])]
+
+
+# 2. Have the members with the IDs ### terminated their membership (on date ###, default today)?
+@api_call
+def is_membership_terminated_batch(member_ids, as_of=None):
+    member_ids = list(member_ids)
+
+    with get_engine().connect() as connection:
+        query = select(members.c.id, persons.c.forename, persons.c.surname, persons.c.leavedate
+                       ).join(persons, persons.c.id == members.c.person_id
+                              ).where(members.c.id.in_(member_ids)
+                                      ).order_by(members.c.id)
+
+        result = connection.execute(query).fetchall()
+
+    as_of = as_of or datetime.now().date()
+    columns = to_columns(result, ['member_id', 'forename', 'surname', 'leavedate'])
+    columns['membership_terminated'] = [leavedate is not None and leavedate < as_of
+                                        for leavedate in columns.pop('leavedate')]
+    return columns, {'member_id': get_missing_ids(member_ids, columns['member_id'])}
+
+
+# 3. Which class(es) do the trainers teach on the weekdays, given as (trainer ID, weekday ID) pairs?
+@api_call
+def get_classes_by_trainer_batch(pairs):
+    pairs = [tuple(pair) for pair in pairs]
+    requests = pairs_table(enumerate(pairs), 'trainer_id', 'weekday_id')
+
+    with get_engine().connect() as connection:
+        query = select(requests.c.trainer_id, requests.c.weekday_id, trainers.c.id, weekdays.c.id,
+                       persons.c.forename, persons.c.surname, weekdays.c.name, classtypes.c.name, classes.c.time
+                       ).select_from(requests
+                                     .outerjoin(trainers, trainers.c.id == requests.c.trainer_id)
+                                     .outerjoin(employees, trainers.c.employee_id == employees.c.id)
+                                     .outerjoin(persons, employees.c.person_id == persons.c.id)
+                                     .outerjoin(weekdays, weekdays.c.id == requests.c.weekday_id)
+                                     .outerjoin(classofferings, classofferings.c.trainer_id == trainers.c.id)
+                                     .outerjoin(classes, and_(classofferings.c.id == classes.c.classoffering_id,
+                                                              classes.c.weekday_id == weekdays.c.id))
+                                     .outerjoin(classtypes, classofferings.c.classtype_id == classtypes.c.id)
+                                     ).order_by(requests.c.position, classes.c.time)
+
+        result = connection.execute(query).fetchall()
+
+    # one row per class, pairs without classes don't show up
+    classes_by_trainer = [row for row in result if row[8] is not None]
+    columns = to_columns([row[:2] + row[4:] for row in classes_by_trainer],
+                         ['trainer_id', 'weekday_id', 'forename', 'surname', 'weekday', 'classtype', 'time'])
+    missing = {'trainer_id': get_missing_ids([pair[0] for pair in pairs], [row[2] for row in result]),
+               'weekday_id': get_missing_ids([pair[1] for pair in pairs], [row[3] for row in result])}
+    return columns, missing
+
+
+# 4. Are the members instructors of the classes, given as (member ID, class ID) pairs?
+@api_call
+def is_member_instructor_batch(pairs):
+    pairs = [tuple(pair) for pair in pairs]
+    instructors = employees.alias('instructors')
+
+    def query(connection, positioned_pairs):
+        requests = pairs_table(positioned_pairs, 'member_id', 'class_id')
+        query = select(requests.c.position, requests.c.member_id, requests.c.class_id, members.c.id, classes.c.id,
+                       persons.c.forename, persons.c.surname, classtypes.c.name, weekdays.c.name,
+                       instructors.c.id.is_not(None)
+                       ).select_from(requests
+                                     .outerjoin(members, members.c.id == requests.c.member_id)
+                                     .outerjoin(persons, members.c.person_id == persons.c.id)
+                                     .outerjoin(classes, classes.c.id == requests.c.class_id)
+                                     .outerjoin(classofferings, classes.c.classoffering_id == classofferings.c.id)
+                                     .outerjoin(classtypes, classofferings.c.classtype_id == classtypes.c.id)
+                                     .outerjoin(weekdays, classes.c.weekday_id == weekdays.c.id)
+                                     .outerjoin(trainers, classofferings.c.trainer_id == trainers.c.id)
+                                     .outerjoin(instructors, and_(trainers.c.employee_id == instructors.c.id,
+                                                                  instructors.c.person_id == members.c.person_id))
+                                     ).order_by(requests.c.position)
+        return connection.execute(query).fetchall()
+
+    result = query_by_class_engine(pairs, lambda pair: pair[1], query)
+    return pair_columns(result, pairs, 'member_instructor')
+
+
+# 5. How many members are registered for the classes with the IDs ### (on date ###, default today)?
+@api_call
+def get_registrations_by_class_batch(class_ids, as_of=None):
+    columns, missing = count_registrations_by_class_batch(class_ids, as_of)
+    del columns['maxparticipants']
+    return columns, missing
+
+
+# 6. Are the members registered for the classes, given as (member ID, class ID) pairs (at all, or on date ###)?
+@api_call
+def is_member_registered_batch(pairs, as_of=None):
+    pairs = [tuple(pair) for pair in pairs]
+    registered = and_(registrations.c.member_id == members.c.id, registrations.c.class_id == classes.c.id)
+    if as_of is not None:
+        registered = and_(registered, active_on(as_of))
+
+    def query(connection, positioned_pairs):
+        requests = pairs_table(positioned_pairs, 'member_id', 'class_id')
+        query = select(requests.c.position, requests.c.member_id, requests.c.class_id, members.c.id, classes.c.id,
+                       persons.c.forename, persons.c.surname, classtypes.c.name, weekdays.c.name,
+                       registrations.c.id.is_not(None)
+                       ).select_from(requests
+                                     .outerjoin(members, members.c.id == requests.c.member_id)
+                                     .outerjoin(persons, members.c.person_id == persons.c.id)
+                                     .outerjoin(classes, classes.c.id == requests.c.class_id)
+                                     .outerjoin(classofferings, classes.c.classoffering_id == classofferings.c.id)
+                                     .outerjoin(classtypes, classofferings.c.classtype_id == classtypes.c.id)
+                                     .outerjoin(weekdays, classes.c.weekday_id == weekdays.c.id)
+                                     .outerjoin(registrations, registered)
+                                     ).order_by(requests.c.position)
+        return connection.execute(query).fetchall()
+
+    result = query_by_class_engine(pairs, lambda pair: pair[1], query)
+    return pair_columns(result, pairs, 'member_registered')
+
+
+# 7. How many free spots are available for the classes with the IDs ### (on date ###, default today)?
+@api_call
+def count_free_spots_by_class_batch(class_ids, as_of=None):
+    columns, missing = count_registrations_by_class_batch(class_ids, as_of)
+    columns['free_spots'] = [max(max_spots - occupied_spots, 0) for max_spots, occupied_spots
+                             in zip(columns.pop('maxparticipants'), columns.pop('registrations'))]
+    return columns, missing
+
+
+# active registrations (today or on date ###) and capacity of the classes with the IDs ### in one query
+@api_call
+def count_registrations_by_class_batch(class_ids, as_of=None):
+    class_ids = list(class_ids)
+    if as_of is None:
+        occupied_spots = occupancy_today(date.today())
+    else:
+        occupied_spots = select(func.count()).where(and_(registrations.c.class_id == classes.c.id, active_on(as_of))
+                                                    ).scalar_subquery()
+
+    def query(connection, positioned_ids):
+        query = select(classes.c.id, classtypes.c.name, weekdays.c.name,
+                       occupied_spots, classtypes.c.maxparticipants
+                       ).select_from(classes
+                                     .join(classofferings, classes.c.classoffering_id == classofferings.c.id)
+                                     .join(classtypes, classofferings.c.classtype_id == classtypes.c.id)
+                                     .join(weekdays, classes.c.weekday_id == weekdays.c.id)
+                                     .outerjoin(class_occupancy, classes.c.id == class_occupancy.c.class_id)
+                                     ).where(classes.c.id.in_([class_id for position, class_id in positioned_ids])
+                                             ).order_by(classes.c.id)
+        return [(row[0], *row) for row in connection.execute(query)]
+
+    # ordered by class ID, which takes the place of the position
+    result = query_by_class_engine(sorted(set(class_ids)), lambda class_id: class_id, query)
+
+    columns = to_columns(result, ['class_id', 'classtype', 'weekday', 'registrations', 'maxparticipants'])
+    return columns, {'class_id': get_missing_ids(class_ids, columns['class_id'])}
+
+
+# columnar result of a (member ID, class ID) pair query, skipping pairs with an unknown member or class
+def pair_columns(result, pairs, flag_name):
+    found = [row for row in result if row[2] is not None and row[3] is not None]
+    columns = to_columns([row[:2] + row[4:] for row in found],
+                         ['member_id', 'class_id', 'forename', 'surname', 'classtype', 'weekday', flag_name])
+    missing = {'member_id': get_missing_ids([pair[0] for pair in pairs], [row[2] for row in result]),
+               'class_id': get_missing_ids([pair[1] for pair in pairs], [row[3] for row in result])}
+    return columns, missing
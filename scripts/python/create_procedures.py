@@ -1,52 +1,320 @@
-from sqlalchemy import create_engine, text
-from datetime import datetime
-import create_functions as crfunc
+from sqlalchemy import text, bindparam, Date
+from contextlib import contextmanager
+import json
+from collections import defaultdict
+from datetime import date, datetime
+from enum import Enum
+from database import get_engine, get_class_engine
+from instrumentation import api_call
+from create_trigger import recount_stale_class_occupancy
 
-# create database engine
-engine = create_engine('sqlite:///data/mygym.db')
+
+# result codes of a registration attempt
+class RegistrationStatus(Enum):
+    REGISTERED = 'registered'
+    MEMBER_NOT_FOUND = 'member_not_found'
+    CLASS_NOT_FOUND = 'class_not_found'
+    MEMBERSHIP_TERMINATED = 'membership_terminated'
+    ALREADY_REGISTERED = 'already_registered'
+    MEMBER_IS_INSTRUCTOR = 'member_is_instructor'
+    CLASS_FULL = 'class_full'
+
+
+registration_messages = {
+    RegistrationStatus.REGISTERED: "New participant has registered!",
+    RegistrationStatus.MEMBER_NOT_FOUND: "Member with ID {member_id} not found.",
+    RegistrationStatus.CLASS_NOT_FOUND: "Class with ID {class_id} not found.",
+    RegistrationStatus.MEMBERSHIP_TERMINATED:
+        "{forename} {surname} (ID: {member_id}) has already terminated his/her membership!",
+    RegistrationStatus.ALREADY_REGISTERED:
+        "{forename} {surname} (ID: {member_id}) is already registered for {class_} on {weekday}s!",
+    RegistrationStatus.MEMBER_IS_INSTRUCTOR:
+        "{forename} {surname} (ID: {member_id}) is the instructor of {class_} on {weekday}s!",
+    RegistrationStatus.CLASS_FULL: "There are no more free spots in {class_} on {weekday}s!",
+}
+
+# all eligibility checks for requested (member, class) pairs in a single query
+# (member and class are left joined, so unknown IDs come back as NULL instead of an empty result)
+registration_check = """
+SELECT
+    params.position,
+    members.id AS member_id,
+    persons.forename,
+    persons.surname,
+    persons.leavedate IS NOT NULL AND persons.leavedate < :today AS membership_terminated,
+    classes.id AS class_id,
+    classtypes.name AS classtype,
+    weekdays.name AS weekday,
+    EXISTS (
+        SELECT 1
+        FROM registrations
+        WHERE registrations.member_id = members.id AND registrations.class_id = classes.id
+    ) AS member_registered,
+    EXISTS (
+        SELECT 1
+        FROM trainers
+        INNER JOIN employees ON trainers.employee_id = employees.id
+        WHERE trainers.id = classofferings.trainer_id AND employees.person_id = members.person_id
+    ) AS member_instructor,
+    classtypes.maxparticipants - COALESCE(class_occupancy.registrations, 0) AS free_spots
+FROM
+    {requests} AS params
+    LEFT JOIN members ON members.id = params.member_id
+    LEFT JOIN persons ON members.person_id = persons.id
+    LEFT JOIN classes ON classes.id = params.class_id
+    LEFT JOIN classofferings ON classes.classoffering_id = classofferings.id
+    LEFT JOIN classtypes ON classofferings.classtype_id = classtypes.id
+    LEFT JOIN weekdays ON classes.weekday_id = weekdays.id
+    LEFT JOIN class_occupancy ON classes.id = class_occupancy.class_id
+ORDER BY
+    params.position
+"""
+
+query_registration_check = text(registration_check.format(
+    requests="(SELECT 0 AS position, :member_id AS member_id, :class_id AS class_id)"
+)).bindparams(bindparam('today', type_=Date))
+
+# bulk requests are staged in a temporary table and checked with one join
+query_create_registration_requests = text("""
+CREATE TEMP TABLE registration_requests (
+    position INTEGER PRIMARY KEY,
+    member_id INTEGER,
+    class_id INTEGER
+)
+""")
+
+query_insert_registration_request = text("""
+INSERT INTO temp.registration_requests (position, member_id, class_id)
+VALUES (:position, :member_id, :class_id)
+""")
+
+query_registration_requests_check = text(registration_check.format(
+    requests="temp.registration_requests"
+)).bindparams(bindparam('today', type_=Date))
+
+query_drop_registration_requests = text("DROP TABLE temp.registration_requests")
+
+# class_occupancy of the requested classes is recounted first if it was counted on an earlier day
+# (registrations that ended since then are still in it, see create_trigger.py)
+query_recount_stale_class = text(recount_stale_class_occupancy.format(
+    class_ids=":class_id"
+)).bindparams(bindparam('today', type_=Date))
+
+query_recount_stale_requested_classes = text(recount_stale_class_occupancy.format(
+    class_ids="SELECT class_id FROM temp.registration_requests"
+)).bindparams(bindparam('today', type_=Date))
+
+# the insert re-checks the capacity itself, so a class can never be overbooked
+# (class_occupancy counts the active registrations, see create_trigger.py)
+query_insert_registration = text("""
+INSERT INTO registrations (class_id, member_id, startdate)
+SELECT :class_id, :member_id, :startdate
+FROM
+    classes
+    INNER JOIN classofferings ON classes.classoffering_id = classofferings.id
+    INNER JOIN classtypes ON classofferings.classtype_id = classtypes.id
+    LEFT JOIN class_occupancy ON classes.id = class_occupancy.class_id
+WHERE
+    classes.id = :class_id
+    AND COALESCE(class_occupancy.registrations, 0) < classtypes.maxparticipants
+""").bindparams(bindparam('startdate', type_=Date))
+
+
+# departures (person, leavedate) are staged in a temporary table and processed with set-based updates
+# (for single persons, tr_update_leaving in create_trigger.py does the same)
+query_create_departures = text("""
+CREATE TEMP TABLE departures (
+    person_id INTEGER PRIMARY KEY,
+    leavedate DATE NOT NULL
+)
+""")
+
+# the pairs are passed as one JSON array of [person ID, leavedate] pairs
+query_insert_departures = text("""
+INSERT OR REPLACE INTO temp.departures (person_id, leavedate)
+SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+FROM json_each(:departures)
+""")
+
+query_missing_departures = text("""
+SELECT departures.person_id
+FROM temp.departures
+LEFT JOIN persons ON departures.person_id = persons.id
+WHERE persons.id IS NULL
+ORDER BY departures.person_id
+""")
+
+# the registrations of all departed members are closed at once, then the persons are updated (tr_update_leaving
+# finds no open registrations left to close then, one indexed lookup per person); the IN conditions let SQLite start
+# from the departures and use the indexes instead of scanning registrations and persons
+query_close_departed_registrations = text("""
+UPDATE registrations
+SET enddate = departed.leavedate
+FROM (
+    SELECT members.id AS member_id, departures.leavedate
+    FROM temp.departures
+    INNER JOIN members ON departures.person_id = members.person_id
+) AS departed
+WHERE registrations.member_id = departed.member_id
+AND registrations.member_id IN (
+    SELECT members.id
+    FROM temp.departures
+    INNER JOIN members ON departures.person_id = members.person_id
+)
+AND (registrations.enddate IS NULL OR registrations.enddate > departed.leavedate)
+""")
+
+query_update_departed_persons = text("""
+UPDATE persons
+SET leavedate = departures.leavedate
+FROM temp.departures
+WHERE persons.id = departures.person_id
+AND persons.id IN (SELECT person_id FROM temp.departures)
+""")
+
+query_drop_departures = text("DROP TABLE temp.departures")
+
+
+# Transaction that takes the database write lock up front (BEGIN IMMEDIATE),
+# so no other writer can register between our checks and our insert (by default on the shared engine)
+@contextmanager
+def immediate_transaction(engine=None):
+    with (engine or get_engine()).connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.exec_driver_sql('ROLLBACK')
+            raise
+        connection.exec_driver_sql('COMMIT')
+
+
+# result code of one checked request, given the free spots left and whether the member is already registered
+def get_registration_status(check, free_spots, member_registered):
+    if check.member_id is None:
+        return RegistrationStatus.MEMBER_NOT_FOUND
+    if check.class_id is None:
+        return RegistrationStatus.CLASS_NOT_FOUND
+    if check.membership_terminated:
+        return RegistrationStatus.MEMBERSHIP_TERMINATED
+    if member_registered:
+        return RegistrationStatus.ALREADY_REGISTERED
+    if check.member_instructor:
+        return RegistrationStatus.MEMBER_IS_INSTRUCTOR
+    if free_spots <= 0:
+        return RegistrationStatus.CLASS_FULL
+    return RegistrationStatus.REGISTERED
 
 
 # create procedures
+# Register the member with the ID ### for class ID ### and return the result code
+@api_call
+def register_member(member_id, class_id):
+    today = date.today()
+
+    # run all checks and the insert on one connection inside one write transaction (on the shard of the class)
+    with immediate_transaction(get_class_engine(class_id)) as connection:
+        connection.execute(query_recount_stale_class, {'class_id': class_id, 'today': today})
+        check = connection.execute(query_registration_check,
+                                   {'member_id': member_id, 'class_id': class_id, 'today': today}).one()
+
+        status = get_registration_status(check, check.free_spots, check.member_registered)
+        if status is RegistrationStatus.REGISTERED:
+            result = connection.execute(query_insert_registration,
+                                        {'class_id': class_id, 'member_id': member_id, 'startdate': today})
+            status = RegistrationStatus.REGISTERED if result.rowcount == 1 else RegistrationStatus.CLASS_FULL
+
+    return check.forename, check.surname, check.classtype, check.weekday, status
+
+
 # Register the member with the ID ### as new participant of class ID ###
+@api_call
 def add_registration(member_id, class_id):
-    try:
-        # check existence of member_id
-        if not crfunc.check_member_exists(member_id):
-            raise ValueError(f"Member with ID {member_id} not found.")
-
-        # check existence of class_id
-        if not crfunc.check_class_exists(class_id):
-            raise ValueError(f"Class with ID {class_id} not found.")
-
-        # check if member is still active
-        membership_terminated, forename, surname = crfunc.is_membership_terminated(member_id)
-        if membership_terminated:
-            return f"{forename} {surname} (ID: {member_id}) has already terminated his/her membership!"
-
-        # check if member is not already registered for this class
-        forename, surname, class_, weekday, member_registered = crfunc.is_member_registered(member_id, class_id)
-        if member_registered:
-            return f"{forename} {surname} (ID: {member_id}) is already registered for {class_} on {weekday}s!"
-
-        # check if member is not the instructor of this class
-        forename, surname, class_, weekday, member_instructor = crfunc.is_member_instructor(member_id, class_id)
-        if member_instructor:
-            return f"{forename} {surname} (ID: {member_id}) is the instructor of {class_} on {weekday}s!"
-
-        # check if there are free spots available for this class
-        class_, weekday, free_spots = crfunc.count_free_spots_by_class(class_id)
-        if free_spots == 0:
-            return f"There are no more free spots in {class_} on {weekday}s!"
-
-        with engine.connect() as connection:
-            connection.execute(
-                text("""
-                INSERT INTO registrations (class_id, member_id, startdate)
-                VALUES (:class_id, :member_id, :startdate)
-                """),
-                {'class_id': class_id, 'member_id': member_id, 'startdate': datetime.now()}
-            )
-        return ("New participant has registered!")
-
-    except ValueError as e:
-        return str(e)
+    forename, surname, class_, weekday, status = register_member(member_id, class_id)
+    return registration_messages[status].format(member_id=member_id, class_id=class_id, forename=forename,
+                                                surname=surname, class_=class_, weekday=weekday)
+
+
+# Register many (member ID, class ID) pairs at once and return (member_id, class_id, result code) per pair
+# (one transaction per database: with shards, the pairs of every studio are registered on its shard)
+@api_call
+def add_registrations(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return []
+
+    positions = defaultdict(list)
+    for position, (member_id, class_id) in enumerate(pairs):
+        positions[get_class_engine(class_id)].append(position)
+
+    outcomes = [None] * len(pairs)
+    for engine, engine_positions in positions.items():
+        engine_outcomes = register_pairs(engine, [pairs[position] for position in engine_positions])
+        for position, outcome in zip(engine_positions, engine_outcomes):
+            outcomes[position] = outcome
+    return outcomes
+
+
+# (member_id, class_id, result code) per pair, registered in one write transaction on the engine
+def register_pairs(engine, pairs):
+    today = date.today()
+    outcomes = []
+
+    with immediate_transaction(engine) as connection:
+        connection.execute(query_create_registration_requests)
+        connection.execute(query_insert_registration_request,
+                           [{'position': position, 'member_id': member_id, 'class_id': class_id}
+                            for position, (member_id, class_id) in enumerate(pairs)])
+        connection.execute(query_recount_stale_requested_classes, {'today': today})
+        checks = connection.execute(query_registration_requests_check, {'today': today}).all()
+        connection.execute(query_drop_registration_requests)
+
+        # hand out the free spots of each class in request order
+        free_spots = {}
+        accepted = set()
+        for check, (member_id, class_id) in zip(checks, pairs):
+            spots = free_spots.setdefault(check.class_id, check.free_spots)
+            member_registered = check.member_registered or (member_id, class_id) in accepted
+            status = get_registration_status(check, spots, member_registered)
+
+            if status is RegistrationStatus.REGISTERED:
+                free_spots[check.class_id] = spots - 1
+                accepted.add((member_id, class_id))
+            outcomes.append((member_id, class_id, status))
+
+        if accepted:
+            connection.execute(query_insert_registration,
+                               [{'class_id': class_id, 'member_id': member_id, 'startdate': today}
+                                for member_id, class_id, status in outcomes
+                                if status is RegistrationStatus.REGISTERED])
+
+    return outcomes
+
+
+# leavedate as a date (the date of a datetime), so it compares with the other dates of the database
+def get_leavedate(person_id, leavedate):
+    if isinstance(leavedate, datetime):
+        return leavedate.date()
+    if not isinstance(leavedate, date):
+        raise ValueError(f"Leave date {leavedate!r} of person with ID {person_id} is not a date.")
+    return leavedate
+
+
+# Record many departures, given as (person ID, leavedate) pairs, in one transaction and end the registrations of
+# the departed members; returns (persons updated, registrations closed, person IDs not found)
+@api_call
+def process_departures(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return 0, 0, []
+
+    with immediate_transaction() as connection:
+        connection.execute(query_create_departures)
+        connection.execute(query_insert_departures, {'departures': json.dumps(
+            [[person_id, get_leavedate(person_id, leavedate).isoformat()] for person_id, leavedate in pairs])})
+        missing = connection.execute(query_missing_departures).scalars().all()
+        closed = connection.execute(query_close_departed_registrations).rowcount
+        updated = connection.execute(query_update_departed_persons).rowcount
+        connection.execute(query_drop_departures)
+
+    return updated, closed, missing
@@ -1,10 +1,13 @@
-from sqlalchemy import create_engine, text
-
-# create database engine
-engine = create_engine('sqlite:///data/mygym.db')
+from sqlalchemy import text, bindparam, Date
+from datetime import date
+from database import get_engine
 
 # create trigger via sql query
 # Update enddate for class registrations based on leavedate changes
+drop_trigger_update_leaving = """
+DROP TRIGGER IF EXISTS tr_update_leaving
+"""
+
 trigger_update_leaving = """
 CREATE TRIGGER tr_update_leaving
 AFTER UPDATE OF leavedate ON persons
@@ -17,6 +20,252 @@ BEGIN
 END;
 """
 
-# execute SQL query to create trigger
-with engine.connect() as connection:
-    connection.execute(text(trigger_update_leaving))
\ No newline at end of file
+# Keep the number of active registrations per class in class_occupancy up to date
+# (a registration is active from its startdate on as long as it has no enddate in the past, like active_on() in
+# create_functions.py). The triggers only see writes, so a count
+# is only valid on the day counted_on: counts of an earlier day are recounted by the procedures before they check
+# the capacity (see recount_stale_class_occupancy) and counted directly by the functions and views that read them
+drop_trigger_occupancy_insert = """
+DROP TRIGGER IF EXISTS tr_occupancy_insert
+"""
+
+trigger_occupancy_insert = """
+CREATE TRIGGER tr_occupancy_insert
+AFTER INSERT ON registrations
+FOR EACH ROW
+WHEN NEW.startdate <= DATE('now', 'localtime') AND (NEW.enddate IS NULL OR NEW.enddate >= DATE('now', 'localtime'))
+BEGIN
+    INSERT INTO class_occupancy (class_id, registrations, counted_on)
+    VALUES (NEW.class_id, 1, DATE('now', 'localtime'))
+    ON CONFLICT (class_id) DO UPDATE SET registrations = registrations + 1;
+END;
+"""
+
+drop_trigger_occupancy_update = """
+DROP TRIGGER IF EXISTS tr_occupancy_update
+"""
+
+trigger_occupancy_update = """
+CREATE TRIGGER tr_occupancy_update
+AFTER UPDATE OF class_id, startdate, enddate ON registrations
+FOR EACH ROW
+BEGIN
+    UPDATE class_occupancy
+    SET registrations = registrations - 1
+    WHERE class_id = OLD.class_id
+    AND OLD.startdate <= DATE('now', 'localtime')
+    AND (OLD.enddate IS NULL OR OLD.enddate >= DATE('now', 'localtime'));
+
+    INSERT INTO class_occupancy (class_id, registrations, counted_on)
+    SELECT NEW.class_id, 1, DATE('now', 'localtime')
+    WHERE NEW.startdate <= DATE('now', 'localtime')
+    AND (NEW.enddate IS NULL OR NEW.enddate >= DATE('now', 'localtime'))
+    ON CONFLICT (class_id) DO UPDATE SET registrations = registrations + 1;
+END;
+"""
+
+drop_trigger_occupancy_delete = """
+DROP TRIGGER IF EXISTS tr_occupancy_delete
+"""
+
+trigger_occupancy_delete = """
+CREATE TRIGGER tr_occupancy_delete
+AFTER DELETE ON registrations
+FOR EACH ROW
+WHEN OLD.startdate <= DATE('now', 'localtime') AND (OLD.enddate IS NULL OR OLD.enddate >= DATE('now', 'localtime'))
+BEGIN
+    UPDATE class_occupancy
+    SET registrations = registrations - 1
+    WHERE class_id = OLD.class_id;
+END;
+"""
+
+# registrations of a class active on :today, counted directly
+count_active_registrations = """
+SELECT COUNT(*)
+FROM registrations
+WHERE registrations.class_id = classes.id
+AND registrations.startdate <= :today
+AND (registrations.enddate IS NULL OR registrations.enddate >= :today)
+"""
+
+# Recount class_occupancy from scratch
+delete_class_occupancy = """
+DELETE FROM class_occupancy
+"""
+
+recount_class_occupancy = f"""
+INSERT INTO class_occupancy (class_id, registrations, counted_on)
+SELECT classes.id, ({count_active_registrations}), :today
+FROM classes
+"""
+
+# Recount the classes with the IDs ### whose count is missing or of an earlier day than :today
+# (one indexed count per class, only on the first write of the day)
+recount_stale_class_occupancy = f"""
+INSERT INTO class_occupancy (class_id, registrations, counted_on)
+SELECT classes.id, ({count_active_registrations}), :today
+FROM
+    classes
+    LEFT JOIN class_occupancy ON classes.id = class_occupancy.class_id
+WHERE
+    classes.id IN ({{class_ids}})
+    AND (class_occupancy.counted_on IS NULL OR class_occupancy.counted_on < :today)
+ON CONFLICT (class_id) DO UPDATE SET registrations = excluded.registrations, counted_on = excluded.counted_on
+"""
+
+# Classes whose count of :today differs from a full recount (counts of earlier days are recounted on use)
+compare_class_occupancy = f"""
+SELECT
+    classes.id AS class_id,
+    class_occupancy.registrations AS stored,
+    ({count_active_registrations}) AS counted
+FROM
+    classes
+    INNER JOIN class_occupancy ON classes.id = class_occupancy.class_id
+WHERE
+    class_occupancy.counted_on = :today
+    AND stored != counted
+ORDER BY
+    classes.id
+"""
+
+
+# Full text index over the searchable columns of persons and their city (see search_persons() in
+# create_functions.py). The trigram tokenizer matches any part of at least 3 characters of a name, email
+# address or phone number; the rowid of an entry is the ID of its person. Names weigh most in the ranking.
+create_persons_search = """
+CREATE VIRTUAL TABLE IF NOT EXISTS persons_search USING fts5(
+    surname, forename, email, mobile, landline, city, postcode,
+    tokenize = 'trigram'
+)
+"""
+
+rank_persons_search = """
+INSERT INTO persons_search (persons_search, rank)
+VALUES ('rank', 'bm25(10.0, 10.0, 5.0, 2.0, 2.0, 1.0, 1.0)')
+"""
+
+delete_persons_search = """
+DELETE FROM persons_search
+"""
+
+fill_persons_search = """
+INSERT INTO persons_search (rowid, surname, forename, email, mobile, landline, city, postcode)
+SELECT persons.id, persons.surname, persons.forename, persons.email, persons.mobile, persons.landline,
+       cities.name, cities.postcode
+FROM persons
+INNER JOIN cities ON persons.city_id = cities.id
+"""
+
+drop_trigger_search_insert = """
+DROP TRIGGER IF EXISTS tr_search_insert
+"""
+
+trigger_search_insert = """
+CREATE TRIGGER tr_search_insert
+AFTER INSERT ON persons
+FOR EACH ROW
+BEGIN
+    INSERT INTO persons_search (rowid, surname, forename, email, mobile, landline, city, postcode)
+    SELECT NEW.id, NEW.surname, NEW.forename, NEW.email, NEW.mobile, NEW.landline, cities.name, cities.postcode
+    FROM cities
+    WHERE cities.id = NEW.city_id;
+END;
+"""
+
+drop_trigger_search_update = """
+DROP TRIGGER IF EXISTS tr_search_update
+"""
+
+trigger_search_update = """
+CREATE TRIGGER tr_search_update
+AFTER UPDATE OF id, surname, forename, email, mobile, landline, city_id ON persons
+FOR EACH ROW
+BEGIN
+    DELETE FROM persons_search WHERE rowid = OLD.id;
+
+    INSERT INTO persons_search (rowid, surname, forename, email, mobile, landline, city, postcode)
+    SELECT NEW.id, NEW.surname, NEW.forename, NEW.email, NEW.mobile, NEW.landline, cities.name, cities.postcode
+    FROM cities
+    WHERE cities.id = NEW.city_id;
+END;
+"""
+
+drop_trigger_search_delete = """
+DROP TRIGGER IF EXISTS tr_search_delete
+"""
+
+trigger_search_delete = """
+CREATE TRIGGER tr_search_delete
+AFTER DELETE ON persons
+FOR EACH ROW
+BEGIN
+    DELETE FROM persons_search WHERE rowid = OLD.id;
+END;
+"""
+
+drop_trigger_search_city = """
+DROP TRIGGER IF EXISTS tr_search_city
+"""
+
+trigger_search_city = """
+CREATE TRIGGER tr_search_city
+AFTER UPDATE OF name, postcode ON cities
+FOR EACH ROW
+BEGIN
+    UPDATE persons_search
+    SET city = NEW.name, postcode = NEW.postcode
+    WHERE rowid IN (SELECT id FROM persons WHERE city_id = NEW.id);
+END;
+"""
+
+
+def rebuild_persons_search():
+    with get_engine().begin() as connection:
+        connection.execute(text(delete_persons_search))
+        connection.execute(text(fill_persons_search))
+
+
+def rebuild_class_occupancy():
+    with get_engine().begin() as connection:
+        connection.execute(text(delete_class_occupancy))
+        connection.execute(text(recount_class_occupancy).bindparams(bindparam('today', type_=Date)),
+                           {'today': date.today()})
+
+
+def check_class_occupancy():
+    with get_engine().connect() as connection:
+        return connection.execute(text(compare_class_occupancy).bindparams(bindparam('today', type_=Date)),
+                                  {'today': date.today()}).fetchall()
+
+
+# execute SQL queries to drop/create triggers
+def create_triggers():
+    with get_engine().begin() as connection:
+        connection.execute(text(drop_trigger_update_leaving))
+        connection.execute(text(trigger_update_leaving))
+        connection.execute(text(drop_trigger_occupancy_insert))
+        connection.execute(text(trigger_occupancy_insert))
+        connection.execute(text(drop_trigger_occupancy_update))
+        connection.execute(text(trigger_occupancy_update))
+        connection.execute(text(drop_trigger_occupancy_delete))
+        connection.execute(text(trigger_occupancy_delete))
+        connection.execute(text(create_persons_search))
+        connection.execute(text(rank_persons_search))
+        connection.execute(text(drop_trigger_search_insert))
+        connection.execute(text(trigger_search_insert))
+        connection.execute(text(drop_trigger_search_update))
+        connection.execute(text(trigger_search_update))
+        connection.execute(text(drop_trigger_search_delete))
+        connection.execute(text(trigger_search_delete))
+        connection.execute(text(drop_trigger_search_city))
+        connection.execute(text(trigger_search_city))
+
+    # start from a correct count and a complete search index, the triggers keep them up to date from here on
+    rebuild_class_occupancy()
+    rebuild_persons_search()
+
+
+if __name__ == '__main__':
+    create_triggers()
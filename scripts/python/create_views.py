@@ -1,10 +1,8 @@
-from sqlalchemy import create_engine
 from sqlalchemy.sql import text
-
-# create database engine
-engine = create_engine('sqlite:///data/mygym.db')
+from database import get_engine
 
 # drop and recreate views via SQL queries
+# (the last columns of every view complete its ORDER BY to a unique key, for keyset pagination in reporting.py)
 # 1. Who is teaching which class, and at what time and day?
 drop_view_classes = """
 DROP VIEW IF EXISTS vw_classes
@@ -18,7 +16,9 @@ SELECT
     persons.surname,
     persons.forename,
     classtypes.name AS classtype,
-    rooms.name AS room
+    rooms.name AS room,
+    weekdays.id AS weekday_id,
+    classes.id AS class_id
 FROM
     persons
     INNER JOIN employees ON persons.id = employees.person_id
@@ -30,10 +30,13 @@ FROM
     INNER JOIN rooms ON classtypes.room_id = rooms.id
 ORDER BY
     weekdays.id,
-    classes.time;    
+    classes.time,
+    classes.id;    
 """
 
 # 2. How many participants are registered for each class, and what is the maximum number of participants?
+# (active registrations, counted by the triggers in create_trigger.py, or counted here if that count is of an
+# earlier day)
 drop_view_registrations = """
 DROP VIEW IF EXISTS vw_registrations
 """
@@ -44,23 +47,29 @@ SELECT
     weekdays.name AS weekday,
     classes.time,
     classtypes.name AS classtype,
-    COUNT(registrations.id) AS registrations,
-    classtypes.maxparticipants AS "max. participants"
+    CASE
+        WHEN class_occupancy.counted_on >= DATE('now', 'localtime') THEN class_occupancy.registrations
+        ELSE (
+            SELECT COUNT(*)
+            FROM registrations
+            WHERE registrations.class_id = classes.id
+            AND registrations.startdate <= DATE('now', 'localtime')
+            AND (registrations.enddate IS NULL OR registrations.enddate >= DATE('now', 'localtime'))
+        )
+    END AS registrations,
+    classtypes.maxparticipants AS "max. participants",
+    classes.weekday_id,
+    classes.id AS class_id
 FROM
     classes
     INNER JOIN weekdays ON classes.weekday_id = weekdays.id
-    INNER JOIN registrations ON classes.id = registrations.class_id
+    LEFT JOIN class_occupancy ON classes.id = class_occupancy.class_id
     INNER JOIN classofferings ON classes.classoffering_id = classofferings.id
     INNER JOIN classtypes ON classofferings.classtype_id = classtypes.id
-GROUP BY
-    weekdays.name,
-    classes.time,
-    classtypes.name,
-    classes.weekday_id,
-    classtypes.maxparticipants
 ORDER BY
     classes.weekday_id,
-    classes.time;    
+    classes.time,
+    classes.id;    
 """
 
 # 3. Which trainers are participating as students in classes led by other trainers?
@@ -76,7 +85,8 @@ SELECT
     classtypes.name AS classtype,
     weekdays.name AS weekday,
     classes.time,
-    instructor_persons.forename AS trainer
+    instructor_persons.forename AS trainer,
+    registrations.id AS registration_id
 FROM
     registrations
     INNER JOIN members ON registrations.member_id = members.id
@@ -91,7 +101,8 @@ FROM
     INNER JOIN employees AS instructor_employees ON instructor_trainers.employee_id = instructor_employees.id
     INNER JOIN persons AS instructor_persons ON instructor_employees.person_id = instructor_persons.id
 ORDER BY
-    attending_persons.surname;    
+    attending_persons.surname,
+    registrations.id;    
 """
 
 # 4. Who is currently employed as an instructor and leading classes?
@@ -106,7 +117,8 @@ SELECT
     persons.forename,
     classtypes.name AS classtype,
     weekdays.name AS weekday,
-    classes.time
+    classes.time,
+    classes.id AS class_id
 FROM
     classes
     INNER JOIN classofferings ON classes.classoffering_id = classofferings.id
@@ -119,10 +131,12 @@ WHERE
     persons.leavedate IS NULL
 ORDER BY
     persons.surname,
-    classtypes.name;    
+    classtypes.name,
+    classes.id;    
 """
 
 # 5. Who is participating in the yoga classes, and since when?
+# (any class type and date: get_participants_by_classtype() in create_functions.py)
 drop_view_yogaparticipants = """
 DROP VIEW IF EXISTS vw_yogaparticipants
 """
@@ -135,7 +149,9 @@ SELECT
     classtypes.name AS classtype,
     weekdays.name AS weekday,
     classes.time,
-    registrations.startdate AS "participant since"
+    registrations.startdate AS "participant since",
+    weekdays.id AS weekday_id,
+    registrations.id AS registration_id
 FROM
     persons
     INNER JOIN members ON persons.id = members.person_id
@@ -146,24 +162,32 @@ FROM
     INNER JOIN weekdays ON classes.weekday_id = weekdays.id
 WHERE
     classtypes.name = "Yoga"
-    AND (registrations.enddate IS NULL OR registrations.enddate < DATE('now'))
+    AND registrations.startdate <= DATE('now', 'localtime')
+    AND (registrations.enddate IS NULL OR registrations.enddate >= DATE('now', 'localtime'))
 ORDER BY
     weekdays.id,
     classes.time,
-    registrations.startdate;    
+    registrations.startdate,
+    registrations.id;    
 """
 
+
 # execute SQL queries to create/drop views
-with engine.connect() as connection:
-    connection.execute(text(drop_view_classes))
-    connection.execute(text(view_classes))
-    connection.execute(text(drop_view_registrations))
-    connection.execute(text(view_registrations))
-    connection.execute(text(drop_view_trainersasparticipants))
-    connection.execute(text(view_trainersasparticipants))
-    connection.execute(text(drop_view_employeesasinstructors))
-    connection.execute(text(view_employeesasinstructors))
-    connection.execute(text(drop_view_yogaparticipants))
-    connection.execute(text(view_yogaparticipants))
+def create_views():
+    with get_engine().begin() as connection:
+        connection.execute(text(drop_view_classes))
+        connection.execute(text(view_classes))
+        connection.execute(text(drop_view_registrations))
+        connection.execute(text(view_registrations))
+        connection.execute(text(drop_view_trainersasparticipants))
+        connection.execute(text(view_trainersasparticipants))
+        connection.execute(text(drop_view_employeesasinstructors))
+        connection.execute(text(view_employeesasinstructors))
+        connection.execute(text(drop_view_yogaparticipants))
+        connection.execute(text(view_yogaparticipants))
+
+
+if __name__ == '__main__':
+    create_views()
 
 # %%
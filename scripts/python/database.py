@@ -0,0 +1,116 @@
+import os
+from contextvars import ContextVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# SQLite settings applied to every new connection of the pool, see https://www.sqlite.org/pragma.html
+# (journal_mode = WAL is stored in the database file, it stays in WAL mode for every later connection;
+# PRAGMA journal_mode = DELETE switches it back)
+# - default:  SQLite's own defaults (rollback journal, synchronous=FULL), only waiting for locks
+# - safe:     write-ahead log, readers don't block the writer, every commit is still synced to disk
+# - balanced: write-ahead log, synced at checkpoints only, bigger cache and memory mapped reads
+# - fast:     no syncing at all, a crash of the machine can lose the last transactions
+sqlite_profiles = {
+    'default': {
+        'busy_timeout': 5000,
+    },
+    'safe': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+    },
+    'balanced': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+}
+
+# database settings, can be overridden through environment variables or configure_engine()
+settings = {
+    'url': os.environ.get('MYGYM_DATABASE_URL', 'sqlite:///data/mygym.db'),
+    'sqlite_profile': os.environ.get('MYGYM_SQLITE_PROFILE', 'default'),
+    'pool_size': int(os.environ.get('MYGYM_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('MYGYM_MAX_OVERFLOW', 10)),
+    'pool_timeout': float(os.environ.get('MYGYM_POOL_TIMEOUT', 30)),
+    'pool_pre_ping': False,
+}
+
+# shared engine and ORM session factory of all scripts, created on first use
+engine = None
+Session = None
+
+# engine of the shard the current thread or task is routed to (see sharding.py), None for the shared engine
+routed_engine = ContextVar('routed_engine', default=None)
+
+# engine of the shard holding a class (class ID -> engine, set by sharding.py while shards are configured),
+# so calls that only know their class reach its studio without use_studio()
+class_router = None
+
+
+def get_engine():
+    global engine
+    routed = routed_engine.get()
+    if routed is not None:
+        return routed
+    if engine is None:
+        engine = build_engine(settings['url'])
+    return engine
+
+
+# Engine for calls on the class with the ID: the engine routed to, else the shard of the class, else the shared one
+def get_class_engine(class_id):
+    if routed_engine.get() is None and class_router is not None:
+        return class_router(class_id)
+    return get_engine()
+
+
+# new engine for the database URL with the pool options and SQLite profile of the settings
+def build_engine(url):
+    options = dict(settings)
+    del options['url']
+    pragmas = sqlite_profiles[options.pop('sqlite_profile')]
+    new_engine = create_engine(url, **options)
+
+    if new_engine.dialect.name == 'sqlite':
+        event.listen(new_engine, 'connect', lambda dbapi_connection, connection_record:
+                     set_sqlite_pragmas(dbapi_connection, pragmas))
+    return new_engine
+
+
+def set_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+
+# new session for the ORM models in create_db.py
+def get_session():
+    global Session
+    if Session is None:
+        Session = sessionmaker()
+    return Session(bind=get_engine())
+
+
+# Change the database URL or engine options; the next get_engine() call creates the new engine
+def configure_engine(url=None, **options):
+    global engine
+    if engine is not None:
+        engine.dispose()
+        engine = None
+    if url is not None:
+        settings['url'] = url
+    settings.update(options)
@@ -0,0 +1,271 @@
+import argparse
+import csv
+import os
+import random
+import shutil
+from datetime import date, time, timedelta
+from itertools import islice
+
+from database import get_engine, configure_engine
+from create_db import Base, create_schema, migrate_database
+from create_trigger import create_triggers
+from create_views import create_views
+from load_data import csv_columns
+from cache import invalidate
+
+# Synthetic gym data at any scale, generated deterministically from a seed.
+# Employees, trainers, members, class offerings and classes follow from the number of persons by
+# arithmetic, so only the current row is kept in memory (plus one capacity counter per class):
+# - every 100th person is an employee, every 2nd employee a trainer, every 2nd trainer also a member
+# - every other person is a member
+# - every trainer offers one class type, six times a week at the same hour, in the room of the class type
+# - twelve trainers share a room, two class types per room
+surnames = ['Reyer', 'Schwangau', 'Amay', 'Krause', 'Karl', 'Gehring', 'Höfler', 'Lafrentz', 'Behrend', 'Größel',
+            'Oppenheimer', 'Pichler', 'Enns', 'Holzer', 'Haberkorn', 'Jäger', 'Winkler', 'Busch', 'Fiedler', 'Planck']
+forenames = ['Hildelinde', 'Priszilla', 'Simon', 'Ellengard', 'Ortrud', 'Theya', 'Reinar', 'Holunda', 'Thorin',
+             'Sancia', 'Willimar', 'Goda', 'Jonatias', 'Tassila', 'Romed', 'Annina', 'Florin', 'Milvina', 'Nils',
+             'Pola']
+streets = ['Goldener Grund', 'Getrudisweg', 'Am Burgberg', 'Am Eisteich', 'Brunnenweg', 'Dachsgraben', 'Ellerweg',
+           'Grimmstraße', 'Aspernstraße', 'Am Mühlengraben']
+city_names = ['Offenburg', 'Durbach', 'Hohberg', 'Kehl', 'Gengenbach', 'Oberkirch', 'Ortenberg', 'Straßburg',
+              'Illkirch-Grafenstaden', 'Oberwil']
+countries = [('Germany', 'DE', '+49'), ('France', 'FR', '+33'), ('Switzerland', 'CH', '+41')]
+weekdays = [('Monday', 'mo'), ('Tuesday', 'tu'), ('Wednesday', 'we'), ('Thursday', 'th'), ('Friday', 'fr'),
+            ('Saturday', 'sa'), ('Sunday', 'su')]
+classtype_names = [('Yoga', 15), ('Pilates', 15), ('Bodystyling', 20), ('Spinning', 30), ('Power Workout', 20),
+                   ('Rückenfit', 10), ('Bauch-Beine-Po', 20), ('Step Aerobic', 30)]
+
+classes_per_trainer = 6
+trainers_per_room = 12
+first_enterdate = date(2015, 1, 1)
+
+
+class GymLayout:
+    def __init__(self, persons):
+        self.persons = persons
+        self.employees = (persons + 99) // 100
+        self.trainers = (self.employees + 1) // 2
+        self.rooms = (self.trainers + trainers_per_room - 1) // trainers_per_room
+        self.classtypes = 2 * self.rooms
+        self.classes = classes_per_trainer * self.trainers
+        self.cities = max(20, persons // 1000)
+
+    # employee ID of a person, or None
+    def get_employee_id(self, person_id):
+        return (person_id - 1) // 100 + 1 if (person_id - 1) % 100 == 0 else None
+
+    # trainer ID of an employee, or None
+    def get_trainer_id(self, employee_id):
+        return (employee_id + 1) // 2 if employee_id % 2 == 1 else None
+
+    def is_member(self, person_id):
+        employee_id = self.get_employee_id(person_id)
+        if employee_id is None:
+            return True
+        trainer_id = self.get_trainer_id(employee_id)
+        return trainer_id is not None and trainer_id % 2 == 1
+
+    def get_classtype_id(self, trainer_id):
+        room = (trainer_id - 1) // trainers_per_room
+        return 2 * room + (trainer_id - 1) % 2 + 1
+
+    def get_trainer_of_class(self, class_id):
+        return (class_id - 1) // classes_per_trainer + 1
+
+    def get_maxparticipants(self, classtype_id):
+        return classtype_names[(classtype_id - 1) % len(classtype_names)][1]
+
+
+def random_date(rng, first, last):
+    return first + timedelta(days=rng.randrange((last - first).days + 1))
+
+
+# persons are generated twice (for the persons table and for the registrations), always from the same seed
+def generate_persons(layout, seed, reference_date):
+    rng = random.Random(seed)
+    for person_id in range(1, layout.persons + 1):
+        surname, forename = rng.choice(surnames), rng.choice(forenames)
+        enterdate = random_date(rng, first_enterdate, reference_date - timedelta(days=60))
+        leavedate = random_date(rng, enterdate + timedelta(days=30), reference_date) if rng.random() < 0.3 else None
+        yield (person_id, surname, forename, random_date(rng, date(1940, 1, 1), date(2006, 12, 31)),
+               rng.choice(streets), str(rng.randint(1, 200)), rng.randint(1, layout.cities),
+               f"0781/{rng.randint(1000000, 9999999)}" if rng.random() < 0.5 else None,
+               f"0157/{rng.randint(100000000, 999999999)}" if rng.random() < 0.8 else None,
+               f"{forename}.{surname}{person_id}@example.de".lower() if rng.random() < 0.7 else None,
+               enterdate, leavedate)
+
+
+def generate_cities(layout, seed):
+    rng = random.Random(seed)
+    for city_id in range(1, layout.cities + 1):
+        yield city_id, f"{10000 + city_id:05d}", rng.choice(city_names), rng.choices([1, 2, 3], [8, 1, 1])[0]
+
+
+def generate_employees(layout):
+    for employee_id in range(1, layout.employees + 1):
+        yield employee_id, (employee_id - 1) * 100 + 1
+
+
+def generate_trainers(layout):
+    for trainer_id in range(1, layout.trainers + 1):
+        yield trainer_id, 2 * trainer_id - 1
+
+
+def generate_members(layout):
+    member_id = 0
+    for person_id in range(1, layout.persons + 1):
+        if layout.is_member(person_id):
+            member_id += 1
+            yield member_id, person_id
+
+
+def generate_classtypes(layout):
+    for classtype_id in range(1, layout.classtypes + 1):
+        name, maxparticipants = classtype_names[(classtype_id - 1) % len(classtype_names)]
+        series = (classtype_id - 1) // len(classtype_names)
+        room_id = (classtype_id - 1) // 2 + 1
+        yield classtype_id, name if series == 0 else f"{name} {series + 1}", room_id, maxparticipants
+
+
+def generate_classes(layout):
+    for class_id in range(1, layout.classes + 1):
+        trainer_id = layout.get_trainer_of_class(class_id)
+        weekday_id = (class_id - 1) % classes_per_trainer + 1
+        yield class_id, trainer_id, weekday_id, time(8 + (trainer_id - 1) % trainers_per_room)
+
+
+# Registrations of every member: up to three distinct classes, starting after entering and ending at the latest
+# on leaving. Open registrations never exceed the capacity of a class (otherwise the registration is ended).
+def generate_registrations(layout, seed, reference_date):
+    rng = random.Random(seed + 1)
+    free_spots = [0] + [layout.get_maxparticipants(layout.get_classtype_id(layout.get_trainer_of_class(class_id)))
+                        for class_id in range(1, layout.classes + 1)]
+    registration_id = member_id = 0
+
+    for person in generate_persons(layout, seed, reference_date):
+        person_id, enterdate, leavedate = person[0], person[10], person[11]
+        if not layout.is_member(person_id):
+            continue
+        member_id += 1
+
+        employee_id = layout.get_employee_id(person_id)
+        own_trainer_id = layout.get_trainer_id(employee_id) if employee_id else None
+        last_day = (leavedate or reference_date) - timedelta(days=1)
+        class_ids = set()
+
+        for _ in range(rng.choice([0, 1, 1, 2, 2, 3])):
+            class_id = rng.randint(1, layout.classes)
+            if class_id in class_ids or layout.get_trainer_of_class(class_id) == own_trainer_id:
+                continue
+            class_ids.add(class_id)
+
+            startdate = random_date(rng, enterdate, last_day)
+            if leavedate is None and free_spots[class_id] > 0 and rng.random() < 0.7:
+                enddate = None
+                free_spots[class_id] -= 1
+            else:
+                enddate = random_date(rng, startdate + timedelta(days=1), last_day + timedelta(days=1))
+
+            registration_id += 1
+            yield registration_id, class_id, member_id, startdate, enddate
+
+
+# (table name, rows) in foreign key order; each row starts with its ID followed by the CSV columns
+def generate_tables(persons, seed=0, reference_date=date(2025, 1, 1)):
+    layout = GymLayout(persons)
+    tables = {
+        'countries': lambda: ((i, *country) for i, country in enumerate(countries, 1)),
+        'cities': lambda: generate_cities(layout, seed),
+        'rooms': lambda: ((room_id, f"Kursraum {room_id}") for room_id in range(1, layout.rooms + 1)),
+        'weekdays': lambda: ((i, *weekday) for i, weekday in enumerate(weekdays, 1)),
+        'persons': lambda: generate_persons(layout, seed, reference_date),
+        'members': lambda: generate_members(layout),
+        'employees': lambda: generate_employees(layout),
+        'trainers': lambda: generate_trainers(layout),
+        'classtypes': lambda: generate_classtypes(layout),
+        'classofferings': lambda: ((trainer_id, layout.get_classtype_id(trainer_id), trainer_id)
+                                   for trainer_id in range(1, layout.trainers + 1)),
+        'classes': lambda: generate_classes(layout),
+        'registrations': lambda: generate_registrations(layout, seed, reference_date),
+    }
+    for table in Base.metadata.sorted_tables:
+        if table.name in tables:
+            yield table.name, tables[table.name]()
+
+
+def to_csv_value(value):
+    if value is None:
+        return 'NULL'
+    if isinstance(value, time):
+        return value.strftime('%H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+# Write the tables as CSV files in the format of data/csv_files (without IDs), readable by load_data.py
+def write_csv(directory, persons, seed=0, reference_date=date(2025, 1, 1)):
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for table, rows in generate_tables(persons, seed, reference_date):
+        with open(os.path.join(directory, f'{table}.csv'), 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            counts[table] = 0
+            for row in rows:
+                writer.writerow([to_csv_value(value) for value in row[1:]])
+                counts[table] += 1
+    return counts
+
+
+# Insert the tables into empty tables of the database, in chunks of ### rows
+def write_database(persons, seed=0, reference_date=date(2025, 1, 1), chunk_size=10000):
+    counts = {}
+    for table, rows in generate_tables(persons, seed, reference_date):
+        columns = ['id'] + csv_columns[table]
+        insert = Base.metadata.tables[table].insert()
+        counts[table] = 0
+        with get_engine().begin() as connection:
+            while chunk := [dict(zip(columns, row)) for row in islice(rows, chunk_size)]:
+                connection.execute(insert, chunk)
+                counts[table] += len(chunk)
+    invalidate(*counts)
+    return counts
+
+
+# Fill the database with ### generated persons, including schema, views and triggers
+def generate_database(persons, seed=0, reference_date=date(2025, 1, 1), chunk_size=10000):
+    create_schema()
+    counts = write_database(persons, seed, reference_date, chunk_size)
+    create_views()
+    create_triggers()
+    return counts
+
+
+# New database file for tests and benchmarks: a migrated copy of the database source_file, or else one with ###
+# generated persons. The shared engine is configured for it; returns its URL
+def build_database(database_file, persons=None, seed=0, source_file=None):
+    if source_file is not None:
+        shutil.copy(source_file, database_file)
+    configure_engine(f'sqlite:///{database_file}')
+    if source_file is not None:
+        migrate_database()
+    else:
+        generate_database(persons, seed)
+    return f'sqlite:///{database_file}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic gym data.')
+    parser.add_argument('--persons', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--csv', metavar='DIRECTORY', help='write CSV files instead of filling the database')
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.csv:
+        counts = write_csv(args.csv, args.persons, args.seed)
+    else:
+        counts = generate_database(args.persons, args.seed, chunk_size=args.chunk_size)
+
+    for table, count in counts.items():
+        print(f"{table:<15} {count:>10} rows")
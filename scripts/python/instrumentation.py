@@ -0,0 +1,217 @@
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Query instrumentation of the data layer, attached to every engine through engine events.
+# Functions decorated with @api_call are logical API calls (add_registration, is_member_registered, ...):
+# all statements executed while such a call runs are counted as its round trips. The metrics are collected
+# in the registry below, which can be dumped as a dict or exported in the Prometheus text format.
+# Statements slower than the threshold are logged together with their EXPLAIN QUERY PLAN.
+#
+#   import instrumentation
+#   instrumentation.enable(slow_query_threshold=0.05)
+#   ...
+#   print(instrumentation.registry.to_prometheus())
+
+logger = logging.getLogger('mygym.slow_queries')
+
+# upper bounds (seconds) of the statement duration histogram
+duration_buckets = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+
+# settings, can be overridden through environment variables or enable()
+# (statements beyond max_statements distinct ones are counted together as other_statements)
+settings = {
+    'enabled': os.environ.get('MYGYM_INSTRUMENTATION', '0') == '1',
+    'slow_query_threshold': float(os.environ.get('MYGYM_SLOW_QUERY_SECONDS', 0.1)),
+    'max_statements': int(os.environ.get('MYGYM_MAX_STATEMENTS', 1000)),
+}
+
+other_statements = '(other statements)'
+
+# expanded IN lists (the batch lookups bind one parameter per value), collapsed to one statement per query
+in_list = re.compile(r'IN \((?:\?, )*\?\)')
+
+# name of the outermost API call running in the current thread / task, and its statistics
+current_call = ContextVar('current_call', default=None)
+
+
+class CallStatistics:
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # API call name -> {'calls', 'seconds', 'statements', 'rows'}
+            self.calls = {}
+            # API call name -> [count per duration bucket (+Inf last), sum of seconds]
+            self.statement_durations = {}
+            # normalized SQL text (see normalize_statement) -> {'count', 'seconds', 'max_seconds', 'rows'}
+            self.statements = {}
+            self.slow_queries = 0
+
+    def record_statement(self, call, statement, seconds, rows, slow):
+        statement = normalize_statement(statement)
+        with self.lock:
+            if statement not in self.statements and len(self.statements) >= settings['max_statements']:
+                statement = other_statements
+            stats = self.statements.setdefault(statement, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0})
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['rows'] += rows
+
+            buckets = self.statement_durations.setdefault(call, [[0] * (len(duration_buckets) + 1), 0.0])
+            for i, bound in enumerate(duration_buckets):
+                if seconds <= bound:
+                    buckets[0][i] += 1
+                    break
+            else:
+                buckets[0][-1] += 1
+            buckets[1] += seconds
+
+            if slow:
+                self.slow_queries += 1
+
+    def record_call(self, call, seconds, statistics):
+        with self.lock:
+            stats = self.calls.setdefault(call, {'calls': 0, 'seconds': 0.0, 'statements': 0, 'rows': 0})
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['statements'] += statistics.statements
+            stats['rows'] += statistics.rows
+
+    def dump(self):
+        with self.lock:
+            return {
+                'calls': {call: dict(stats) for call, stats in self.calls.items()},
+                'statements': {statement: dict(stats) for statement, stats in self.statements.items()},
+                'slow_queries': self.slow_queries,
+            }
+
+    def to_prometheus(self):
+        with self.lock:
+            lines = []
+            for name, help_text, key in [('mygym_api_calls_total', 'Logical API calls.', 'calls'),
+                                         ('mygym_api_call_seconds_total', 'Time spent in API calls.', 'seconds'),
+                                         ('mygym_api_call_statements_total', 'Statements (round trips) of API calls.',
+                                          'statements'),
+                                         ('mygym_api_call_rows_total', 'Rows written by API calls.', 'rows')]:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f'{name}{{call="{call}"}} {stats[key]}' for call, stats in sorted(self.calls.items())]
+
+            name = 'mygym_statement_duration_seconds'
+            lines += [f'# HELP {name} Duration of statements by API call.', f'# TYPE {name} histogram']
+            for call, (counts, seconds) in sorted(self.statement_durations.items()):
+                cumulative = 0
+                for bound, count in zip(duration_buckets + ['+Inf'], counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{call="{call}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{call="{call}"}} {seconds}')
+                lines.append(f'{name}_count{{call="{call}"}} {cumulative}')
+
+            name = 'mygym_slow_queries_total'
+            lines += [f'# HELP {name} Statements slower than the slow query threshold.', f'# TYPE {name} counter',
+                      f'{name} {self.slow_queries}']
+            return '\n'.join(lines) + '\n'
+
+
+# SQL text with IN lists of any length written as IN (?...)
+def normalize_statement(statement):
+    return in_list.sub('IN (?...)', statement)
+
+
+registry = MetricsRegistry()
+
+
+# Decorator marking a function as logical API call; calls nested in another API call are part of the outer one
+def api_call(function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if not settings['enabled'] or current_call.get() is not None:
+            return function(*args, **kwargs)
+
+        statistics = CallStatistics()
+        token = current_call.set((function.__name__, statistics))
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            registry.record_call(function.__name__, time.perf_counter() - start, statistics)
+            current_call.reset(token)
+    return wrapper
+
+
+def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    context.query_start = time.perf_counter()
+
+
+def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context.query_start
+    # SQLite only reports the row count of INSERT / UPDATE / DELETE, not of queries
+    rows = max(cursor.rowcount, 0)
+    call, statistics = current_call.get() or ('other', None)
+    if statistics is not None:
+        statistics.statements += 1
+        statistics.rows += rows
+        statistics.seconds += seconds
+
+    slow = seconds >= settings['slow_query_threshold']
+    registry.record_statement(call, statement, seconds, rows, slow)
+    if slow:
+        log_slow_query(connection, call, statement, parameters, executemany, seconds)
+
+
+def log_slow_query(connection, call, statement, parameters, executemany, seconds):
+    plan = get_query_plan(connection, statement, parameters[0] if executemany else parameters)
+    logger.warning("slow query in %s (%.1f ms): %s\n%s", call, seconds * 1000, statement.strip(), plan)
+
+
+# EXPLAIN QUERY PLAN of a statement on a separate cursor of the same connection (SQLite only)
+def get_query_plan(connection, statement, parameters):
+    if connection.dialect.name != 'sqlite' or not statement.lstrip().upper().startswith(
+            ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+        return ''
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        rows = cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    except Exception as error:
+        return f'(no query plan: {error})'
+    finally:
+        cursor.close()
+    return '\n'.join(f'{row[0]:>4} {row[1]:>4} {row[3]}' for row in rows)
+
+
+# Start instrumenting every engine; the threshold is in seconds
+def enable(slow_query_threshold=None):
+    if slow_query_threshold is not None:
+        settings['slow_query_threshold'] = slow_query_threshold
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    settings['enabled'] = True
+
+
+def disable():
+    if event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.remove(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', after_cursor_execute)
+    settings['enabled'] = False
+
+
+if settings['enabled']:
+    enable()
@@ -0,0 +1,91 @@
+import argparse
+import csv
+import os
+import time as timer
+from datetime import date, time
+from itertools import islice
+
+from sqlalchemy import Date, Time
+from database import get_engine
+from create_db import Base
+from cache import invalidate
+
+# columns of the rows in each CSV file (the IDs are assigned by the database in file order)
+csv_columns = {
+    'countries': ['name', 'abbreviation', 'code'],
+    'cities': ['postcode', 'name', 'country_id'],
+    'persons': ['surname', 'forename', 'birthdate', 'street', 'housenumber', 'city_id', 'landline', 'mobile', 'email',
+                'enterdate', 'leavedate'],
+    'members': ['person_id'],
+    'employees': ['person_id'],
+    'trainers': ['employee_id'],
+    'rooms': ['name'],
+    'classtypes': ['name', 'room_id', 'maxparticipants'],
+    'classofferings': ['classtype_id', 'trainer_id'],
+    'weekdays': ['name', 'abbreviation'],
+    'classes': ['classoffering_id', 'weekday_id', 'time'],
+    'registrations': ['class_id', 'member_id', 'startdate', 'enddate'],
+}
+
+
+# converter from CSV text to the Python value of a column ('NULL' and empty fields become None)
+def get_converter(column):
+    if isinstance(column.type, Date):
+        parse = date.fromisoformat
+    elif isinstance(column.type, Time):
+        parse = time.fromisoformat
+    else:
+        parse = str
+    return lambda value: None if value in ('', 'NULL') else parse(value)
+
+
+def read_chunks(csv_file, names, converters, chunk_size):
+    with open(csv_file, newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        while True:
+            chunk = [{name: convert(value) for name, convert, value in zip(names, converters, row)}
+                     for row in islice(reader, chunk_size)]
+            if not chunk:
+                return
+            yield chunk
+
+
+# Load the CSV file of a table in chunks of ### rows, each chunk with one executemany
+def load_csv(table, csv_file, chunk_size=10000):
+    names = csv_columns[table.name]
+    converters = [get_converter(table.c[name]) for name in names]
+    rows = 0
+
+    with get_engine().begin() as connection:
+        for chunk in read_chunks(csv_file, names, converters, chunk_size):
+            connection.execute(table.insert(), chunk)
+            rows += len(chunk)
+    return rows
+
+
+# Load all CSV files of a directory into empty tables, parents before the tables referencing them
+def load_csv_directory(directory, chunk_size=10000):
+    report = []
+    for table in Base.metadata.sorted_tables:
+        csv_file = os.path.join(directory, f'{table.name}.csv')
+        if table.name not in csv_columns or not os.path.exists(csv_file):
+            continue
+
+        start = timer.perf_counter()
+        rows = load_csv(table, csv_file, chunk_size)
+        seconds = timer.perf_counter() - start
+        report.append((table.name, rows, seconds))
+        print(f"{table.name:<15} {rows:>10} rows {seconds:8.2f} s {rows / seconds if seconds else 0:>12.0f} rows/s")
+
+    # the rows were written through Core, so cached lookups don't know about them
+    invalidate(*(table for table, rows, seconds in report))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load the CSV files of a directory into the database.')
+    parser.add_argument('directory', nargs='?', default='data/csv_files')
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    load_csv_directory(args.directory, args.chunk_size)
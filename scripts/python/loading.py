@@ -0,0 +1,103 @@
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+
+from database import get_session
+from create_db import Person, City, Member, Employee, Trainer, Class, ClassType, ClassOffering, Registration
+
+# Loading profiles for walking the ORM models of create_db.py.
+# The relationships of the models load lazily, one query per accessed relationship and row, so walking from a class
+# to its registrations to their persons takes a query per registration. A profile names the relationships a
+# traversal needs and loads them up front: many-to-one relationships with joinedload (in the same query),
+# collections with selectinload (one more query per collection level and 500 parents).
+#
+#   with get_session() as session:
+#       classes = load(session, Class, 'roster')
+#       ...  # class_.registrations[0].member.person.surname runs no further query
+
+loading_profiles = {
+    # a class with its class type, room, trainer, weekday and occupancy, and its registrations with their members
+    'roster': [
+        joinedload(Class.classoffering).joinedload(ClassOffering.classtype).joinedload(ClassType.room),
+        joinedload(Class.classoffering).joinedload(ClassOffering.trainer).joinedload(Trainer.employee)
+        .joinedload(Employee.person),
+        joinedload(Class.weekday),
+        joinedload(Class.occupancy),
+        selectinload(Class.registrations).joinedload(Registration.member).joinedload(Member.person),
+    ],
+    # a trainer with its class offerings (class type and room) and their classes (weekday and occupancy)
+    'trainer schedule': [
+        joinedload(Trainer.employee).joinedload(Employee.person),
+        selectinload(Trainer.classofferings).joinedload(ClassOffering.classtype).joinedload(ClassType.room),
+        selectinload(Trainer.classofferings).selectinload(ClassOffering.classes).joinedload(Class.weekday),
+        selectinload(Trainer.classofferings).selectinload(ClassOffering.classes).joinedload(Class.occupancy),
+    ],
+    # a member with its person, city and country, and its registrations with their classes
+    'member profile': [
+        joinedload(Member.person).joinedload(Person.city).joinedload(City.country),
+        selectinload(Member.registrations).joinedload(Registration.class_).joinedload(Class.classoffering)
+        .joinedload(ClassOffering.classtype),
+        selectinload(Member.registrations).joinedload(Registration.class_).joinedload(Class.weekday),
+    ],
+}
+
+
+def get_profile(name):
+    if name not in loading_profiles:
+        raise ValueError(f"Loading profile {name} not found.")
+    return loading_profiles[name]
+
+
+# Objects of the model (all, or the given IDs) with the relationships of the profile loaded, ordered by ID
+def load(session, model, profile, ids=None):
+    query = select(model).options(*get_profile(profile)).order_by(model.id)
+    if ids is not None:
+        query = query.where(model.id.in_(ids))
+    return session.scalars(query).unique().all()
+
+
+# Participants of class ID ###: (class type, weekday, time, [(surname, forename, startdate, enddate), ...])
+def get_roster(class_id):
+    with get_session() as session:
+        classes = load(session, Class, 'roster', [class_id])
+        if not classes:
+            raise ValueError(f"Class with ID {class_id} not found.")
+        class_ = classes[0]
+
+        participants = sorted((registration.member.person.surname, registration.member.person.forename,
+                               registration.startdate, registration.enddate)
+                              for registration in class_.registrations)
+        return class_.classoffering.classtype.name, class_.weekday.name, class_.time, participants
+
+
+# Classes of trainer ID ###: (forename, surname, [(weekday, time, class type, room, registrations), ...])
+def get_trainer_schedule(trainer_id):
+    with get_session() as session:
+        trainers = load(session, Trainer, 'trainer schedule', [trainer_id])
+        if not trainers:
+            raise ValueError(f"Trainer with ID {trainer_id} not found.")
+        trainer = trainers[0]
+
+        schedule = sorted(((class_.weekday_id, class_.time), class_.weekday.name, class_.time,
+                           classoffering.classtype.name, classoffering.classtype.room.name,
+                           class_.occupancy.registrations if class_.occupancy else 0)
+                          for classoffering in trainer.classofferings for class_ in classoffering.classes)
+        person = trainer.employee.person
+        return person.forename, person.surname, [entry[1:] for entry in schedule]
+
+
+# Member ID ### with its registrations:
+# (forename, surname, city, country, [(class type, weekday, time, startdate, enddate), ...])
+def get_member_profile(member_id):
+    with get_session() as session:
+        members = load(session, Member, 'member profile', [member_id])
+        if not members:
+            raise ValueError(f"Member with ID {member_id} not found.")
+        member = members[0]
+
+        registrations = sorted((registration.startdate, registration.id,
+                                registration.class_.classoffering.classtype.name, registration.class_.weekday.name,
+                                registration.class_.time, registration.startdate, registration.enddate)
+                               for registration in member.registrations)
+        person = member.person
+        return (person.forename, person.surname, person.city.name, person.city.country.name,
+                [entry[2:] for entry in registrations])
@@ -0,0 +1,102 @@
+import csv
+
+from sqlalchemy import select, table, column, literal_column, tuple_
+
+from snapshots import get_reporting_engine
+
+# Streaming access to the reporting views of create_views.py.
+# Rows are fetched in batches from the open cursor (yield_per), so whole views are never held in memory.
+# Pages are read with keyset pagination: every page continues after the key of the last row of the previous page
+# (the view's ORDER BY, completed to a unique key), instead of skipping rows with OFFSET.
+# While snapshots.py takes snapshots, the views are read from the latest snapshot instead of the database.
+
+# view -> columns of its ORDER BY key
+view_keys = {
+    'vw_classes': ['weekday_id', 'time', 'class_id'],
+    'vw_registrations': ['weekday_id', 'time', 'class_id'],
+    'vw_trainersasparticipants': ['surname', 'registration_id'],
+    'vw_employeesasinstructors': ['surname', 'classtype', 'class_id'],
+    'vw_yogaparticipants': ['weekday_id', 'time', 'participant since', 'registration_id'],
+}
+
+
+def get_view_query(view, after=None):
+    if view not in view_keys:
+        raise ValueError(f"View {view} not found.")
+
+    keys = [column(name) for name in view_keys[view]]
+    query = select(literal_column('*')).select_from(table(view, *keys)).order_by(*keys)
+    if after is not None:
+        query = query.where(tuple_(*keys) > tuple_(*after))
+    return query
+
+
+# Generator of all rows of a view (after the given key), fetched batch_size rows at a time
+def stream_view(view, batch_size=1000, after=None):
+    with get_reporting_engine().connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(get_view_query(view, after))
+        yield from result
+
+
+# One page of a view: (rows, key of the last row to pass as after for the next page, or None on the last page)
+def get_page(view, page_size=100, after=None):
+    with get_reporting_engine().connect() as connection:
+        rows = connection.execute(get_view_query(view, after).limit(page_size)).all()
+
+    if len(rows) < page_size:
+        return rows, None
+    return rows, tuple(rows[-1]._mapping[name] for name in view_keys[view])
+
+
+# Generator of all pages of a view
+def iterate_pages(view, page_size=100):
+    after = None
+    while True:
+        rows, after = get_page(view, page_size, after)
+        if rows:
+            yield rows
+        if after is None:
+            return
+
+
+# Write a view to a CSV file with header, streaming batch_size rows at a time; returns the number of rows
+def export_csv(view, csv_file, batch_size=1000):
+    rows = 0
+    with get_reporting_engine().connect() as connection, open(csv_file, 'w', newline='', encoding='utf-8') as output:
+        result = connection.execution_options(yield_per=batch_size).execute(get_view_query(view))
+        writer = csv.writer(output)
+        writer.writerow(result.keys())
+        for batch in result.partitions():
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+
+# Write a view to a Parquet file, one row group per batch; returns the number of rows (needs pyarrow)
+def export_parquet(view, parquet_file, batch_size=10000):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow).")
+
+    rows = 0
+    writer = None
+    with get_reporting_engine().connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(get_view_query(view))
+        names = list(result.keys())
+        try:
+            for batch in result.partitions():
+                columns = {name: [row[i] for row in batch] for i, name in enumerate(names)}
+                if writer is None:
+                    # columns that are empty in the first batch are written as text
+                    schema = pa.RecordBatch.from_pydict(columns).schema
+                    schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                        for field in schema])
+                    writer = pq.ParquetWriter(parquet_file, schema)
+                writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+                rows += len(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+    return rows
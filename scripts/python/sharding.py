@@ -0,0 +1,350 @@
+import heapq
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import MetaData, text
+from sqlalchemy.engine import make_url
+
+import database
+import snapshots
+from create_db import Base, create_schema
+from create_trigger import create_triggers
+from create_views import create_views
+from reporting import get_view_query, view_keys
+
+# One database per studio, so the studios don't wait for each other's writes (SQLite has one write lock per file).
+# A studio is a set of rooms: its shard holds the rooms with their class types, class offerings, classes and
+# registrations. Reference data (countries, cities, weekdays) and the people (persons, members, employees, trainers)
+# are replicated to every shard, with the IDs of the database the shards were split from, so a member can
+# register in any studio under the same ID.
+#
+# IDs stay unique over all shards:
+# - the database the shards were split from stays the home of the reference data and the people, it allocates
+#   their IDs: new and changed rows (e.g. a member leaving) are written there and copied to every shard with
+#   replicate_reference_data() and replicate_people()
+# - every shard allocates the IDs of its studio's rows from its own range: the n-th shard from n * id_range + 1
+#   (the tables are created with AUTOINCREMENT, so SQLite never hands out an ID below the range)
+#
+# Inside use_studio() every function and procedure runs on the shard of the studio (database.get_engine() returns
+# its engine), without any change to the functions:
+#
+#   with sharding.use_studio('offenburg'):
+#       crfunc.count_free_spots_by_class(1)
+#
+# The registration procedures and the lookups by class (single and batch) find the shard of the class themselves
+# (database.get_class_engine()):
+#
+#   crprod.add_registration(1, 1)
+#   crfunc.count_free_spots_by_class(1)
+#
+# Reports over all studios run on every shard in parallel on a process pool and merge the results.
+
+# sharding settings, can be overridden through environment variables or configure_shards()
+# - shards:    studio -> database URL, from MYGYM_SHARDS ("studio=url,studio=url,...")
+# - processes: worker processes of the reports over all studios, by default one per shard
+# - id_range:  IDs of every shard's rows of split_database(), see above
+settings = {
+    'shards': dict(pair.split('=', 1) for pair in os.environ.get('MYGYM_SHARDS', '').split(',') if pair),
+    'processes': int(os.environ.get('MYGYM_SHARD_PROCESSES', 0)) or None,
+    'id_range': int(os.environ.get('MYGYM_SHARD_ID_RANGE', 10 ** 9)),
+}
+
+reference_tables = ['countries', 'cities', 'weekdays']
+people_tables = ['persons', 'members', 'employees', 'trainers']
+
+# rows of the studio's rooms (given as JSON array) and everything depending on them
+studio_filters = {
+    'rooms': "WHERE id IN (SELECT value FROM json_each(:room_ids))",
+    'classtypes': "WHERE room_id IN (SELECT value FROM json_each(:room_ids))",
+    'classofferings': "WHERE classtype_id IN (SELECT id FROM main.classtypes)",
+    'classes': "WHERE classoffering_id IN (SELECT id FROM main.classofferings)",
+    'registrations': "WHERE class_id IN (SELECT id FROM main.classes)",
+}
+
+copy_rows = """
+INSERT INTO main.{table} ({columns})
+SELECT {columns} FROM source.{table} {where}
+"""
+
+# new rows are inserted, changed rows updated (reference rows are never deleted, other tables refer to them)
+upsert_rows = """
+INSERT INTO main.{table} ({columns})
+SELECT {columns} FROM source.{table} WHERE true
+ON CONFLICT (id) DO UPDATE SET {updates}
+WHERE {changed}
+"""
+
+query_class_ids = text("SELECT id FROM classes")
+
+query_max_id = "SELECT MAX(id) FROM main.{table}"
+
+# sqlite_sequence holds the last ID handed out of every AUTOINCREMENT table
+query_delete_sequence = text("DELETE FROM main.sqlite_sequence WHERE name = :table")
+query_insert_sequence = text("INSERT INTO main.sqlite_sequence (name, seq) VALUES (:table, :seq)")
+
+query_registration_totals = text("""
+SELECT classtype, SUM(registrations), SUM("max. participants")
+FROM vw_registrations
+GROUP BY classtype
+""")
+
+engines = {}
+process_pool = None
+
+# class ID -> studio of the class, loaded from the shards on first use and whenever a class is missing
+# (only ever added to, so threads routing at the same time never see it half loaded)
+class_studios = {}
+# IDs of classes not found on any shard; they don't reload the shards again until a reload finds them
+# (load_class_studios(), run for another missing class or directly after adding classes)
+missing_classes = set()
+
+# in the worker processes: in-memory snapshots of the shards, database URL -> (time.monotonic() it was taken,
+# snapshot as in snapshots.snapshot)
+shard_snapshots = {}
+
+
+# Use other shards (studio -> database URL)
+def configure_shards(shards):
+    for engine in engines.values():
+        engine.dispose()
+    engines.clear()
+    class_studios.clear()
+    missing_classes.clear()
+    settings['shards'] = dict(shards)
+    database.class_router = get_class_shard_engine if settings['shards'] else None
+
+
+def get_shard_engine(studio):
+    if studio not in settings['shards']:
+        raise ValueError(f"Studio {studio} not found.")
+    if studio not in engines:
+        engines[studio] = database.build_engine(settings['shards'][studio])
+    return engines[studio]
+
+
+def load_class_studios():
+    loaded = {}
+    for studio in settings['shards']:
+        with get_shard_engine(studio).connect() as connection:
+            loaded.update((class_id, studio) for class_id in connection.execute(query_class_ids).scalars())
+    class_studios.update(loaded)
+    missing_classes.difference_update(loaded)
+
+
+# Studio of the class with the ID; classes not found (also after reloading, classes can be added) belong to the
+# first studio, whose shard reports them as not found
+def get_class_studio(class_id):
+    if class_id not in class_studios and class_id not in missing_classes:
+        load_class_studios()
+        if class_id not in class_studios:
+            missing_classes.add(class_id)
+    return class_studios.get(class_id, next(iter(settings['shards'])))
+
+
+def get_class_shard_engine(class_id):
+    return get_shard_engine(get_class_studio(class_id))
+
+
+# Route the database calls of the current thread or task to the shard of the studio
+@contextmanager
+def use_studio(studio):
+    token = database.routed_engine.set(get_shard_engine(studio))
+    try:
+        yield
+    finally:
+        database.routed_engine.reset(token)
+
+
+def call_in_studio(studio, function, *args, **kwargs):
+    with use_studio(studio):
+        return function(*args, **kwargs)
+
+
+# Run the function on every shard, one after the other: studio -> result
+def for_all_studios(function, *args, **kwargs):
+    return {studio: call_in_studio(studio, function, *args, **kwargs) for studio in settings['shards']}
+
+
+# transaction on the engine with the database of the URL attached as 'source'
+# (ATTACH can't run inside a transaction, so the connection runs in autocommit mode and begins its own)
+@contextmanager
+def attached_transaction(engine, source_url):
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.exec_driver_sql('ATTACH DATABASE ? AS source', (make_url(source_url).database,))
+        try:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.exec_driver_sql('ROLLBACK')
+                raise
+            connection.exec_driver_sql('COMMIT')
+        finally:
+            connection.exec_driver_sql('DETACH DATABASE source')
+
+
+def get_columns(table):
+    return ', '.join(Base.metadata.tables[table].columns.keys())
+
+
+# Copy new and changed rows of the tables of the database the shards were split from to every shard
+def replicate_tables(tables, source_url=None):
+    source_url = source_url or database.settings['url']
+    for studio in settings['shards']:
+        with attached_transaction(get_shard_engine(studio), source_url) as connection:
+            for table in tables:
+                columns = Base.metadata.tables[table].columns.keys()
+                connection.execute(text(upsert_rows.format(
+                    table=table, columns=', '.join(columns),
+                    updates=', '.join(f'{name} = excluded.{name}' for name in columns if name != 'id'),
+                    changed=' OR '.join(f'{table}.{name} IS NOT excluded.{name}' for name in columns
+                                        if name != 'id'))))
+
+
+# Copy new and changed countries, cities and weekdays of the database the shards were split from to every shard
+def replicate_reference_data(source_url=None):
+    replicate_tables(reference_tables, source_url)
+
+
+# Copy new and changed persons, members, employees and trainers of the database the shards were split from to every
+# shard (the triggers of the shards end the registrations of members who left)
+def replicate_people(source_url=None):
+    replicate_tables(people_tables, source_url)
+
+
+# the tables of the shards, the tables of the studio's rows with AUTOINCREMENT
+def get_shard_metadata():
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        shard_table = table.to_metadata(metadata)
+        if table.name in studio_filters:
+            shard_table.dialect_options['sqlite']['autoincrement'] = True
+    return metadata
+
+
+# IDs of the studio's rows from the shard's range: the n-th shard from n * id_range + 1
+def start_id_ranges(connection, number):
+    seq = number * settings['id_range']
+    for table in studio_filters:
+        max_id = connection.execute(text(query_max_id.format(table=table))).scalar()
+        if max_id is not None and max_id >= settings['id_range']:
+            raise ValueError(f"IDs of {table} reach the ID range of the shards ({settings['id_range']}).")
+        connection.execute(query_delete_sequence, {'table': table})
+        connection.execute(query_insert_sequence, {'table': table, 'seq': seq})
+
+
+# Split a database (by default the shared one) into one new database per studio in the directory.
+# studio_rooms maps every studio to the IDs of its rooms; returns the shards (studio -> URL), which are used from now on
+def split_database(studio_rooms, directory, source_url=None):
+    source_url = source_url or database.settings['url']
+    shards = {studio: f"sqlite:///{os.path.join(directory, f'{studio}.db')}" for studio in studio_rooms}
+    for url in shards.values():
+        if os.path.exists(make_url(url).database):
+            raise ValueError(f"Database {make_url(url).database} already exists.")
+    configure_shards(shards)
+
+    shard_metadata = get_shard_metadata()
+    for number, (studio, room_ids) in enumerate(studio_rooms.items(), 1):
+        with use_studio(studio):
+            shard_metadata.create_all(get_shard_engine(studio))
+            create_schema()
+            with attached_transaction(get_shard_engine(studio), source_url) as connection:
+                for table in Base.metadata.sorted_tables:
+                    if table.name in studio_filters or table.name in reference_tables + people_tables:
+                        connection.execute(text(copy_rows.format(table=table.name, columns=get_columns(table.name),
+                                                                 where=studio_filters.get(table.name, ''))),
+                                           {'room_ids': json.dumps(list(room_ids))})
+                start_id_ranges(connection, number)
+            # class occupancy and search index are rebuilt from the copied rows
+            create_views()
+            create_triggers()
+    return shards
+
+
+def get_process_pool():
+    global process_pool
+    if process_pool is None:
+        # spawned (not forked) workers, so no SQLite connection of this process is inherited
+        process_pool = ProcessPoolExecutor(max_workers=settings['processes'] or len(settings['shards']),
+                                           mp_context=multiprocessing.get_context('spawn'))
+    return process_pool
+
+
+# Wait for running reports and stop the worker processes; the next report starts a new pool
+def shutdown():
+    global process_pool
+    if process_pool is not None:
+        process_pool.shutdown(wait=True)
+        process_pool = None
+
+
+# runs in a worker process: the snapshot of the shard the reports read, taken anew when it is older than the
+# interval (the snapshots of this process are its own, the worker may run the reports of every shard)
+def get_shard_snapshot(url, interval):
+    current = shard_snapshots.get(url)
+    if current is None or time.monotonic() - current[0] > interval:
+        if current is not None:
+            current[1][0].dispose()
+        taken, start = datetime.now(), time.perf_counter()
+        new_engine = snapshots.copy_to_memory(database.get_engine())
+        current = shard_snapshots[url] = (time.monotonic(), (new_engine, taken, time.perf_counter() - start))
+    return current[1]
+
+
+# runs in a worker process: the function on the shard of the URL, reading a snapshot of the shard if a snapshot
+# interval is given (snapshots are taken in this process), otherwise the shard itself
+def run_on_shard(url, function, args, snapshot_interval=None):
+    database.configure_engine(url)
+    snapshots.snapshot = get_shard_snapshot(url, snapshot_interval) if snapshot_interval is not None else None
+    return function(*args)
+
+
+# Run a module level function on every shard in parallel on the process pool: studio -> result.
+# While snapshots.py takes snapshots, the reports read snapshots of the shards as old as the snapshot interval.
+def fan_out(function, *args):
+    snapshot_interval = snapshots.settings['interval'] if snapshots.snapshot is not None else None
+    futures = {studio: get_process_pool().submit(run_on_shard, url, function, args, snapshot_interval)
+               for studio, url in settings['shards'].items()}
+    return {studio: future.result() for studio, future in futures.items()}
+
+
+def get_registration_totals():
+    with snapshots.get_reporting_engine().connect() as connection:
+        return connection.execute(query_registration_totals).all()
+
+
+# Registrations and capacity of every class type over all studios: class type -> (registrations, max. participants)
+def count_registrations_by_classtype():
+    totals = defaultdict(lambda: [0, 0])
+    for rows in fan_out(get_registration_totals).values():
+        for classtype, registrations, maxparticipants in rows:
+            totals[classtype][0] += registrations
+            totals[classtype][1] += maxparticipants
+    return {classtype: tuple(total) for classtype, total in sorted(totals.items())}
+
+
+# (order key, row) of all rows of a view
+def read_view(view):
+    with snapshots.get_reporting_engine().connect() as connection:
+        return [(tuple(row._mapping[name] for name in view_keys[view]), tuple(row))
+                for row in connection.execute(get_view_query(view))]
+
+
+# All rows of a view over all studios, each prefixed by its studio, in the order of the view
+def read_view_all_studios(view):
+    if view not in view_keys:
+        raise ValueError(f"View {view} not found.")
+
+    results = fan_out(read_view, view)
+    merged = heapq.merge(*([(key, studio, row) for key, row in rows] for studio, rows in results.items()))
+    return [(studio, *row) for key, studio, row in merged]
+
+
+# shards of MYGYM_SHARDS are used from the start
+configure_shards(settings['shards'])
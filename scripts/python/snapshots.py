@@ -0,0 +1,180 @@
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+import database
+
+# Reporting replica: the reports of reporting.py read a snapshot of the database instead of the database itself,
+# so long report queries don't hold read locks on the file the procedures write to (with the rollback journal a
+# reader blocks every commit, with the write-ahead log it keeps checkpoints from finishing).
+#
+# A snapshot is a consistent copy taken in one read transaction, with SQLite's online backup API (into memory or
+# a file) or with VACUUM INTO (into a file, compacted). It is opened read-only and replaced every interval seconds
+# by a background thread, so reports see the data as of the last snapshot (snapshot_age()):
+#
+#   snapshots.start()
+#   rows, after = reporting.get_page('vw_registrations')
+#   snapshots.stop()
+
+logger = logging.getLogger('mygym.snapshots')
+
+# snapshot settings, can be overridden through environment variables or start()
+# - target:   ':memory:' or the path of the snapshot file (replaced by every new snapshot)
+# - method:   'backup' (online backup API) or 'vacuum' (VACUUM INTO, file targets only)
+# - interval: seconds between two snapshots
+settings = {
+    'target': os.environ.get('MYGYM_SNAPSHOT_TARGET', ':memory:'),
+    'method': os.environ.get('MYGYM_SNAPSHOT_METHOD', 'backup'),
+    'interval': float(os.environ.get('MYGYM_SNAPSHOT_INTERVAL', 60)),
+}
+
+# current snapshot (engine, time it was taken, seconds it took), None while reports read the database itself
+snapshot = None
+lock = threading.Lock()
+memory_numbers = itertools.count(1)
+refresher = None
+stopping = threading.Event()
+
+
+# Engine for reporting queries: the snapshot while snapshots are taken (and no shard is routed to),
+# otherwise the database
+def get_reporting_engine():
+    current = snapshot
+    if current is None or database.routed_engine.get() is not None:
+        return database.get_engine()
+    return current[0]
+
+
+# the whole database of the engine copied into the SQLite connection, in one step (one read transaction)
+def backup(source_engine, target):
+    source = source_engine.raw_connection()
+    try:
+        source.driver_connection.backup(target)
+    finally:
+        source.close()
+
+
+def read_only(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA query_only = ON')
+
+
+def copy_to_memory(source_engine):
+    # a named in-memory database with shared cache, so every report gets its own connection to it;
+    # it lives until the engine is disposed and the last of these connections is closed
+    uri = f'file:mygym-snapshot-{next(memory_numbers)}?mode=memory&cache=shared'
+    keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    backup(source_engine, keeper)
+    # (QueuePool: the default pool for in-memory databases closes the connections of all threads on dispose)
+    new_engine = create_engine('sqlite://', poolclass=QueuePool,
+                               creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False))
+    event.listen(new_engine, 'connect', read_only)
+    event.listen(new_engine, 'engine_disposed', lambda engine: keeper.close())
+    return new_engine
+
+
+def copy_to_file(source_engine, path):
+    if settings['method'] not in ('backup', 'vacuum'):
+        raise ValueError(f"Snapshot method {settings['method']} not found.")
+
+    new_path = f'{path}.new'
+    if os.path.exists(new_path):
+        os.remove(new_path)
+    if settings['method'] == 'vacuum':
+        with source_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('VACUUM INTO ?', (new_path,))
+    else:
+        connection = sqlite3.connect(new_path)
+        backup(source_engine, connection)
+        connection.close()
+
+    # a rollback journal, so the snapshot can be opened read-only without -wal and -shm files
+    connection = sqlite3.connect(new_path)
+    connection.execute('PRAGMA journal_mode = DELETE')
+    connection.close()
+    os.replace(new_path, path)
+
+    new_engine = create_engine(f'sqlite:///file:{path}?mode=ro&uri=true')
+    event.listen(new_engine, 'connect', read_only)
+    return new_engine
+
+
+# Take a new snapshot of the database and route the reports to it; returns the seconds it took
+def take_snapshot():
+    global snapshot
+    with lock:
+        taken = datetime.now()
+        start = time.perf_counter()
+        if settings['target'] == ':memory:':
+            if settings['method'] != 'backup':
+                raise ValueError("Snapshots in memory can only be taken with method backup.")
+            new_engine = copy_to_memory(database.get_engine())
+        else:
+            new_engine = copy_to_file(database.get_engine(), settings['target'])
+        seconds = time.perf_counter() - start
+
+        # reports still reading the previous snapshot keep their connection until they are done
+        if snapshot is not None:
+            snapshot[0].dispose()
+        snapshot = (new_engine, taken, seconds)
+    logger.info("Snapshot taken in %.3f s", seconds)
+    return seconds
+
+
+# Seconds since the current snapshot was taken, None without snapshot
+def snapshot_age():
+    current = snapshot
+    if current is None:
+        return None
+    return (datetime.now() - current[1]).total_seconds()
+
+
+def snapshot_statistics():
+    current = snapshot
+    return {
+        'target': settings['target'] if current is not None else None,
+        'taken': current[1] if current is not None else None,
+        'age': snapshot_age(),
+        'seconds': current[2] if current is not None else None,
+    }
+
+
+def refresh(interval):
+    while not stopping.wait(interval):
+        try:
+            take_snapshot()
+        except Exception:
+            # reports keep reading the previous snapshot, which only gets older
+            logger.exception("Snapshot failed, reports read the snapshot of %s", snapshot[1])
+
+
+# Take a snapshot and a new one every interval seconds in a background thread, until stop()
+def start(interval=None, **options):
+    global refresher
+    stop()
+    settings.update(options)
+    if interval is not None:
+        settings['interval'] = interval
+    take_snapshot()
+    stopping.clear()
+    refresher = threading.Thread(target=refresh, args=(settings['interval'],), name='mygym-snapshots', daemon=True)
+    refresher.start()
+
+
+# Stop taking snapshots; reports read the database again
+def stop():
+    global snapshot, refresher
+    if refresher is not None:
+        stopping.set()
+        refresher.join()
+        refresher = None
+    with lock:
+        if snapshot is not None:
+            snapshot[0].dispose()
+        snapshot = None
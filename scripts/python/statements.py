@@ -0,0 +1,72 @@
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+# Registry of prebuilt statements for the point lookups, which run thousands of times a minute.
+# Building a select() construct and generating its cache key on every call costs more CPU than running the query
+# itself, so the statements are built once with bindparam() placeholders and executed with a parameter dict:
+#
+#   query_member_exists = register('member_exists', lambda: select(members.c.id).where(members.c.id == bindparam('id')))
+#   connection.execute(query_member_exists, {'id': member_id})
+#
+# Every execution of a registered statement is counted together with the result of SQLAlchemy's compiled cache
+# lookup (a miss per statement and engine is expected, all further executions should be hits).
+
+# name -> prebuilt statement
+registry = {}
+# name -> function building the statement (used by benchmarks/bench_statements.py to compare with building per call)
+builders = {}
+# id of a registered statement -> name
+names = {}
+# name -> [executions, compiled cache hits, compiled cache misses]
+counts = {}
+lock = threading.Lock()
+
+
+# Build the statement once and register it under the name
+def register(name, build):
+    statement = build()
+    with lock:
+        registry[name] = statement
+        builders[name] = build
+        names[id(statement)] = name
+        counts.setdefault(name, [0, 0, 0])
+    return statement
+
+
+def get_statement(name):
+    if name not in registry:
+        raise ValueError(f"Statement {name} not found.")
+    return registry[name]
+
+
+def count_execution(conn, cursor, statement, parameters, context, executemany):
+    name = names.get(id(getattr(context, 'invoked_statement', None)))
+    if name is None:
+        return
+    with lock:
+        entry = counts[name]
+        entry[0] += 1
+        if context.cache_hit is CACHE_HIT:
+            entry[1] += 1
+        elif context.cache_hit is CACHE_MISS:
+            entry[2] += 1
+
+
+event.listen(Engine, 'after_cursor_execute', count_execution)
+
+
+# Executions and compiled cache hits per registered statement
+def statement_statistics():
+    with lock:
+        return {name: {'executions': executions, 'cache_hits': hits, 'cache_misses': misses,
+                       'hit_ratio': hits / executions if executions else None}
+                for name, (executions, hits, misses) in counts.items()}
+
+
+def reset_statistics():
+    with lock:
+        for name in counts:
+            counts[name] = [0, 0, 0]
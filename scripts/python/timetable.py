@@ -0,0 +1,230 @@
+import logging
+import threading
+from bisect import insort
+from collections import OrderedDict, defaultdict, namedtuple
+from datetime import timedelta
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from database import get_engine
+from create_db import Person, Employee, Trainer, Class, ClassType, ClassOffering, Room, Weekday
+
+# Weekly timetable kept in memory, built with one query from classes, classofferings, classtypes, rooms and trainers.
+# The classes are indexed by weekday, trainer, room and time slot, each index holding its classes sorted by weekday
+# and time, so schedule queries are answered by a dictionary lookup instead of the joins of vw_classes.
+# Changed classes are refreshed one by one (commits of ORM sessions do this automatically), so are the classes of a
+# trainer whose person (name) changed; changes of class offerings, class types, rooms, weekdays, employees or
+# trainers reload the whole timetable. Every database (engine, e.g. the shards of sharding.py) has its own timetable.
+# The schema has no class duration: classes are assumed to last class_duration, and two classes in the same room
+# or of the same trainer on the same weekday conflict if they overlap.
+
+logger = logging.getLogger('mygym.timetable')
+
+class_duration = timedelta(minutes=60)
+
+# databases (engines) with their own timetable, the least recently used one is dropped
+max_timetables = 8
+
+TimetableEntry = namedtuple('TimetableEntry', ['class_id', 'weekday_id', 'weekday', 'time', 'classtype_id',
+                                               'classtype', 'room_id', 'room', 'trainer_id', 'trainer_surname',
+                                               'trainer_forename'])
+
+classes = Class.__table__
+classofferings = ClassOffering.__table__
+classtypes = ClassType.__table__
+rooms = Room.__table__
+weekdays = Weekday.__table__
+persons = Person.__table__
+employees = Employee.__table__
+trainers = Trainer.__table__
+
+query_timetable = select(classes.c.id, classes.c.weekday_id, weekdays.c.name, classes.c.time, classtypes.c.id,
+                         classtypes.c.name, rooms.c.id, rooms.c.name, trainers.c.id, persons.c.surname,
+                         persons.c.forename
+                         ).select_from(classes
+                                       .join(weekdays, classes.c.weekday_id == weekdays.c.id)
+                                       .join(classofferings, classes.c.classoffering_id == classofferings.c.id)
+                                       .join(classtypes, classofferings.c.classtype_id == classtypes.c.id)
+                                       .join(rooms, classtypes.c.room_id == rooms.c.id)
+                                       .join(trainers, classofferings.c.trainer_id == trainers.c.id)
+                                       .join(employees, trainers.c.employee_id == employees.c.id)
+                                       .join(persons, employees.c.person_id == persons.c.id))
+
+# index name -> key of an entry in that index
+index_keys = {
+    'weekday': lambda entry: entry.weekday_id,
+    'trainer': lambda entry: entry.trainer_id,
+    'trainer_weekday': lambda entry: (entry.trainer_id, entry.weekday_id),
+    'room': lambda entry: entry.room_id,
+    'room_weekday': lambda entry: (entry.room_id, entry.weekday_id),
+    'slot': lambda entry: (entry.weekday_id, entry.time),
+}
+
+
+def sort_key(entry):
+    return entry.weekday_id, entry.time, entry.class_id
+
+
+def minutes(time):
+    return time.hour * 60 + time.minute
+
+
+def overlaps(first_time, second_time):
+    return abs(minutes(first_time) - minutes(second_time)) < class_duration.total_seconds() / 60
+
+
+class Timetable:
+    def __init__(self):
+        self.entries = {}
+        self.indexes = {name: defaultdict(list) for name in index_keys}
+
+    def load(self, connection):
+        self.entries.clear()
+        for index in self.indexes.values():
+            index.clear()
+        for row in connection.execute(query_timetable):
+            self.add(TimetableEntry(*row))
+
+    def add(self, entry):
+        self.entries[entry.class_id] = entry
+        for name, key in index_keys.items():
+            insort(self.indexes[name][key(entry)], entry, key=sort_key)
+
+    def remove(self, class_id):
+        entry = self.entries.pop(class_id, None)
+        if entry is not None:
+            for name, key in index_keys.items():
+                self.indexes[name][key(entry)].remove(entry)
+        return entry
+
+    # Re-read the given classes (added, changed or deleted) and log the conflicts they cause
+    def refresh(self, connection, class_ids):
+        class_ids = set(class_ids)
+        for class_id in class_ids:
+            self.remove(class_id)
+        for row in connection.execute(query_timetable.where(classes.c.id.in_(class_ids))):
+            entry = TimetableEntry(*row)
+            self.add(entry)
+            for conflict in self.find_conflicts(entry.weekday_id, entry.time, entry.room_id, entry.trainer_id,
+                                                ignore_class_id=entry.class_id):
+                logger.warning("class %s conflicts with %s", entry.class_id, conflict)
+
+    # Re-read the classes of the trainers of the given persons (changed names)
+    def refresh_persons(self, connection, person_ids):
+        class_ids = connection.execute(query_timetable.with_only_columns(classes.c.id)
+                                       .where(persons.c.id.in_(set(person_ids)))).scalars().all()
+        if class_ids:
+            self.refresh(connection, class_ids)
+
+    # schedule queries, answered from the indexes (the returned lists must not be modified)
+    def get_class(self, class_id):
+        return self.entries.get(class_id)
+
+    def classes_on(self, weekday_id):
+        return self.indexes['weekday'].get(weekday_id, [])
+
+    def classes_of_trainer(self, trainer_id, weekday_id=None):
+        if weekday_id is None:
+            return self.indexes['trainer'].get(trainer_id, [])
+        return self.indexes['trainer_weekday'].get((trainer_id, weekday_id), [])
+
+    def classes_in_room(self, room_id, weekday_id=None):
+        if weekday_id is None:
+            return self.indexes['room'].get(room_id, [])
+        return self.indexes['room_weekday'].get((room_id, weekday_id), [])
+
+    def classes_at(self, weekday_id, time):
+        return self.indexes['slot'].get((weekday_id, time), [])
+
+    # Conflicts of a (planned) class: (kind, class ID) of every class overlapping in the same room or with the same
+    # trainer on the same weekday
+    def find_conflicts(self, weekday_id, time, room_id=None, trainer_id=None, ignore_class_id=None):
+        conflicts = []
+        for kind, candidates in [('room', self.classes_in_room(room_id, weekday_id) if room_id else []),
+                                 ('trainer', self.classes_of_trainer(trainer_id, weekday_id) if trainer_id else [])]:
+            conflicts += [(kind, entry.class_id) for entry in candidates
+                          if entry.class_id != ignore_class_id and overlaps(entry.time, time)]
+        return conflicts
+
+    # All room double bookings and trainer time conflicts: (kind, class ID, class ID) per pair of classes
+    def conflicts(self):
+        conflicts = []
+        for kind, index in [('room', self.indexes['room_weekday']), ('trainer', self.indexes['trainer_weekday'])]:
+            for entries in index.values():
+                for i, entry in enumerate(entries):
+                    for other in entries[i + 1:]:
+                        if not overlaps(entry.time, other.time):
+                            break
+                        conflicts.append((kind, entry.class_id, other.class_id))
+        return conflicts
+
+
+# engine -> timetable of its database, built on first use, least recently used first
+timetables = OrderedDict()
+lock = threading.Lock()
+
+
+# Timetable of the current database (the shared one, or the shard routed to)
+def get_timetable():
+    engine = get_engine()
+    with lock:
+        timetable = timetables.get(engine)
+        if timetable is None:
+            timetable = Timetable()
+            with engine.connect() as connection:
+                timetable.load(connection)
+            timetables[engine] = timetable
+            while len(timetables) > max_timetables:
+                timetables.popitem(last=False)
+        timetables.move_to_end(engine)
+        return timetable
+
+
+# Refresh the timetable of the database after writes outside of ORM sessions: the classes with the IDs and the
+# classes of the trainers of the persons with the IDs, or everything without IDs (by default the current database)
+def refresh_timetable(class_ids=None, person_ids=None, engine=None):
+    engine = engine or get_engine()
+    with lock:
+        timetable = timetables.get(engine)
+        if timetable is None:
+            return
+        with engine.connect() as connection:
+            if class_ids is None and person_ids is None:
+                timetable.load(connection)
+                return
+            if class_ids:
+                timetable.refresh(connection, class_ids)
+            if person_ids:
+                timetable.refresh_persons(connection, person_ids)
+
+
+# classes and persons written by ORM sessions are collected at every flush and refreshed once the transaction
+# commits (None: reload everything)
+@event.listens_for(Session, 'after_flush')
+def collect_changed_classes(session, flush_context):
+    changes = session.info.setdefault('timetable_changes', {'classes': set(), 'persons': set()})
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, Class):
+            changes['classes'].add(instance.id)
+        elif isinstance(instance, Person):
+            changes['persons'].add(instance.id)
+        elif isinstance(instance, (ClassOffering, ClassType, Room, Weekday, Trainer, Employee)):
+            changes['classes'].add(None)
+
+
+@event.listens_for(Session, 'after_commit')
+def refresh_changed_classes(session):
+    changes = session.info.pop('timetable_changes', None)
+    if changes is None:
+        return
+    engine = session.get_bind()
+    if None in changes['classes']:
+        refresh_timetable(engine=engine)
+    elif changes['classes'] or changes['persons']:
+        refresh_timetable(changes['classes'], changes['persons'], engine)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_changed_classes(session):
+    session.info.pop('timetable_changes', None)
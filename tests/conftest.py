@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_FILE = os.path.join(ROOT_DIR, 'data', 'mygym.db')
+
+# make the scripts importable both as 'scripts.python.<module>' and as '<module>'
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts', 'python'))
+
+import database  # noqa: E402
+from generate_data import build_database  # noqa: E402
+
+
+# run the test session on a copy to keep the shipped database untouched
+session_dir = tempfile.mkdtemp(prefix='mygym-tests-')
+os.environ['MYGYM_DATABASE_URL'] = build_database(os.path.join(session_dir, 'mygym.db'), source_file=DATABASE_FILE)
+
+
+# fresh copy of the example database for every test that writes to it
+@pytest.fixture
+def engine(tmp_path):
+    session_url = database.settings['url']
+    build_database(tmp_path / 'mygym.db', source_file=DATABASE_FILE)
+    yield database.get_engine()
+    database.configure_engine(session_url)
@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+import create_functions as crfunc
+
+
+def test_occupancy_timeline_matches_daily_counts(engine):
+    start, end = date(2021, 9, 1), date(2024, 12, 31)
+    timeline = crfunc.get_occupancy_timeline(1, start, end)
+
+    assert [day for day, count in timeline] == [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    for day, count in timeline[::30]:
+        assert crfunc.get_registrations_by_class(1, as_of=day)[-1] == count
+
+
+def test_as_of_lookups(engine):
+    as_of = date(2022, 12, 1)
+    class_, weekday, registered = crfunc.get_registrations_by_class(1, as_of=as_of)
+    assert crfunc.count_free_spots_by_class(16, as_of=as_of)[-1] >= 0
+    assert crfunc.get_registrations_by_class_batch([1, 16], as_of=as_of)[0]['registrations'][0] == registered
+
+    # member 10 left on 2022-06-30
+    assert crfunc.is_membership_terminated(10, as_of=date(2022, 6, 30))[0] is False
+    assert crfunc.is_membership_terminated(10, as_of=date(2022, 7, 1))[0] is True
+    assert crfunc.is_membership_terminated_batch([10], as_of=date(2022, 6, 30))[0]['membership_terminated'] == [False]
+
+    # member 1 is registered for class 1, but not before the registration started
+    assert crfunc.is_member_registered(1, 1)[-1] is True
+    assert crfunc.is_member_registered(1, 1, as_of=date(2015, 1, 1))[-1] is False
+    columns, missing = crfunc.is_member_registered_batch([(1, 1)], as_of=date(2015, 1, 1))
+    assert columns['member_registered'] == [False]
+
+
+def test_today_counts_like_as_of_today(engine):
+    today = date.today()
+    with engine.begin() as connection:
+        # member 3 starts next week, member 5 has started today
+        connection.execute(text("""
+            INSERT INTO registrations (class_id, member_id, startdate)
+            VALUES (1, 3, :next_week), (1, 5, :today)
+        """), {'next_week': today + timedelta(days=7), 'today': today})
+
+    registered = crfunc.get_registrations_by_class(1)[-1]
+    assert registered == crfunc.get_registrations_by_class(1, as_of=today)[-1]
+    assert crfunc.get_registrations_by_class(1, as_of=today + timedelta(days=7))[-1] == registered + 1
+    assert crfunc.count_registrations_by_class_batch([1])[0]['registrations'] == [registered]
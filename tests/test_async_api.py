@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+import async_api
+import create_functions as crfunc
+import create_procedures as crprod
+
+
+def test_async_functions_match_sync(engine):
+    async def lookups():
+        return await asyncio.gather(async_api.count_registrations_by_year(2021),
+                                    async_api.get_classes_by_trainer(2, 2),
+                                    async_api.get_registrations_by_class(1),
+                                    async_api.count_free_spots_by_class(16))
+
+    assert asyncio.run(lookups()) == [crfunc.count_registrations_by_year(2021), crfunc.get_classes_by_trainer(2, 2),
+                                      crfunc.get_registrations_by_class(1), crfunc.count_free_spots_by_class(16)]
+    assert asyncio.run(async_api.get_registration_checks(2, 1)) == (False, False, True,
+                                                                     crfunc.count_free_spots_by_class(1)[-1])
+
+
+def test_async_errors_are_raised(engine):
+    with pytest.raises(ValueError, match="Member with ID 9999 not found."):
+        asyncio.run(async_api.is_member_registered(9999, 1))
+
+
+def test_concurrent_registrations(engine):
+    async def register(member_ids):
+        return await asyncio.gather(*(async_api.register_member(member_id, 1) for member_id in member_ids))
+
+    statuses = [result[-1] for result in asyncio.run(register([3, 3, 5]))]
+    # the same member is registered once, whichever call comes first
+    assert sorted(status.name for status in statuses[:2]) == ['ALREADY_REGISTERED', 'REGISTERED']
+    assert statuses[2] is crprod.RegistrationStatus.REGISTERED
@@ -0,0 +1,68 @@
+import time
+
+from sqlalchemy import event
+
+import cache
+import create_functions as crfunc
+import database
+from create_db import Weekday
+
+
+def count_statements(engine, call):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        call()
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return len(statements)
+
+
+def test_repeated_lookups_are_cached(engine):
+    lookup = crfunc.get_class_and_weekday
+    hits = lookup.cache.statistics()['hits']
+    assert count_statements(engine, lambda: lookup(1)) == 1
+    assert count_statements(engine, lambda: lookup(1)) == 0
+    assert lookup.cache.statistics()['hits'] == hits + 1
+
+    # the reference lookups of get_classes_by_trainer only run once
+    first = count_statements(engine, lambda: crfunc.get_classes_by_trainer(1, 2))
+    assert count_statements(engine, lambda: crfunc.get_classes_by_trainer(1, 2)) == first - 3
+
+
+def test_orm_writes_invalidate(engine):
+    assert crfunc.get_weekday_name(1) == 'Monday'
+
+    with database.get_session() as session:
+        session.get(Weekday, 1).name = 'Montag'
+        session.commit()
+    assert crfunc.get_weekday_name(1) == 'Montag'
+
+    # rolled back writes keep the cache
+    with database.get_session() as session:
+        session.get(Weekday, 1).name = 'Lundi'
+        session.flush()
+        session.rollback()
+    assert crfunc.get_weekday_name.cache.statistics()['size'] == 1
+
+
+def test_missing_records_are_not_cached(engine):
+    assert crfunc.check_weekday_exists(99) is False
+    assert crfunc.check_weekday_exists.cache.statistics()['size'] == 0
+
+
+def test_lru_and_ttl():
+    lookup_cache = cache.LookupCache('test', ['weekdays'], maxsize=2, ttl=0.05)
+    engine = object()
+    # the first lookup binds the cache to the engine
+    assert lookup_cache.get(engine, 1) == (False, None)
+    for key in (1, 2, 3):
+        lookup_cache.put(engine, key, str(key))
+    assert lookup_cache.get(engine, 1) == (False, None)
+    assert lookup_cache.get(engine, 3) == (True, '3')
+    assert lookup_cache.statistics()['evictions'] == 1
+
+    time.sleep(0.06)
+    assert lookup_cache.get(engine, 3) == (False, None)
+    assert lookup_cache.statistics()['expirations'] == 1
@@ -0,0 +1,66 @@
+import multiprocessing
+import random
+import time
+
+from sqlalchemy import text
+
+import create_procedures as crprod
+import create_trigger as crtrig
+import database
+from create_procedures import RegistrationStatus
+
+CLASS_ID = 1
+PROCESSES = 8
+
+
+# every worker tries to register all members for the same class, each in its own order
+def register_all(database_url, member_ids, seed):
+    database.configure_engine(database_url, connect_args={'timeout': 60})
+    random.Random(seed).shuffle(member_ids)
+    registered = sum(crprod.register_member(member_id, CLASS_ID)[-1] is RegistrationStatus.REGISTERED
+                     for member_id in member_ids)
+    database.configure_engine()
+    return registered, len(member_ids)
+
+
+# active registrations of the class, counted directly
+def count_registrations(connection):
+    return connection.execute(text("""
+        SELECT COUNT(*)
+        FROM registrations
+        WHERE class_id = :class_id AND startdate <= DATE('now', 'localtime')
+        AND (enddate IS NULL OR enddate >= DATE('now', 'localtime'))
+    """), {'class_id': CLASS_ID}).scalar()
+
+
+def test_concurrent_registrations_respect_capacity(engine):
+    with engine.connect() as connection:
+        member_ids = connection.execute(text("SELECT id FROM members")).scalars().all()
+        max_participants = connection.execute(text("""
+            SELECT classtypes.maxparticipants
+            FROM classes
+            INNER JOIN classofferings ON classes.classoffering_id = classofferings.id
+            INNER JOIN classtypes ON classofferings.classtype_id = classtypes.id
+            WHERE classes.id = :class_id
+        """), {'class_id': CLASS_ID}).scalar()
+        registered_before = count_registrations(connection)
+    engine.dispose()
+
+    start = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(PROCESSES) as pool:
+        results = pool.starmap(register_all, [(engine.url.render_as_string(), list(member_ids), seed)
+                                              for seed in range(PROCESSES)])
+    elapsed = time.perf_counter() - start
+
+    with engine.connect() as connection:
+        registered_after = count_registrations(connection)
+
+    registered = sum(result[0] for result in results)
+    attempts = sum(result[1] for result in results)
+    print(f"\n{attempts} registration attempts by {PROCESSES} processes in {elapsed:.2f} s "
+          f"({attempts / elapsed:.0f} registrations/s), {registered} accepted")
+
+    # the class is filled up exactly to its capacity and never beyond
+    assert registered_after == max_participants
+    assert registered_after - registered_before == registered
+    assert crtrig.check_class_occupancy() == []
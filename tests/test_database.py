@@ -0,0 +1,28 @@
+from sqlalchemy import text
+
+import database
+
+
+def test_sqlite_profile_is_applied_to_every_connection(engine):
+    url, default_profile = database.settings['url'], database.settings['sqlite_profile']
+    for profile, pragmas in database.sqlite_profiles.items():
+        database.configure_engine(url, sqlite_profile=profile)
+        with database.get_engine().connect() as connection:
+            journal_mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+            busy_timeout = connection.execute(text("PRAGMA busy_timeout")).scalar()
+            synchronous = connection.execute(text("PRAGMA synchronous")).scalar()
+
+        assert busy_timeout == pragmas['busy_timeout']
+        if 'journal_mode' in pragmas:
+            assert journal_mode == pragmas['journal_mode'].lower()
+        if 'synchronous' in pragmas:
+            assert synchronous == {'OFF': 0, 'NORMAL': 1, 'FULL': 2}[pragmas['synchronous']]
+
+    database.configure_engine(sqlite_profile=default_profile)
+
+
+def test_default_profile_keeps_the_rollback_journal(engine, tmp_path):
+    assert database.settings['sqlite_profile'] == 'default'
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == 'delete'
+    assert not (tmp_path / 'mygym.db-wal').exists()
@@ -0,0 +1,46 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+
+import create_procedures as crprod
+import create_trigger as crtrig
+
+
+def get_state(connection):
+    persons = connection.execute(text("SELECT id, leavedate FROM persons ORDER BY id")).all()
+    registrations = connection.execute(text("SELECT id, enddate FROM registrations ORDER BY id")).all()
+    occupancy = connection.execute(text("SELECT * FROM class_occupancy ORDER BY class_id")).all()
+    return persons, registrations, occupancy
+
+
+def test_bulk_departures_match_trigger(engine):
+    departures = [(4, date(2024, 12, 31)), (5, date(2025, 3, 31)), (1, date(2025, 6, 30)), (9999, date(2025, 1, 1))]
+
+    # the same departures one by one through tr_update_leaving, rolled back afterwards
+    with engine.connect() as connection:
+        with connection.begin() as transaction:
+            for person_id, leavedate in departures:
+                connection.execute(text("UPDATE persons SET leavedate = :leavedate WHERE id = :person_id"),
+                                   {'leavedate': leavedate.isoformat(), 'person_id': person_id})
+            expected = get_state(connection)
+            transaction.rollback()
+
+    updated, closed, missing = crprod.process_departures(departures)
+
+    assert (updated, missing) == (3, [9999])
+    assert closed > 0
+    with engine.connect() as connection:
+        assert get_state(connection) == expected
+    assert crtrig.check_class_occupancy() == []
+    assert crprod.process_departures([]) == (0, 0, [])
+
+
+def test_departure_dates(engine):
+    # datetimes are stored as their date
+    assert crprod.process_departures([(4, datetime(2025, 1, 31, 10, 0))])[0] == 1
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT leavedate FROM persons WHERE id = 4")).scalar() == '2025-01-31'
+
+    with pytest.raises(ValueError, match="Leave date '2025-01-31' of person with ID 5 is not a date."):
+        crprod.process_departures([(5, '2025-01-31')])
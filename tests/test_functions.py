@@ -1,4 +1,4 @@
-from scripts.python import create_functions as crfunc
+import create_functions as crfunc
 
 year = 2021
 member_ids = [2, 10, 11, 25, 37]
@@ -0,0 +1,55 @@
+import create_functions as crfunc
+
+member_ids = [2, 10, 11, 25, 37]
+class_ids = [1, 6, 16]
+
+
+def test_is_membership_terminated_batch():
+    columns, missing = crfunc.is_membership_terminated_batch(member_ids + [9998, 9999])
+
+    assert columns['member_id'] == member_ids
+    assert missing == {'member_id': [9998, 9999]}
+    for member_id, forename, surname, membership_terminated in zip(*columns.values()):
+        assert crfunc.is_membership_terminated(member_id) == (membership_terminated, forename, surname)
+
+
+def test_get_classes_by_trainer_batch():
+    pairs = [(trainer_id, weekday_id) for trainer_id in [1, 2, 3] for weekday_id in [1, 2, 3]]
+    columns, missing = crfunc.get_classes_by_trainer_batch(pairs + [(9999, 1), (1, 99)])
+
+    assert missing == {'trainer_id': [9999], 'weekday_id': [99]}
+    for trainer_id, weekday_id in pairs:
+        forename, surname, weekday, classes_by_trainer = crfunc.get_classes_by_trainer(trainer_id, weekday_id)
+        rows = [(classtype, time) for row_trainer_id, row_weekday_id, _, _, _, classtype, time in zip(*columns.values())
+                if (row_trainer_id, row_weekday_id) == (trainer_id, weekday_id)]
+        assert rows == [tuple(class_) for class_ in classes_by_trainer]
+
+
+def test_pair_batches_match_single_lookups():
+    pairs = [(member_id, class_id) for member_id in member_ids for class_id in class_ids]
+
+    registered, missing = crfunc.is_member_registered_batch(pairs + [(9999, 1), (2, 9999)])
+    assert missing == {'member_id': [9999], 'class_id': [9999]}
+    assert list(zip(registered['member_id'], registered['class_id'])) == pairs
+
+    instructor, missing = crfunc.is_member_instructor_batch(pairs)
+    assert missing == {'member_id': [], 'class_id': []}
+
+    for i, (member_id, class_id) in enumerate(pairs):
+        assert crfunc.is_member_registered(member_id, class_id) == tuple(
+            registered[name][i] for name in ['forename', 'surname', 'classtype', 'weekday', 'member_registered'])
+        assert crfunc.is_member_instructor(member_id, class_id) == tuple(
+            instructor[name][i] for name in ['forename', 'surname', 'classtype', 'weekday', 'member_instructor'])
+
+
+def test_class_batches_match_single_lookups():
+    registrations, missing = crfunc.get_registrations_by_class_batch(class_ids + [9999])
+    assert missing == {'class_id': [9999]}
+    free_spots, missing = crfunc.count_free_spots_by_class_batch(class_ids + [9999])
+    assert missing == {'class_id': [9999]}
+
+    for i, class_id in enumerate(class_ids):
+        assert crfunc.get_registrations_by_class(class_id) == (
+            registrations['classtype'][i], registrations['weekday'][i], registrations['registrations'][i])
+        assert crfunc.count_free_spots_by_class(class_id) == (
+            free_spots['classtype'][i], free_spots['weekday'][i], free_spots['free_spots'][i])
@@ -0,0 +1,79 @@
+import filecmp
+
+from sqlalchemy import text
+
+import create_db
+import database
+import generate_data
+import load_data
+
+persons = 3000
+
+
+def test_generated_data_respects_schema(tmp_path):
+    session_url = database.settings['url']
+    database.configure_engine(f"sqlite:///{tmp_path / 'generated.db'}")
+    try:
+        create_db.create_schema()
+        # unique and check constraints are enforced by the database while inserting
+        counts = generate_data.write_database(persons, seed=1, chunk_size=500)
+
+        with database.get_engine().connect() as connection:
+            foreign_key_errors = connection.execute(text("PRAGMA foreign_key_check")).fetchall()
+            overbooked = connection.execute(text("""
+                SELECT classes.id
+                FROM classes
+                INNER JOIN classofferings ON classes.classoffering_id = classofferings.id
+                INNER JOIN classtypes ON classofferings.classtype_id = classtypes.id
+                WHERE classtypes.maxparticipants < (
+                    SELECT COUNT(*) FROM registrations
+                    WHERE registrations.class_id = classes.id AND registrations.enddate IS NULL
+                )
+            """)).fetchall()
+            instructors = connection.execute(text("""
+                SELECT registrations.id
+                FROM registrations
+                INNER JOIN members ON registrations.member_id = members.id
+                INNER JOIN classes ON registrations.class_id = classes.id
+                INNER JOIN classofferings ON classes.classoffering_id = classofferings.id
+                INNER JOIN trainers ON classofferings.trainer_id = trainers.id
+                INNER JOIN employees ON trainers.employee_id = employees.id
+                WHERE employees.person_id = members.person_id
+            """)).fetchall()
+            registrations_after_leaving = connection.execute(text("""
+                SELECT registrations.id
+                FROM registrations
+                INNER JOIN members ON registrations.member_id = members.id
+                INNER JOIN persons ON members.person_id = persons.id
+                WHERE registrations.startdate < persons.enterdate
+                OR (persons.leavedate IS NOT NULL
+                    AND (registrations.enddate IS NULL OR registrations.enddate > persons.leavedate))
+            """)).fetchall()
+    finally:
+        database.configure_engine(session_url)
+
+    assert counts['persons'] == persons
+    assert counts['registrations'] > persons
+    assert foreign_key_errors == []
+    assert overbooked == []
+    assert instructors == []
+    assert registrations_after_leaving == []
+
+
+def test_generated_csv_is_deterministic_and_loadable(tmp_path):
+    generate_data.write_csv(tmp_path / 'first', persons, seed=7)
+    generate_data.write_csv(tmp_path / 'second', persons, seed=7)
+    generate_data.write_csv(tmp_path / 'other', persons, seed=8)
+
+    files = [f'{table}.csv' for table in load_data.csv_columns]
+    assert filecmp.cmpfiles(tmp_path / 'first', tmp_path / 'second', files, shallow=False)[0] == files
+    assert 'persons.csv' in filecmp.cmpfiles(tmp_path / 'first', tmp_path / 'other', files, shallow=False)[1]
+
+    session_url = database.settings['url']
+    database.configure_engine(f"sqlite:///{tmp_path / 'loaded.db'}")
+    try:
+        create_db.create_schema()
+        report = load_data.load_csv_directory(tmp_path / 'first')
+    finally:
+        database.configure_engine(session_url)
+    assert dict((table, rows) for table, rows, seconds in report)['persons'] == persons
@@ -0,0 +1,70 @@
+import logging
+
+import pytest
+
+import create_functions as crfunc
+import create_procedures as crprod
+import instrumentation
+
+
+@pytest.fixture
+def metrics(engine):
+    instrumentation.registry.reset()
+    instrumentation.enable(slow_query_threshold=10)
+    yield instrumentation.registry
+    instrumentation.disable()
+    instrumentation.registry.reset()
+
+
+def test_round_trips_per_api_call(metrics):
+    crfunc.is_member_registered(1, 1)
+    crprod.add_registration(3, 1)
+
+    calls = metrics.dump()['calls']
+    # existence checks of member and class, member name, class and weekday, then the registration query
+    assert calls['is_member_registered']['calls'] == 1
+    assert calls['is_member_registered']['statements'] == 5
+    # BEGIN IMMEDIATE, recount of an outdated occupancy, checks, insert and COMMIT; register_member is part of
+    # add_registration
+    assert calls['add_registration']['statements'] == 5
+    assert calls['add_registration']['rows'] == 1
+    assert 'register_member' not in calls
+
+
+def test_prometheus_export(metrics):
+    crfunc.count_free_spots_by_class(1)
+
+    exported = metrics.to_prometheus()
+    assert 'mygym_api_calls_total{call="count_free_spots_by_class"} 1' in exported
+    assert '# TYPE mygym_statement_duration_seconds histogram' in exported
+    assert 'mygym_statement_duration_seconds_bucket{call="count_free_spots_by_class",le="+Inf"}' in exported
+    assert 'mygym_slow_queries_total 0' in exported
+
+
+def test_slow_query_log_contains_plan(metrics, caplog):
+    instrumentation.enable(slow_query_threshold=0)
+    with caplog.at_level(logging.WARNING, logger='mygym.slow_queries'):
+        crfunc.get_registrations_by_class(1)
+
+    assert metrics.dump()['slow_queries'] > 0
+    assert any('slow query in get_registrations_by_class' in message and 'SEARCH' in message
+               for message in caplog.messages)
+
+
+def test_disabled_instrumentation_records_nothing(engine):
+    instrumentation.registry.reset()
+    crfunc.is_member_registered(1, 1)
+    assert instrumentation.registry.dump() == {'calls': {}, 'statements': {}, 'slow_queries': 0}
+
+
+def test_statements_are_normalized_and_capped(metrics, monkeypatch):
+    crfunc.is_membership_terminated_batch([1, 2, 3])
+    crfunc.is_membership_terminated_batch([1, 2])
+    statements = metrics.dump()['statements']
+    assert [stats['count'] for statement, stats in statements.items() if 'IN (?...)' in statement] == [2]
+
+    monkeypatch.setitem(instrumentation.settings, 'max_statements', len(statements))
+    crfunc.count_free_spots_by_class(1)
+    statements = metrics.dump()['statements']
+    assert len(statements) == instrumentation.settings['max_statements'] + 1
+    assert statements[instrumentation.other_statements]['count'] > 0
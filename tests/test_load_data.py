@@ -0,0 +1,37 @@
+import os
+from datetime import date
+
+from sqlalchemy import create_engine, text
+
+import create_db
+import database
+import load_data
+from conftest import ROOT_DIR, DATABASE_FILE
+
+
+def test_load_csv_directory_matches_example_database(tmp_path):
+    session_url = database.settings['url']
+    database.configure_engine(f"sqlite:///{tmp_path / 'loaded.db'}")
+    try:
+        create_db.create_schema()
+        report = load_data.load_csv_directory(os.path.join(ROOT_DIR, 'data', 'csv_files'), chunk_size=7)
+
+        with database.get_engine().connect() as connection:
+            loaded = {table: connection.execute(text(f"SELECT * FROM {table} ORDER BY id")).fetchall()
+                      for table in load_data.csv_columns}
+            enterdate = connection.execute(text("SELECT enterdate FROM persons WHERE id = 1")).scalar()
+    finally:
+        database.configure_engine(session_url)
+
+    # parents are loaded before the tables referencing them
+    order = [table for table, rows, seconds in report]
+    assert order.index('countries') < order.index('cities') < order.index('persons') < order.index('members')
+    assert order.index('classes') < order.index('registrations')
+    assert enterdate == date(2021, 10, 1).isoformat()
+
+    with create_engine(f'sqlite:///{DATABASE_FILE}').connect() as connection:
+        for table, rows in loaded.items():
+            expected = connection.execute(text(f"SELECT * FROM {table} ORDER BY id")).fetchall()
+            # the example database keeps 'NULL' e-mail addresses as text, the loader stores NULL
+            expected = [tuple(None if value == 'NULL' else value for value in row) for row in expected]
+            assert rows == expected, table
@@ -0,0 +1,120 @@
+import math
+
+import pytest
+from sqlalchemy import event, func, select
+
+import create_db
+import database
+import generate_data
+import loading
+from create_db import Class, Member, Registration, Trainer
+
+# about 10k members
+persons = 10100
+
+
+# generated database, shared by the tests of this module
+@pytest.fixture(scope='module')
+def generated_engine(tmp_path_factory):
+    session_url = database.settings['url']
+    database.configure_engine(f"sqlite:///{tmp_path_factory.mktemp('loading') / 'mygym.db'}")
+    create_db.create_schema()
+    generate_data.write_database(persons)
+    yield database.get_engine()
+    database.configure_engine(session_url)
+
+
+def count_queries(engine, call):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        result = call()
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return len(statements), result
+
+
+# number of queries of a selectinload for ### parents
+def selectin_queries(parents):
+    return math.ceil(parents / 500)
+
+
+def walk_roster(classes):
+    return [(class_.classoffering.classtype.room.name, class_.classoffering.trainer.employee.person.surname,
+             class_.weekday.name, class_.occupancy, [registration.member.person.surname
+                                                     for registration in class_.registrations])
+            for class_ in classes]
+
+
+def walk_trainer_schedule(trainers):
+    return [(trainer.employee.person.surname, [(classoffering.classtype.room.name,
+                                                [(class_.weekday.name, class_.occupancy)
+                                                 for class_ in classoffering.classes])
+                                               for classoffering in trainer.classofferings])
+            for trainer in trainers]
+
+
+def walk_member_profile(members):
+    return [(member.person.city.country.name, [(registration.class_.classoffering.classtype.name,
+                                                registration.class_.weekday.name)
+                                               for registration in member.registrations])
+            for member in members]
+
+
+@pytest.mark.parametrize('model, profile, walk', [
+    (Class, 'roster', walk_roster),
+    (Trainer, 'trainer schedule', walk_trainer_schedule),
+    (Member, 'member profile', walk_member_profile),
+])
+def test_profiles_bound_the_queries_of_a_traversal(generated_engine, model, profile, walk):
+    with database.get_session() as session:
+        count = session.scalar(select(func.count()).select_from(model))
+        queries, walked = count_queries(generated_engine,
+                                        lambda: walk(loading.load(session, model, profile)))
+
+    assert len(walked) == count
+    # one query for the objects and their many-to-one relationships, and per collection level one query per
+    # 500 parents (the generated trainers have one class offering each)
+    maximum = {'roster': 1 + selectin_queries(count),
+               'trainer schedule': 1 + 2 * selectin_queries(count),
+               'member profile': 1 + selectin_queries(count)}[profile]
+    assert queries <= maximum
+
+
+def test_lazy_loading_queries_per_row(generated_engine):
+    with database.get_session() as session:
+        queries, walked = count_queries(generated_engine,
+                                        lambda: walk_member_profile(session.scalars(
+                                            select(Member).order_by(Member.id).limit(100)).all()))
+    assert queries > 100
+
+    with database.get_session() as session:
+        queries, profiled = count_queries(generated_engine,
+                                          lambda: walk_member_profile(loading.load(session, Member, 'member profile',
+                                                                                   range(1, 101))))
+    assert profiled == walked
+    assert queries == 2
+
+
+def test_single_object_traversals(generated_engine):
+    with database.get_session() as session:
+        registrations = session.scalar(select(func.count()).where(Registration.class_id == 1))
+
+    queries, (classtype, weekday, time, participants) = count_queries(generated_engine,
+                                                                      lambda: loading.get_roster(1))
+    assert queries == 2
+    assert len(participants) == registrations
+
+    queries, (forename, surname, schedule) = count_queries(generated_engine,
+                                                           lambda: loading.get_trainer_schedule(1))
+    assert queries == 3
+    assert len(schedule) == generate_data.classes_per_trainer
+
+    queries, profile = count_queries(generated_engine, lambda: loading.get_member_profile(1))
+    assert queries == 2
+
+    with pytest.raises(ValueError, match="Member with ID 0 not found."):
+        loading.get_member_profile(0)
+    with pytest.raises(ValueError, match="Loading profile schedule not found."):
+        loading.get_profile('schedule')
@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import create_functions as crfunc
+
+
+def test_grouped_participants_match_single_class_types(engine):
+    as_of = date(2023, 6, 1)
+    grouped = crfunc.get_participants_by_classtypes(as_of)
+
+    with engine.connect() as connection:
+        classtype_ids = connection.execute(text("SELECT id FROM classtypes")).scalars().all()
+    for classtype_id in classtype_ids:
+        assert grouped.get(classtype_id, []) == crfunc.get_participants_by_classtype(classtype_id, as_of)
+
+    with pytest.raises(ValueError, match="Class type with ID 99 not found."):
+        crfunc.get_participants_by_classtype(99)
+
+
+def test_yoga_view_lists_current_participants(engine):
+    with engine.connect() as connection:
+        yoga_id = connection.execute(text("SELECT id FROM classtypes WHERE name = 'Yoga'")).scalar()
+        view = connection.execute(text('SELECT surname, forename, "participant since" FROM vw_yogaparticipants')).all()
+
+    participants = crfunc.get_participants_by_classtype(yoga_id)
+    assert participants
+    assert [tuple(row) for row in view] == [(surname, forename, str(startdate))
+                                            for surname, forename, weekday, time, startdate in participants]
+
+
+def test_participants_as_of_date(engine):
+    with engine.connect() as connection:
+        classtype_id, surname, startdate, enddate = connection.execute(text("""
+            SELECT classofferings.classtype_id, persons.surname, registrations.startdate, registrations.enddate
+            FROM registrations
+            INNER JOIN classes ON registrations.class_id = classes.id
+            INNER JOIN classofferings ON classes.classoffering_id = classofferings.id
+            INNER JOIN members ON registrations.member_id = members.id
+            INNER JOIN persons ON members.person_id = persons.id
+            WHERE registrations.enddate IS NOT NULL
+            ORDER BY registrations.id
+        """)).first()
+    startdate, enddate = date.fromisoformat(startdate), date.fromisoformat(enddate)
+
+    def surnames(as_of):
+        return [row[0] for row in crfunc.get_participants_by_classtype(classtype_id, as_of)]
+
+    assert surname not in surnames(startdate - timedelta(days=1))
+    assert surname in surnames(startdate)
+    assert surname in surnames(enddate)
+    assert surname not in surnames(enddate + timedelta(days=1))
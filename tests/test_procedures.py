@@ -1,4 +1,4 @@
-from scripts.python import create_procedures as crprod
+import create_procedures as crprod
 
 class_id = 1
 member_ids = [2, 10, 11, 25, 37]
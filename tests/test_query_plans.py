@@ -0,0 +1,105 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event, text
+
+import create_functions as crfunc
+import create_procedures as crprod
+
+views = ['vw_classes', 'vw_registrations', 'vw_trainersasparticipants', 'vw_employeesasinstructors',
+         'vw_yogaparticipants']
+
+calls = {
+    'count_registrations_by_year': lambda: crfunc.count_registrations_by_year(2021),
+    'count_registrations_by_period': lambda: crfunc.count_registrations_by_period(date(2021, 1, 1), date(2024, 1, 1),
+                                                                                'week'),
+    'is_membership_terminated': lambda: crfunc.is_membership_terminated(2),
+    'get_classes_by_trainer': lambda: crfunc.get_classes_by_trainer(2, 2),
+    'is_member_instructor': lambda: crfunc.is_member_instructor(2, 1),
+    'get_registrations_by_class': lambda: crfunc.get_registrations_by_class(1),
+    'is_member_registered': lambda: crfunc.is_member_registered(2, 1),
+    'count_free_spots_by_class': lambda: crfunc.count_free_spots_by_class(1),
+    'get_participants_by_classtype': lambda: crfunc.get_participants_by_classtype(1, date(2023, 6, 1)),
+    'get_occupancy_timeline': lambda: crfunc.get_occupancy_timeline(1, date(2023, 1, 1), date(2023, 12, 31)),
+    'search_persons': lambda: crfunc.search_persons('0157 Offen'),
+    'count_free_spots_by_class_as_of': lambda: crfunc.count_free_spots_by_class(1, as_of=date(2023, 6, 1)),
+    'count_free_spots_by_class_batch_as_of': lambda: crfunc.count_free_spots_by_class_batch([1, 6],
+                                                                                           as_of=date(2023, 6, 1)),
+    'is_member_registered_batch_as_of': lambda: crfunc.is_member_registered_batch([(2, 1)], as_of=date(2023, 6, 1)),
+    'is_membership_terminated_batch': lambda: crfunc.is_membership_terminated_batch([2, 10]),
+    'get_classes_by_trainer_batch': lambda: crfunc.get_classes_by_trainer_batch([(2, 2), (3, 1)]),
+    'is_member_instructor_batch': lambda: crfunc.is_member_instructor_batch([(2, 1), (3, 6)]),
+    'is_member_registered_batch': lambda: crfunc.is_member_registered_batch([(2, 1), (3, 6)]),
+    'get_registrations_by_class_batch': lambda: crfunc.get_registrations_by_class_batch([1, 6]),
+    'count_free_spots_by_class_batch': lambda: crfunc.count_free_spots_by_class_batch([1, 6]),
+    'register_member': lambda: crprod.register_member(3, 1),
+    'add_registrations': lambda: crprod.add_registrations([(5, 1), (7, 2)]),
+    'process_departures': lambda: crprod.process_departures([(4, date(2024, 12, 31)), (5, date(2025, 3, 31))]),
+}
+
+# the statement run by tr_update_leaving for every updated person
+trigger_statements = {
+    'tr_update_leaving': ("""
+        UPDATE registrations
+        SET enddate = :leavedate
+        WHERE (enddate IS NULL OR enddate > :leavedate)
+        AND member_id = (SELECT id FROM members WHERE person_id = :person_id)
+    """, {'leavedate': '2024-12-31', 'person_id': 4}),
+    # the persons of a renamed city, whose search entries tr_search_city updates
+    'tr_search_city': ("SELECT id FROM persons WHERE city_id = :city_id", {'city_id': 1}),
+}
+
+
+def table_scans(plan):
+    # scans of constant rows, subqueries, table-valued functions and temporary tables are fine
+    subqueries = tuple(f'SCAN {detail.split()[-1]}' for detail in plan
+                       if detail.startswith(('MATERIALIZE ', 'CO-ROUTINE ')))
+    return [detail for detail in plan
+            if detail.startswith('SCAN ') and not detail.startswith(('SCAN CONSTANT ROW', 'SCAN params', 'SCAN temp.'))
+            and 'VIRTUAL TABLE' not in detail and not detail.startswith('SCAN vw_') and detail not in subqueries]
+
+
+# EXPLAIN QUERY PLAN of every statement of a call, taken on the same connection right before it runs
+def explain_call(engine, call):
+    plans = []
+
+    def explain(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE')):
+            parameters = parameters[0] if executemany else parameters
+            plan = cursor.connection.execute(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+            plans.append((statement, [row[3] for row in plan]))
+
+    event.listen(engine, 'before_cursor_execute', explain)
+    try:
+        call()
+    finally:
+        event.remove(engine, 'before_cursor_execute', explain)
+    return plans
+
+
+@pytest.mark.parametrize('call', calls.values(), ids=calls.keys())
+def test_functions_use_indexes(engine, call):
+    plans = explain_call(engine, call)
+
+    assert plans
+    for statement, plan in plans:
+        assert not table_scans(plan), f"table scan in:\n{statement}\n{plan}"
+
+
+@pytest.mark.parametrize('name', trigger_statements)
+def test_triggers_use_indexes(engine, name):
+    statement, parameters = trigger_statements[name]
+    with engine.connect() as connection:
+        plan = [row[3] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {statement}'), parameters)]
+
+    assert not table_scans(plan), f"{name} scans a table:\n{plan}"
+
+
+# the views return whole result sets, so only the table driving the join may be scanned
+@pytest.mark.parametrize('view', views)
+def test_views_use_indexes(engine, view):
+    with engine.connect() as connection:
+        plan = [row[3] for row in connection.execute(text(f'EXPLAIN QUERY PLAN SELECT * FROM {view}'))]
+
+    table_accesses = [detail for detail in plan if detail.startswith(('SCAN ', 'SEARCH ')) and 'vw_' not in detail]
+    assert table_scans(plan) in ([], table_accesses[:1]), f"{view} scans a table inside the join:\n{plan}"
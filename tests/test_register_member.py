@@ -0,0 +1,60 @@
+from sqlalchemy import text
+
+import create_procedures as crprod
+from create_procedures import RegistrationStatus
+
+
+# active registrations of a class, counted directly
+def count_registrations(engine, class_id):
+    with engine.connect() as connection:
+        return connection.execute(text("""
+            SELECT COUNT(*)
+            FROM registrations
+            WHERE class_id = :class_id AND startdate <= DATE('now', 'localtime')
+            AND (enddate IS NULL OR enddate >= DATE('now', 'localtime'))
+        """), {'class_id': class_id}).scalar()
+
+
+def test_register_new_participant(engine):
+    before = count_registrations(engine, 1)
+    forename, surname, class_, weekday, status = crprod.register_member(3, 1)
+
+    assert status is RegistrationStatus.REGISTERED
+    assert (forename, surname, class_, weekday) == ('Ortrud', 'Karl', 'Yoga', 'Tuesday')
+    assert count_registrations(engine, 1) == before + 1
+
+    # a second attempt finds the registration written by the first one
+    assert crprod.register_member(3, 1)[-1] is RegistrationStatus.ALREADY_REGISTERED
+
+
+def test_register_rejections(engine):
+    assert crprod.register_member(9999, 1)[-1] is RegistrationStatus.MEMBER_NOT_FOUND
+    assert crprod.register_member(3, 9999)[-1] is RegistrationStatus.CLASS_NOT_FOUND
+    assert crprod.register_member(10, 1)[-1] is RegistrationStatus.MEMBERSHIP_TERMINATED
+    assert crprod.register_member(1, 1)[-1] is RegistrationStatus.ALREADY_REGISTERED
+    assert crprod.register_member(2, 1)[-1] is RegistrationStatus.MEMBER_IS_INSTRUCTOR
+    assert crprod.register_member(3, 16)[-1] is RegistrationStatus.CLASS_FULL
+
+
+def test_add_registration_messages(engine):
+    assert crprod.add_registration(9999, 1) == "Member with ID 9999 not found."
+    assert crprod.add_registration(3, 1) == "New participant has registered!"
+    assert crprod.add_registration(3, 1) == "Ortrud Karl (ID: 3) is already registered for Yoga on Tuesdays!"
+
+
+def test_add_registrations_allocates_free_spots_in_order(engine):
+    free_spots = 15 - count_registrations(engine, 1)
+    candidates = [3, 5, 7, 8, 9, 12, 13, 14, 15, 18, 19]
+    pairs = [(9999, 1), (10, 1), (2, 1), (3, 1), (3, 1)] + [(member_id, 1) for member_id in candidates[1:]]
+
+    outcomes = crprod.add_registrations(pairs)
+    statuses = [status for member_id, class_id, status in outcomes]
+
+    assert [(member_id, class_id) for member_id, class_id, status in outcomes] == pairs
+    assert statuses[:5] == [RegistrationStatus.MEMBER_NOT_FOUND, RegistrationStatus.MEMBERSHIP_TERMINATED,
+                            RegistrationStatus.MEMBER_IS_INSTRUCTOR, RegistrationStatus.REGISTERED,
+                            RegistrationStatus.ALREADY_REGISTERED]
+    assert statuses[5:] == ([RegistrationStatus.REGISTERED] * (free_spots - 1)
+                            + [RegistrationStatus.CLASS_FULL] * (len(candidates) - free_spots))
+    assert count_registrations(engine, 1) == 15
+    assert crprod.add_registrations([]) == []
@@ -0,0 +1,16 @@
+from datetime import date
+
+import create_functions as crfunc
+
+
+def test_count_registrations_by_period():
+    years = crfunc.count_registrations_by_period(date(2020, 1, 1), date(2025, 1, 1))
+    assert years == [(date(year, 1, 1), crfunc.count_registrations_by_year(year)) for year in range(2020, 2025)]
+
+    months = crfunc.count_registrations_by_period(date(2021, 1, 1), date(2022, 1, 1), 'month')
+    assert [period for period, count in months] == [date(2021, month, 1) for month in range(1, 13)]
+    assert sum(count for period, count in months) == crfunc.count_registrations_by_year(2021)
+
+    weeks = crfunc.count_registrations_by_period(date(2021, 1, 1), date(2022, 1, 1), 'week')
+    assert weeks[0][0] == date(2020, 12, 28) and all(period.weekday() == 0 for period, count in weeks)
+    assert sum(count for period, count in weeks) == crfunc.count_registrations_by_year(2021)
@@ -0,0 +1,48 @@
+import csv
+
+import pytest
+from sqlalchemy import text
+
+import reporting
+
+
+def read_view(engine, view):
+    with engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(text(f"SELECT * FROM {view}"))]
+
+
+@pytest.mark.parametrize('view', list(reporting.view_keys))
+def test_pages_and_stream_follow_view_order(engine, view):
+    rows = read_view(engine, view)
+    pages = list(reporting.iterate_pages(view, page_size=3))
+
+    assert [tuple(row) for page in pages for row in page] == rows
+    assert all(len(page) <= 3 for page in pages)
+    assert [tuple(row) for row in reporting.stream_view(view, batch_size=2)] == rows
+
+
+def test_page_after_key(engine):
+    first, after = reporting.get_page('vw_classes', page_size=5)
+    second, _ = reporting.get_page('vw_classes', page_size=5, after=after)
+    assert [tuple(row) for row in first + second] == read_view(engine, 'vw_classes')[:10]
+
+    with pytest.raises(ValueError, match="View vw_persons not found."):
+        reporting.get_page('vw_persons')
+
+
+def test_export_csv(engine, tmp_path):
+    csv_file = tmp_path / 'registrations.csv'
+    view_rows = read_view(engine, 'vw_registrations')
+    assert reporting.export_csv('vw_registrations', csv_file, batch_size=3) == len(view_rows)
+
+    with open(csv_file, newline='', encoding='utf-8') as exported:
+        header, *rows = list(csv.reader(exported))
+    assert header[:4] == ['weekday', 'time', 'classtype', 'registrations']
+    assert [tuple(row) for row in rows] == [tuple(str(value) for value in row) for row in view_rows]
+
+
+def test_export_parquet(engine, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    parquet_file = tmp_path / 'classes.parquet'
+    assert reporting.export_parquet('vw_classes', parquet_file, batch_size=4) == 20
+    assert pq.read_table(parquet_file).num_rows == 20
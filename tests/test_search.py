@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import text
+
+import create_functions as crfunc
+import create_trigger as crtrig
+
+
+def search_ids(query):
+    return [row.person_id for row in crfunc.search_persons(query)]
+
+
+def test_search_by_parts_of_names_and_phone_numbers(engine):
+    # Priszilla Schwangau is member 1 and trainer 1
+    first = crfunc.search_persons('schWANG')[0]
+    assert (first.person_id, first.surname, first.forename) == (2, 'Schwangau', 'Priszilla')
+    assert (first.member_id, first.employee_id, first.trainer_id) == (1, 2, 1)
+
+    assert search_ids('Priszilla Schwangau Offenburg') == [2]
+    assert set(search_ids('728781308')) == {2, 10}
+    assert search_ids('Schwangau Friesenheim') == []
+    assert len(crfunc.search_persons('0157', limit=3)) == 3
+
+    with pytest.raises(ValueError, match="Search query 'Sc' needs a word of at least 3 characters."):
+        crfunc.search_persons('Sc')
+
+
+def test_triggers_keep_the_index_in_sync(engine):
+    with engine.begin() as connection:
+        connection.execute(text("""
+            INSERT INTO persons (id, surname, forename, birthdate, street, housenumber, city_id, mobile, enterdate)
+            VALUES (1000, 'Quellmalz', 'Ottilie', '1980-05-01', 'Am Eisteich', '7', 1, '0157/4242424242', '2024-01-01')
+        """))
+    assert search_ids('Quellmalz') == [1000]
+    assert search_ids('4242424') == [1000]
+
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE persons SET surname = 'Quendel' WHERE id = 1000"))
+        city_id = connection.execute(text("SELECT city_id FROM persons WHERE id = 2")).scalar()
+        connection.execute(text("UPDATE cities SET name = 'Offenburg-Nord' WHERE id = :city_id"), {'city_id': city_id})
+    assert search_ids('Quellmalz') == []
+    assert search_ids('Quendel Ottilie') == [1000]
+    assert 2 in search_ids('Schwangau Nord')
+
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM persons WHERE id = 1000"))
+    assert search_ids('Quendel') == []
+
+    # the index holds the same entries as after a rebuild
+    def entries():
+        with engine.connect() as connection:
+            return connection.execute(text("SELECT rowid, * FROM persons_search ORDER BY rowid")).all()
+
+    synced = entries()
+    crtrig.rebuild_persons_search()
+    assert synced == entries()
@@ -0,0 +1,204 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import create_functions as crfunc
+import create_procedures as crprod
+import database
+import sharding
+import snapshots
+
+# Kursraum 2 (Yoga, Pilates, ...) in one studio, Kursraum 1 and the Gerätezirkel in the other
+studio_rooms = {'north': [2], 'south': [1, 3]}
+
+
+@pytest.fixture
+def shards(engine, tmp_path):
+    shards = sharding.split_database(studio_rooms, tmp_path)
+    yield shards
+    sharding.shutdown()
+    sharding.configure_shards({})
+
+
+def get_class_ids(studio):
+    with sharding.use_studio(studio), database.get_engine().connect() as connection:
+        return connection.execute(text("SELECT id FROM classes ORDER BY id")).scalars().all()
+
+
+def test_split_routes_the_functions_to_the_studio(engine, shards):
+    north, south = get_class_ids('north'), get_class_ids('south')
+    with engine.connect() as connection:
+        assert sorted(north + south) == connection.execute(text("SELECT id FROM classes ORDER BY id")).scalars().all()
+
+    for studio, class_ids in (('north', north), ('south', south)):
+        for class_id in class_ids:
+            expected = crfunc.count_free_spots_by_class(class_id), crfunc.is_member_registered(1, class_id)
+            with sharding.use_studio(studio):
+                assert crfunc.count_free_spots_by_class(class_id) == expected[0]
+                assert crfunc.is_member_registered(1, class_id) == expected[1]
+
+    with sharding.use_studio('north'), pytest.raises(ValueError, match=f"Class with ID {south[0]} not found."):
+        crfunc.get_registrations_by_class(south[0])
+    with pytest.raises(ValueError, match="Studio east not found."):
+        sharding.get_shard_engine('east')
+
+
+def count_source_registrations(engine, class_id):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT COUNT(*) FROM registrations WHERE class_id = :class_id"),
+                                  {'class_id': class_id}).scalar()
+
+
+def test_writes_stay_in_their_shard(engine, shards):
+    class_id = get_class_ids('south')[0]
+    registrations = crfunc.get_registrations_by_class(class_id)[-1]
+    free_spots = crfunc.count_free_spots_by_class(class_id)[-1]
+    source_registrations = count_source_registrations(engine, class_id)
+
+    status = sharding.call_in_studio('south', crprod.register_member, 5, class_id)[-1]
+    assert status is crprod.RegistrationStatus.REGISTERED
+    # the lookups by class read the shard of the class, with or without use_studio()
+    assert sharding.call_in_studio('south', crfunc.count_free_spots_by_class, class_id)[-1] == free_spots - 1
+    assert crfunc.count_free_spots_by_class(class_id)[-1] == free_spots - 1
+    assert crfunc.get_registrations_by_class(class_id)[-1] == registrations + 1
+    assert crfunc.is_member_registered(5, class_id)[-1]
+    assert count_source_registrations(engine, class_id) == source_registrations
+
+
+def test_batch_lookups_read_the_shards_of_their_classes(engine, shards):
+    north_class, south_class = register(5, get_class_ids('north')), register(5, get_class_ids('south'))
+    class_ids = [south_class, north_class, 999999]
+
+    columns, missing = crfunc.count_free_spots_by_class_batch(class_ids)
+    assert columns['class_id'] == sorted([north_class, south_class])
+    assert columns['free_spots'] == [crfunc.count_free_spots_by_class(class_id)[-1]
+                                     for class_id in columns['class_id']]
+    assert missing == {'class_id': [999999]}
+
+    pairs = [(5, south_class), (7, north_class), (5, north_class), (5, 999999)]
+    columns, missing = crfunc.is_member_registered_batch(pairs)
+    assert list(zip(columns['member_id'], columns['class_id'])) == pairs[:3]
+    assert columns['member_registered'] == [True, False, True]
+    assert missing == {'member_id': [], 'class_id': [999999]}
+
+
+def test_reports_fan_out_over_all_studios(engine, shards):
+    with engine.connect() as connection:
+        totals = connection.execute(text("""
+            SELECT classtype, SUM(registrations), SUM("max. participants") FROM vw_registrations GROUP BY classtype
+        """)).all()
+        view = [tuple(row) for row in connection.execute(text("SELECT * FROM vw_registrations"))]
+
+    assert sharding.count_registrations_by_classtype() == {classtype: (registrations, maxparticipants)
+                                                           for classtype, registrations, maxparticipants in totals}
+    rows = sharding.read_view_all_studios('vw_registrations')
+    assert [row[1:] for row in rows] == view
+    assert {row[0] for row in rows} == {'north', 'south'}
+
+
+def test_reports_over_all_studios_read_snapshots_of_the_shards(engine, shards):
+    class_id = get_class_ids('south')[0]
+    totals = sharding.count_registrations_by_classtype()
+    snapshots.start(interval=3600)
+    try:
+        assert sharding.count_registrations_by_classtype() == totals
+        assert crprod.register_member(5, class_id)[-1] is crprod.RegistrationStatus.REGISTERED
+        assert sharding.count_registrations_by_classtype() == totals
+    finally:
+        snapshots.stop()
+    assert sum(total[0] for total in sharding.count_registrations_by_classtype().values()) == \
+        sum(total[0] for total in totals.values()) + 1
+
+
+def test_missing_classes_reload_the_shards_once(engine, shards, monkeypatch):
+    class_id = get_class_ids('north')[0]
+    assert sharding.get_class_studio(class_id) == 'north'
+    loads = []
+    load_class_studios = sharding.load_class_studios
+    monkeypatch.setattr(sharding, 'load_class_studios', lambda: loads.append(1) or load_class_studios())
+
+    for _ in range(3):
+        assert sharding.get_class_studio(class_id) == 'north'
+        assert sharding.get_class_studio(999999) == next(iter(shards))
+    assert len(loads) == 1
+    with pytest.raises(ValueError, match="Class with ID 999999 not found."):
+        crfunc.count_free_spots_by_class(999999)
+    assert len(loads) == 1
+
+
+def test_reference_data_is_replicated(engine, shards):
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE cities SET name = 'Offenburg (Baden)' WHERE name = 'Offenburg'"))
+    sharding.replicate_reference_data()
+
+    for studio in shards:
+        with sharding.use_studio(studio):
+            assert 2 in [row.person_id for row in crfunc.search_persons('Schwangau Baden')]
+
+
+def get_registrations(studio, member_id):
+    with sharding.use_studio(studio), database.get_engine().connect() as connection:
+        return connection.execute(text("SELECT id, class_id, enddate FROM registrations WHERE member_id = :member_id"),
+                                  {'member_id': member_id}).all()
+
+
+# registers the member for the first class of the list with a free spot, without use_studio()
+def register(member_id, class_ids):
+    for class_id in class_ids:
+        if crprod.register_member(member_id, class_id)[-1] is crprod.RegistrationStatus.REGISTERED:
+            return class_id
+    raise AssertionError(f"No free spot for member {member_id}.")
+
+
+def test_registrations_find_the_shard_of_their_class(engine, shards):
+    north, south = get_class_ids('north'), get_class_ids('south')
+    north_class, south_class = register(5, north), register(5, south)
+    assert north_class in {row.class_id for row in get_registrations('north', 5)}
+    assert south_class not in {row.class_id for row in get_registrations('north', 5)}
+    assert south_class in {row.class_id for row in get_registrations('south', 5)}
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM registrations WHERE member_id = 5 AND class_id IN "
+                                       "(:north_class, :south_class) AND startdate = DATE('now', 'localtime')"),
+                                  {'north_class': north_class, 'south_class': south_class}).scalar() == 0
+
+    # the pairs of every studio are registered on its shard, unknown classes are not found
+    outcomes = crprod.add_registrations([(7, north_class), (7, 999999), (7, south_class)])
+    assert [outcome[:2] for outcome in outcomes] == [(7, north_class), (7, 999999), (7, south_class)]
+    assert outcomes[1][2] is crprod.RegistrationStatus.CLASS_NOT_FOUND
+    for studio, (member_id, class_id, status) in (('north', outcomes[0]), ('south', outcomes[2])):
+        registered = class_id in {row.class_id for row in get_registrations(studio, 7)}
+        assert registered == (status is not crprod.RegistrationStatus.CLASS_FULL)
+
+
+def test_new_ids_come_from_the_range_of_the_shard(engine, shards):
+    id_range = sharding.settings['id_range']
+    for number, studio in enumerate(shards, 1):
+        class_id = register(5, get_class_ids(studio))
+        new_id = max(row.id for row in get_registrations(studio, 5) if row.class_id == class_id)
+        assert number * id_range < new_id <= (number + 1) * id_range
+
+
+def test_people_are_replicated_with_the_ids_of_the_source(engine, shards):
+    with engine.begin() as connection:
+        person_id = connection.execute(text("""
+            INSERT INTO persons (surname, forename, birthdate, street, housenumber, city_id, enterdate)
+            VALUES ('Quellmalz', 'Ottilie', '1980-05-01', 'Am Eisteich', '7', 1, '2024-01-01')
+        """)).lastrowid
+        member_id = connection.execute(text("INSERT INTO members (person_id) VALUES (:person_id)"),
+                                       {'person_id': person_id}).lastrowid
+    sharding.replicate_people()
+
+    for studio in shards:
+        with sharding.use_studio(studio):
+            assert [row.person_id for row in crfunc.search_persons('Quellmalz')] == [person_id]
+    class_id = register(member_id, get_class_ids('south'))
+
+    # leaving is written to the source as well, the trigger of the shard ends the registrations
+    leavedate = date.today() + timedelta(days=1)
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE persons SET leavedate = :leavedate WHERE id = :person_id"),
+                           {'leavedate': leavedate, 'person_id': person_id})
+    sharding.replicate_people()
+    assert [row.enddate for row in get_registrations('south', member_id) if row.class_id == class_id] == \
+        [leavedate.isoformat()]
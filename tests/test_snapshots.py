@@ -0,0 +1,78 @@
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import create_procedures as crprod
+import database
+import reporting
+import snapshots
+
+
+@pytest.fixture
+def stop_snapshots():
+    settings = dict(snapshots.settings)
+    yield
+    snapshots.stop()
+    snapshots.settings.update(settings)
+
+
+def read_view(engine, view):
+    with engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(text(f"SELECT * FROM {view}"))]
+
+
+def report():
+    return [tuple(row) for row in reporting.stream_view('vw_registrations')]
+
+
+# registers member 5 for the first class with a free spot
+def register():
+    with database.get_engine().connect() as connection:
+        class_ids = connection.execute(text("SELECT id FROM classes ORDER BY id")).scalars().all()
+    for class_id in class_ids:
+        if crprod.register_member(5, class_id)[-1] is crprod.RegistrationStatus.REGISTERED:
+            return class_id
+    raise AssertionError("No free spot for member 5.")
+
+
+@pytest.mark.parametrize('target, method', [(':memory:', 'backup'), ('file', 'backup'), ('file', 'vacuum')])
+def test_reports_read_the_snapshot(engine, stop_snapshots, tmp_path, target, method):
+    before = read_view(engine, 'vw_registrations')
+    target = str(tmp_path / 'snapshot.db') if target == 'file' else target
+    snapshots.start(interval=3600, target=target, method=method)
+    assert snapshots.get_reporting_engine() is not engine
+    assert snapshots.snapshot_age() < 5
+    assert report() == before
+
+    # writes go to the database, reports see them with the next snapshot
+    register()
+    assert read_view(engine, 'vw_registrations') != before
+    assert report() == before
+    snapshots.take_snapshot()
+    assert report() == read_view(engine, 'vw_registrations')
+
+    with pytest.raises(OperationalError):
+        with snapshots.get_reporting_engine().begin() as connection:
+            connection.execute(text("DELETE FROM registrations"))
+
+    snapshots.stop()
+    assert snapshots.get_reporting_engine() is engine
+    assert snapshots.snapshot_age() is None
+
+
+def test_snapshots_are_refreshed(engine, stop_snapshots):
+    snapshots.start(interval=0.05)
+    register()
+    deadline = time.monotonic() + 10
+    while report() != read_view(engine, 'vw_registrations'):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    statistics = snapshots.snapshot_statistics()
+    assert statistics['target'] == ':memory:'
+    assert 0 <= statistics['age'] < 10
+
+    with pytest.raises(ValueError, match="Snapshots in memory can only be taken with method backup."):
+        snapshots.start(method='vacuum')
@@ -0,0 +1,29 @@
+from datetime import date
+
+import pytest
+
+import create_functions as crfunc
+import statements
+
+
+def test_registered_statements_hit_the_compiled_cache(engine):
+    statements.reset_statistics()
+    for _ in range(3):
+        crfunc.is_member_registered(1, 1, as_of=date(2023, 1, 1))
+
+    statistics = statements.statement_statistics()['member_registered_as_of']
+    # compiled once for the engine of the test, then taken from the cache
+    assert statistics['executions'] == 3
+    assert statistics['cache_misses'] == 1
+    assert statistics['cache_hits'] == 2
+
+
+def test_registered_statements_match_built_statements(engine):
+    parameters = {'member_id': 1, 'class_id': 1, 'as_of': date(2023, 1, 1)}
+    with engine.connect() as connection:
+        built = statements.builders['member_registered_as_of']()
+        assert (connection.execute(built, parameters).all()
+                == connection.execute(statements.get_statement('member_registered_as_of'), parameters).all())
+
+    with pytest.raises(ValueError, match="Statement member_exist not found."):
+        statements.get_statement('member_exist')
@@ -0,0 +1,86 @@
+import logging
+import shutil
+from datetime import time
+
+from sqlalchemy import text
+
+import create_functions as crfunc
+import database
+import timetable as tt
+from create_db import Class, Person
+
+
+def test_timetable_matches_schedule_queries(engine):
+    timetable = tt.get_timetable()
+    with engine.connect() as connection:
+        trainer_ids = connection.execute(text("SELECT id FROM trainers")).scalars().all()
+
+    for trainer_id in trainer_ids:
+        for weekday_id in range(1, 8):
+            forename, surname, weekday, classes = crfunc.get_classes_by_trainer(trainer_id, weekday_id)
+            entries = timetable.classes_of_trainer(trainer_id, weekday_id)
+            assert sorted(classes, key=lambda row: row[1]) == [(entry.classtype, entry.time) for entry in entries]
+            assert all((entry.trainer_forename, entry.trainer_surname, entry.weekday) == (forename, surname, weekday)
+                       for entry in entries)
+
+    assert sum(len(timetable.classes_on(weekday_id)) for weekday_id in range(1, 8)) == len(timetable.entries)
+    assert [entry.class_id for entry in timetable.classes_at(1, time(9, 15))] == [17]
+    assert timetable.conflicts() == []
+
+
+def test_class_changes_refresh_and_detect_conflicts(engine, caplog):
+    timetable = tt.get_timetable()
+    # a planned class in room 2 on Monday at 9:45 overlaps class 17 (9:15) and class 3 (10:15)
+    assert timetable.find_conflicts(1, time(9, 45), room_id=2) == [('room', 17), ('room', 3)]
+
+    with caplog.at_level(logging.WARNING, logger='mygym.timetable'):
+        with database.get_session() as session:
+            session.get(Class, 3).time = time(9, 30)
+            session.commit()
+
+    assert timetable.get_class(3).time == time(9, 30)
+    assert [entry.class_id for entry in timetable.classes_at(1, time(9, 30))] == [3]
+    assert timetable.classes_at(1, time(10, 15)) == []
+    assert timetable.conflicts() == [('room', 17, 3)]
+    assert "class 3 conflicts with ('room', 17)" in caplog.messages
+
+    # moved to Saturday, where room 2 is free
+    with database.get_session() as session:
+        session.get(Class, 3).weekday_id = 6
+        session.commit()
+    assert [entry.class_id for entry in timetable.classes_on(6)] == [3]
+    assert timetable.conflicts() == []
+
+
+def test_trainer_name_changes_refresh_their_classes(engine):
+    timetable = tt.get_timetable()
+    entry = timetable.get_class(17)
+    with engine.connect() as connection:
+        person_id = connection.execute(text("""
+            SELECT employees.person_id FROM trainers JOIN employees ON employees.id = trainers.employee_id
+            WHERE trainers.id = :trainer_id
+        """), {'trainer_id': entry.trainer_id}).scalar()
+
+    with database.get_session() as session:
+        session.get(Person, person_id).surname = 'Quellmalz'
+        session.commit()
+    assert {entry.trainer_surname for entry in timetable.classes_of_trainer(entry.trainer_id)} == {'Quellmalz'}
+
+
+def test_every_database_has_its_own_timetable(engine, tmp_path):
+    timetable = tt.get_timetable()
+    shutil.copy(tmp_path / 'mygym.db', tmp_path / 'other.db')
+    other_engine = database.build_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    token = database.routed_engine.set(other_engine)
+    try:
+        with other_engine.begin() as connection:
+            connection.execute(text("UPDATE classes SET weekday_id = 6 WHERE id = 3"))
+        other_timetable = tt.get_timetable()
+        tt.refresh_timetable([3])
+    finally:
+        database.routed_engine.reset(token)
+        other_engine.dispose()
+
+    assert other_timetable is not timetable and tt.get_timetable() is timetable
+    assert other_timetable.get_class(3).weekday_id == 6
+    assert timetable.get_class(3).weekday_id == 1